@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# ONE event date parsing micro-benchmark: datetime.strptime() vs
+# parse_datetime() uncached and cached.
+# Usage: python dev/bench_dates.py [number of dates]
+
+import sys
+import random
+import timeit
+from datetime import datetime, timedelta
+
+from seacargos.etl.dates import parse_datetime
+
+def sample_dates(number, distinct=2000):
+    """Event date strings with repeated values like real schedules."""
+    start = datetime(2022, 1, 1)
+    pool = [
+        (start + timedelta(hours=7 * i, minutes=i % 60))\
+            .strftime("%Y-%m-%d %H:%M") for i in range(distinct)
+    ]
+    return [random.choice(pool) for _ in range(number)]
+
+def main(args):
+    """Benchmark script."""
+    number = int(args[0]) if args else 100000
+    dates = sample_dates(number)
+    uncached = parse_datetime.__wrapped__
+    results = {
+        "strptime": lambda: [datetime.strptime(s, "%Y-%m-%d %H:%M")
+                             for s in dates],
+        "parse_datetime uncached": lambda: [uncached(s) for s in dates],
+        "parse_datetime cached": lambda: [parse_datetime(s) for s in dates],
+    }
+    for name, func in results.items():
+        parse_datetime.cache_clear()
+        seconds = min(timeit.repeat(func, number=1, repeat=5))
+        print(f"{name:<25} {seconds * 1e9 / number:8.0f} ns per date")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
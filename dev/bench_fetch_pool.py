@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Fetch pool throughput benchmark against local stub server which serves
+# shiplocation.com and vesselfinder.com like pages with fixed latency.
+# Usage: python dev/bench_fetch_pool.py [number of ships] [latency, s]
+# Stub server only: python dev/bench_fetch_pool.py serve [port]
+
+import os
+import sys
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "one-line")
+    )
+from fetch_pool import fetch_all
+
+LATENCY = 0.2
+MMSI_PAGE = '<a class="vessel-link" href="/vessels/ONE-APUS-MMSI-{}">x</a>'
+LOCATION_PAGE = '<div class="coordinate lon">{}</div>'\
+    + '<div class="coordinate lat">{}</div>'
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Respond with mmsi search page to /vessels?vessel=<imo> and with
+    vessel location page to /vessels/<name>-IMO-<imo>-MMSI-<mmsi>."""
+    latency = LATENCY
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if "?" in self.path:
+            imo = self.path.split("vessel=")[1].split("&")[0]
+            body = MMSI_PAGE.format(imo.rjust(9, "2"))
+        else:
+            body = LOCATION_PAGE.format("135.5", "34.6")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+def start_server(port=0, latency=LATENCY):
+    """Start stub server in daemon thread, return its base url."""
+    StubHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def jobs(base, number):
+    """Alternating mmsi and location requests for number of ships."""
+    result = []
+    for i in range(number):
+        imo = str(9800000 + i)
+        result.append((f"m{i}", base + "/vessels?", {"vessel": imo}))
+        result.append((f"l{i}", base + f"/vessels/V-IMO-{imo}-MMSI-1", None))
+    return result
+
+def serial(job_list):
+    """Previous implementation: one request after another."""
+    for key, url, params in job_list:
+        requests.get(url, params=params)
+
+def pooled(job_list, **kwargs):
+    """Fetch pool, consume results as they complete."""
+    for key, r in fetch_all(job_list, **kwargs):
+        pass
+
+def main(args):
+    """Benchmark script."""
+    if args and args[0] == "serve":
+        base = start_server(int(args[1]) if len(args) > 1 else 8000)
+        print(f"Stub server on {base}, Ctrl+C to stop")
+        threading.Event().wait()
+    number = int(args[0]) if args else 20
+    latency = float(args[1]) if len(args) > 1 else LATENCY
+    base = start_server(latency=latency)
+    job_list = jobs(base, number)
+    runs = [
+        ("serial", serial, {}),
+        ("pool, no rate limit", pooled, {"interval": 0}),
+        ("pool, 0.05 s per host", pooled, {"interval": 0.05}),
+    ]
+    for name, func, kwargs in runs:
+        start = time.monotonic()
+        func(job_list, **kwargs)
+        seconds = time.monotonic() - start
+        print(f"{name}: {len(job_list)} requests in {seconds:.2f} s, "\
+            + f"{len(job_list) / seconds:.1f} requests/s")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Tracking document size benchmark: legacy vs compact schedule format.
+# Usage: python dev/bench_schedule_size.py [<config path> <db name>]
+# Without arguments a synthetic 12 events document is measured,
+# otherwise up to 1000 tracking collection documents are sampled.
+
+import sys
+import json
+from datetime import datetime, timedelta
+
+import bson
+from pymongo import MongoClient
+
+from seacargos.etl.schedule import compact_document
+
+def synthetic_document(events=12):
+    """Legacy format tracking document with events schedule."""
+    start = datetime(2022, 1, 1, 8, 0)
+    schedule = [{
+        "no": i + 1, "event": "Departure from Port of Loading",
+        "placeName": "NAGOYA, AICHI, JAPAN", "yardName": "TOBISHIMA CONTAINER",
+        "eventDate": start + timedelta(days=i), "status": "A" if i < 4 else "E",
+        "vesselName": "ONE APUS", "imo": "9806079"
+    } for i in range(events)]
+    return {
+        "cntrNo": "SZLU3605702", "bkgNo": "OSAB67971900", "user": "test",
+        "schedule": schedule, "initSchedule": [dict(i) for i in schedule]
+    }
+
+def compact(doc):
+    """Apply compact_document() update to document copy."""
+    update = compact_document(doc)
+    if not update:
+        return doc
+    result = dict(doc, **update["$set"])
+    result.pop("initSchedule", None)
+    return result
+
+def sizes(docs):
+    """Return total legacy and compact BSON sizes of documents."""
+    legacy = sum(len(bson.encode(d)) for d in docs)
+    packed = sum(len(bson.encode(compact(d))) for d in docs)
+    return legacy, packed
+
+def main(args):
+    """Benchmark script."""
+    if len(args) == 2:
+        with open(args[0], "r") as f:
+            conf = json.load(f)
+        conn = MongoClient(conf["DB_FRONTEND_URI"])
+        docs = list(conn[args[1]].tracking.find(
+            {"initSchedule": {"$exists": True}}, limit=1000
+            ))
+        conn.close()
+    else:
+        docs = [synthetic_document()]
+    if not docs:
+        print("No legacy format documents found")
+        return
+    legacy, packed = sizes(docs)
+    print(f"documents: {len(docs)}")
+    print(f"legacy:  {legacy / len(docs):.0f} bytes per document")
+    print(f"compact: {packed / len(docs):.0f} bytes per document")
+    print(f"saved:   {100 * (1 - packed / legacy):.1f}%")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
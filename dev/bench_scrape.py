@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Ships pages extraction benchmark: BeautifulSoup tree vs targeted
+# patterns (seacargos/etl/scrape.py), per page time and peak memory.
+# Usage: python dev/bench_scrape.py [<saved page> ...]
+# Without arguments tests/pages are padded with markup to ~300 KB,
+# the size of real vessel pages.
+
+import os
+import sys
+import timeit
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from seacargos.etl.scrape import page_title, vessel_link, coordinate
+
+PAGES = os.path.join(os.path.dirname(__file__), "..", "tests", "pages")
+FILLER = '<div class="row"><a class="nav-link" href="/x">Item</a>'\
+    + '<span class="value">12.5</span></div>\n'
+
+def soup_extract(html):
+    """Previous implementation: full tree per lookup."""
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.text if soup.title else None
+    link = soup.find("a", class_="vessel-link")
+    lon = soup.find("div", class_="coordinate lon")
+    return title, link, lon
+
+def pattern_extract(html):
+    """Targeted patterns."""
+    return (page_title(html), vessel_link(html),
+            coordinate(html, "coordinate lon"))
+
+def padded(html, size=300_000):
+    """Insert filler markup before </body> up to size characters."""
+    idx = html.rfind("</body>")
+    filler = FILLER * max(0, (size - len(html)) // len(FILLER))
+    return html[:idx] + filler + html[idx:]
+
+def peak_memory(func, html):
+    """Return peak allocated memory of func(html) call, bytes."""
+    tracemalloc.start()
+    func(html)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def main(args):
+    """Benchmark script."""
+    if args:
+        pages = [(os.path.basename(i), open(i, "r").read()) for i in args]
+    else:
+        pages = [(name, padded(open(os.path.join(PAGES, name), "r").read()))
+                 for name in sorted(os.listdir(PAGES))]
+    for name, html in pages:
+        print(f"{name} ({len(html) // 1024} KB)")
+        for label, func in [("soup", soup_extract),
+                            ("patterns", pattern_extract)]:
+            number = 5 if func is soup_extract else 200
+            seconds = timeit.timeit(lambda: func(html), number=number)
+            print(f"  {label:9}{seconds / number * 1000:9.2f} ms"\
+                + f"{peak_memory(func, html) / 1024:10.0f} KB peak")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
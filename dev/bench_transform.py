@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Schedule transform benchmark: previous per-path implementation
+# (strptime, two str.find() calls per event) vs compiled engine.
+# Usage: python dev/bench_transform.py [number of records]
+
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+from seacargos.etl.engine import compile_engine, ROUTE_RULES
+
+EVENTS = [
+    "Empty Container Release to Shipper", "Gate In to Outbound Terminal",
+    "Loaded on Vessel at Port of Loading", "Departure from Port of Loading",
+    "Arrival at Transhipment Port", "Departure from Transhipment Port",
+    "Arrival at Port of Discharging", "Unloaded from Vessel",
+    "Gate Out from Inbound Terminal", "Empty Container Returned"
+]
+
+def sample_batch(number):
+    """Raw schedules of number records with 10 events each."""
+    start = datetime(2022, 1, 1, 8, 0)
+    batch = []
+    for rec in range(number):
+        batch.append([{
+            "no": str(idx + 1), "statusNm": event, "placeNm": "NAGOYA",
+            "yardNm": "TCB", "actTpCd": "A", "vslEngNm": "ONE APUS",
+            "lloydNo": "9806079",
+            "eventDt": (start + timedelta(days=idx, hours=rec % 240))\
+                .strftime("%Y-%m-%d %H:%M")
+        } for idx, event in enumerate(EVENTS)])
+    return batch
+
+def legacy_transform(rows):
+    """Previous transform loop."""
+    result = {}
+    schedule = []
+    for i in rows:
+        schedule.append({
+            "no": int(i["no"]), "event": i["statusNm"],
+            "placeName": i["placeNm"], "yardName": i["yardNm"],
+            "eventDate": datetime.strptime(i["eventDt"], "%Y-%m-%d %H:%M"),
+            "status": i["actTpCd"], "vesselName": i["vslEngNm"],
+            "imo": i["lloydNo"]
+        })
+        if i["statusNm"].find("Departure from Port of Loading") > -1:
+            result["outboundTerminal"] = i["placeNm"] + "|" + i["yardNm"]
+            result["departureDate"] = datetime.strptime(
+                i["eventDt"], "%Y-%m-%d %H:%M")
+        if i["statusNm"].find("Arrival at Port of Discharging") > -1:
+            result["inboundTerminal"] = i["placeNm"] + "|" + i["yardNm"]
+            result["arrivalDate"] = datetime.strptime(
+                i["eventDt"], "%Y-%m-%d %H:%M")
+    return schedule, result
+
+def main(args):
+    """Benchmark script."""
+    number = int(args[0]) if args else 10000
+    batch = sample_batch(number)
+    engine = compile_engine(ROUTE_RULES)
+    assert [engine(rows) for rows in batch[:10]] ==\
+        [legacy_transform(rows) for rows in batch[:10]]
+    cases = {
+        "legacy": lambda: [legacy_transform(rows) for rows in batch],
+        "engine": lambda: [engine(rows) for rows in batch]
+    }
+    for name, func in cases.items():
+        seconds = min(timeit.repeat(func, number=1, repeat=5))
+        print(f"{name:<8} {seconds * 1e6 / number:8.1f} us per record")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+# One-off backfill of schedule status fields (lastEventStatus,
+# pendingEvents, nextExpectedEventAt, vesselImo) for one database
+# tracking collection documents written before the fields were
+# introduced. Seacargos app database documents are backfilled by
+# seacargos/etl/migrate.py.
+
+import sys
+from datetime import datetime
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import ConnectionFailure
+import access
+
+from seacargos.etl.schedule import status_fields
+
+BATCH_SIZE = 500
+
+def log(message):
+    """Log function to log errors."""
+    timestamp = datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S")
+    with open("etl.log", "a") as f:
+        f.write(timestamp + " " + message + "\n")
+
+def backfill(batch_size=BATCH_SIZE):
+    """Add status fields to active documents which do not have them.
+    Return number of updated documents."""
+    conn = MongoClient(access.update)
+    query = {"trackEnd": None, "pendingEvents": {"$exists": False}}
+    updated = 0
+    try:
+        conn.admin.command("ping")
+        ops = []
+        for rec in conn.one.tracking.find(query, {"schedule": 1},
+                                          batch_size=batch_size):
+            ops.append(UpdateOne(
+                {"_id": rec["_id"]},
+                {"$set": status_fields(rec.get("schedule", None))}
+            ))
+            if len(ops) == batch_size:
+                updated += conn.one.tracking.bulk_write(ops).modified_count
+                ops = []
+        if ops:
+            updated += conn.one.tracking.bulk_write(ops).modified_count
+        log(f"[Status fields backfill] [Backfill] [{updated} updated]")
+    except ConnectionFailure:
+        log("[Status fields backfill] [Backfill] [DB Connection failure]")
+    except BaseException as err:
+        log(f"[Status fields backfill] [Backfill] [{err}]")
+    conn.close()
+    return updated
+
+def main():
+	"""Pipeline."""
+	backfill()
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -12,6 +12,11 @@ from pymongo.errors import ConnectionFailure
 from bson.json_util import dumps
 import access
 
+from seacargos.etl.engine import compile_engine, TERMINAL_RULES
+from seacargos.etl.schedule import status_fields
+
+transform_schedule = compile_engine(TERMINAL_RULES)
+
 # External data resource
 URL = "https://ecomm.one-line.com/ecom/CUP_HOM_3301GS.do"
 
@@ -147,25 +152,11 @@ def transform(data):
                      "eventDt", "actTpCd", "actTpCd", "vslEngNm",
                      "lloydNo"]
     if set(schedule_keys).issubset(set(data["schedule"][0])):
-        schedule = [{
-            "no": int(i["no"]),
-            "event": i["statusNm"],
-            "placeName": i["placeNm"],
-            "yardName": i["yardNm"],
-            "eventDate": datetime.strptime(i["eventDt"], "%Y-%m-%d %H:%M"),
-            "status": i["actTpCd"],
-            "vesselName": i["vslEngNm"],
-            "imo": i["lloydNo"],
-        } for i in data["schedule"]]
+        # Transform schedule, find and save outbound and inbound terminals
+        schedule, terminals = transform_schedule(data["schedule"])
         result["schedule"] = schedule
-        # Find and save outbound and inbound terminals
-        for i in data["schedule"]:
-            if i["statusNm"].find("Outbound Terminal") > -1:
-                result["outboundTerminal"] = i["placeNm"]\
-                + "|" + i["yardNm"]
-            if i["statusNm"].find("Inbound Terminal") > -1:
-                result["inboundTerminal"] = i["placeNm"]\
-                + "|" + i["yardNm"]
+        result.update(terminals)
+        result.update(status_fields(schedule))
     else:
         log("[ETL Init] [Transform]"\
             + f" [Keys do not match in schedule data {data['number']}]")
@@ -12,6 +12,8 @@ from pymongo.errors import ConnectionFailure
 from bson.json_util import dumps
 import access
 
+from seacargos.etl.schedule import status_fields
+
 # External data resource
 URL = "https://ecomm.one-line.com/ecom/CUP_HOM_3301GS.do"
 
@@ -120,6 +122,7 @@ def update(records):
             if rec["schedule"]:
                 query = {"cntrNo": rec["cntrNo"]}
                 change = {"$set": {"schedule": rec["schedule"]}}
+                change["$set"].update(status_fields(rec["schedule"]))
                 cur_tracking = conn.one.tracking.update_one(query, change)
                 if cur_tracking.acknowledged == False:
                     log("[ETL Update] [Update] "\
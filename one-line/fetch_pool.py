@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+# Fetch pool for one-line scripts.
+# Runs GET requests in bounded number of threads with per host rate
+# limit (minimal interval between requests to the same host) and
+# request timeout. Results are yielded as they complete:
+#   for key, response in fetch_all(jobs):
+# jobs is iterable of (key, url, params) tuples, response is None if
+# request failed. Used by update_ships_location.py for shiplocation.com
+# and vesselfinder.com lookups.
+
+import time
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+
+WORKERS = 8
+# Seconds between requests to the same host
+HOST_INTERVAL = 0.5
+# Connect and read timeout, seconds
+TIMEOUT = 10
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+class RateLimiter:
+    """Per host minimal interval between requests."""
+
+    def __init__(self, interval=HOST_INTERVAL):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def wait(self, url):
+        """Reserve next request slot of url host and sleep until it."""
+        host = urlsplit(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def fetch_all(jobs, workers=WORKERS, interval=HOST_INTERVAL,
+              timeout=TIMEOUT, headers=HEADERS, log=None):
+    """Run (key, url, params) GET jobs concurrently.
+    Yield (key, response or None) tuples as requests complete."""
+    limiter = RateLimiter(interval)
+    local = threading.local()
+
+    def fetch(url, params):
+        """Rate limited GET request with thread local session."""
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+            local.session.headers.update(headers)
+        limiter.wait(url)
+        return local.session.get(url, params=params, timeout=timeout)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(fetch, url, params): key
+            for key, url, params in jobs
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                yield key, future.result()
+            except requests.RequestException as err:
+                if log:
+                    log(f"[Fetch pool] [Fetch] [{err} for {key}]")
+                yield key, None
@@ -1,15 +1,31 @@
 #!/usr/bin/env python3
 
-import requests
+# Ships registry crawler. Crawls ship ids in chunks with concurrent
+# rate limited requests (fetch_pool.py), skips ids already saved to
+# one database ships collection and upserts each chunk with one bulk
+# write. Next id to crawl is saved to checkpoints collection after every
+# chunk, so restarted crawl resumes from it. Ids of failed requests are
+# kept in checkpoint and retried first on next start.
+
 from datetime import datetime
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, ASCENDING
 from pymongo.errors import ConnectionFailure
 import access
-from bs4 import BeautifulSoup
 import sys
+from fetch_pool import fetch_all
+
+from seacargos.etl.scrape import page_title
 
 # External data resource
 URL = "https://www.marinetraffic.com/en/ais/details/ships/shipid:"
+# Crawl range, ids per checkpoint and politeness limits
+LAST_ID = 999999
+CHUNK_SIZE = 500
+WORKERS = 8
+HOST_INTERVAL = 0.1
+CHECKPOINT = "ships_web_scrapper"
+# Failed requests with these statuses are retried on next crawl start
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
 def log(message):
     """Log function to log errors."""
@@ -17,19 +33,10 @@ def log(message):
     with open("etl.log", "a") as f:
         f.write(timestamp + " " + message + "\n")
 
-def request_web_page(ship_id):
-    """Request web page for ship_id."""
-    response = requests.get(
-        URL + str(ship_id),
-        headers={"User-Agent": "Mozilla/5.0"}
-    )
-    return response
-
 def get_page_title(response, ship_id):
     """Get page title string from html response."""
     if response.status_code == 200:
-        soup = BeautifulSoup(response.text, "html.parser")
-        return soup.title.text
+        return page_title(response.text)
     else:
         log("[ships_web_scrapper.py] [get_page_title()] " \
                 + f"[{response.status_code} for ship id {ship_id}]")
@@ -64,38 +71,103 @@ def scrap_ship_details(title, ship_id):
     }
     return result
 
-def insert_ship_to_db(ship):
-    """Insert ship record to db."""
-    if not ship:
-        return
-    # Connect to database and update data
+def known_ids(db, ids):
+    """Return set of ship ids already saved to db."""
+    cur = db.ships.find(
+        {"ship_id": {"$in": list(ids)}}, {"ship_id": 1, "_id": 0}
+    )
+    return {i["ship_id"] for i in cur}
+
+def save_ships(db, ships):
+    """Upsert ships to db with one bulk write."""
+    now = datetime.now().replace(microsecond=0)
+    ops = [UpdateOne(
+        {"ship_id": ship["ship_id"]},
+        {"$set": dict(ship, update=now)},
+        upsert=True
+    ) for ship in ships]
+    if ops:
+        db.ships.bulk_write(ops, ordered=False)
+
+def load_checkpoint(db):
+    """Return first ship id to crawl and list of ids to retry."""
+    doc = db.checkpoints.find_one({"_id": CHECKPOINT}) or {}
+    return doc.get("next", 0), doc.get("failed", [])
+
+def save_checkpoint(db, next_id, failed):
+    """Save first ship id of next chunk and add failed ids."""
+    db.checkpoints.update_one(
+        {"_id": CHECKPOINT},
+        {"$set": {"next": next_id,
+                  "update": datetime.now().replace(microsecond=0)},
+         "$addToSet": {"failed": {"$each": failed}}},
+        upsert=True
+    )
+
+def crawl_chunk(db, ids):
+    """Request, parse and save ships of ids unknown to db.
+    Return number of saved ships and list of ids to retry."""
+    known = known_ids(db, ids)
+    ids = [i for i in ids if i not in known]
+    jobs = [(ship_id, URL + str(ship_id), None) for ship_id in ids]
+    ships = []
+    failed = []
+    for ship_id, response in fetch_all(jobs, workers=WORKERS,
+                                       interval=HOST_INTERVAL, log=log):
+        if response is None or response.status_code in RETRY_STATUSES:
+            failed.append(ship_id)
+            continue
+        try:
+            ship = scrap_ship_details(
+                get_page_title(response, ship_id), ship_id
+            )
+        except (IndexError, ValueError) as err:
+            log("[ships_web_scrapper.py] [crawl_chunk()] "\
+                + f"[{err} for ship id {ship_id}]")
+            continue
+        if ship:
+            ships.append(ship)
+    save_ships(db, ships)
+    if failed:
+        log("[ships_web_scrapper.py] [crawl_chunk()] "\
+            + f"[Failed ship ids kept for retry: {sorted(failed)}]")
+    return len(ships), failed
+
+def retry_failed(db, failed):
+    """Crawl ids failed in previous runs, keep still failed ones."""
+    saved, still_failed = crawl_chunk(db, failed)
+    db.checkpoints.update_one(
+        {"_id": CHECKPOINT}, {"$set": {"failed": still_failed}}
+    )
+    log("[ships_web_scrapper.py] [retry_failed()] "\
+        + f"[{len(failed)} retried: {saved} ships saved]")
+
+def crawl(db, last_id=LAST_ID, chunk_size=CHUNK_SIZE):
+    """Crawl ship ids from checkpoint to last_id in chunks,
+    checkpoint is saved after every chunk."""
+    db.ships.create_index([("ship_id", ASCENDING)], name="ship_id_index")
+    start, failed = load_checkpoint(db)
+    if failed:
+        retry_failed(db, failed)
+    for first in range(start, last_id + 1, chunk_size):
+        ids = range(first, min(first + chunk_size, last_id + 1))
+        saved, failed = crawl_chunk(db, ids)
+        save_checkpoint(db, ids[-1] + 1, failed)
+        log("[ships_web_scrapper.py] [crawl()] "\
+            + f"[ids {ids[0]}-{ids[-1]}: {saved} ships saved, "\
+            + f"{len(failed)} failed]")
+
+def main():
+    """ETL data pipeline."""
     conn = MongoClient(access.update)
     try:
         conn.admin.command("ping")
-        now = datetime.now().replace(microsecond=0)
-        ship["update"] = now
-        cur = conn.one.ships.insert_one(ship)
-        if cur.acknowledged == False:
-            log("[ships_web_scrapper.py] [insert_ship_to_db()] "\
-                + f"[Ship id {ship['ship_id']} imo {ship['imo']} not inserted]")
-        conn.close()
+        crawl(conn.one)
     except ConnectionFailure:
-        log("[ships_web_scrapper.py] [insert_ship_to_db()] "\
-            + f"[DB Connection failure for ship id {ship['ship_id']} imo {ship['imo']}]")
-        conn.close()
+        log("[ships_web_scrapper.py] [main()] [DB Connection failure]")
     except BaseException as err:
-        log("[ships_web_scrapper.py] [insert_ship_to_db()] "\
-            + f"[{err} for ship id {ship['ship_id']} imo {ship['imo']}]")
-        conn.close()
-
-
-def main():
-    """ETL data pipeline."""
-    for ship_id in range(999999):
-        response = request_web_page(ship_id)
-        title = get_page_title(response, ship_id)
-        ship = scrap_ship_details(title, ship_id)
-        insert_ship_to_db(ship)
+        log(f"[ships_web_scrapper.py] [main()] [{err}]")
+    conn.close()
 
 if __name__ == '__main__':
     sys.exit(main())
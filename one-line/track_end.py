@@ -22,27 +22,20 @@ def containers_at_destination():
     """Find containers which reached point of destination."""
     # Prepare connection
     conn = MongoClient(access.track_end)
-    # Query database: count all documents with status=A and
-    # compare with total number of documents.
+    # Query database: all schedule events are actual (pendingEvents
+    # field is set by etl_init.py and etl_update.py, indexed query).
+    # Documents written before the field was introduced and not yet
+    # backfilled (backfill_status_fields.py) are checked by schedule.
+    query = {"trackEnd": None, "$or": [
+        {"pendingEvents": 0},
+        {"pendingEvents": {"$exists": False}, "$expr": {"$allElementsTrue": [
+            {"$map": {"input": {"$ifNull": ["$schedule", []]},
+                      "in": {"$eq": ["$$this.status", "A"]}}}
+        ]}}
+    ]}
     try:
         conn.admin.command("ping")
-        cur = conn.one.tracking.aggregate([
-            {"$match": {"trackEnd": None}},
-            {"$addFields": {
-                "onlyA": {
-                    "$filter": {
-                        "input": "$schedule",
-                        "as": "item",
-                        "cond": {"$eq": ["$$item.status", "A"]}
-            }}}},
-            {"$redact": {
-                "$cond": {
-                    "if": {"$ne": [{"$size": "$onlyA"}, {"$size": "$schedule"}]},
-                    "then": "$$PRUNE",
-                    "else": "$$KEEP"
-                }}},
-            {"$project": {"_id": 0, "cntrNo": 1}}
-        ])
+        cur = conn.one.tracking.find(query, {"_id": 0, "cntrNo": 1})
         records = json.loads(dumps(cur))
         conn.close()
         if len(records) > 0:
@@ -69,7 +62,7 @@ def set_track_end(data):
     # Close records
     try:
         conn.admin.command("ping")
-        for item in data:
+        for rec in data:
             cur = conn.one.tracking.update_one(
                 {"cntrNo": rec["cntrNo"]},
                 {"$set": {"trackEnd": datetime.now().replace(microsecond=0)}},
@@ -1,18 +1,33 @@
 #!/usr/bin/env python3
 
 # Update_ships_location script for one-line shippings.
-# Updates ships location in one database, tracking collection.
+# Saves ships location to vessel_positions collection of one database
+# and of seacargos app database (read by dashboard location summary),
+# links one database tracking collection containers to ship by imo.
 # Adds ships information to one database, ships collection (imo, mmsi vesselName).
 
 import sys
-import requests
+import os
 import json
 from datetime import datetime
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, ASCENDING
 from pymongo.errors import ConnectionFailure
 from bson.json_util import dumps
-from bs4 import BeautifulSoup
 import access
+from fetch_pool import fetch_all
+
+from seacargos.etl.scrape import vessel_link, coordinate
+from seacargos.etl.positions import setup_positions, save_positions
+from seacargos.etl.positions import active_vessels
+from seacargos.etl.oneline_update import conn_db
+
+MMSI_URL = "https://www.shiplocation.com/vessels?"
+LOCATION_URL = "https://www.vesselfinder.com/vessels/{}-IMO-{}-MMSI-{}"
+# Seacargos app database
+APP_CONFIG = "../instance/prod_config.json"
+APP_ENV = "production"
+# In-process imo -> mmsi cache, kept for process lifetime
+_mmsi_cache = {}
 
 def log(message):
     """Log function to log errors."""
@@ -82,63 +97,78 @@ def ships_to_update():
         conn.close()
         return False
 
-def get_mmsi_from_web(imo):
-    """Get mmsi number from https://www.shiplocation.com
-    using imo number."""
-    # Get mmsi number from website
-    url = "https://www.shiplocation.com/vessels?"
+def mmsi_request(imo):
+    """Return (url, params) of https://www.shiplocation.com
+    mmsi request by imo number."""
     payload = {"page": "1", "vessel": imo, "sort": "none",
               "direction": "none", "flag": "none"}
-    headers = {"User-Agent": "Mozilla/5.0"}
-    r = requests.get(url, params=payload, headers=headers)
-    if r.status_code == 200:
-        soup = BeautifulSoup(r.text, "html.parser")
-        obj = soup.find("a", class_="vessel-link")
-        if obj:
-            link = obj.get("href")
-            mmsi = link[link.rfind("-") + 1:]
-        else:
-            mmsi = ""
-        #idx_start = r.text.find("MMSI-") + 5 # offset for 'MMSI-'
-        #idx_end = r.text.find('"', idx_start)
-        #mmsi = r.text[idx_start:idx_end]
-        if mmsi.isdigit() and len(mmsi) == 9:
-            return mmsi
+    return MMSI_URL, payload
+
+def parse_mmsi(html):
+    """Get mmsi number from https://www.shiplocation.com raw html."""
+    link = vessel_link(html)
+    if link:
+        return link[link.rfind("-") + 1:]
+    return ""
+
+def get_mmsi_from_web(imos):
+    """Get mmsi numbers from https://www.shiplocation.com using imo
+    numbers concurrently. Return {imo: mmsi} of found ones."""
+    result = {}
+    jobs = [(imo, *mmsi_request(imo)) for imo in imos]
+    for imo, r in fetch_all(jobs, log=log):
+        if r is None:
+            continue
+        if r.status_code == 200:
+            mmsi = parse_mmsi(r.text)
+            if mmsi.isdigit() and len(mmsi) == 9:
+                result[imo] = mmsi
+            else:
+                log("[Update ship location] [Get mmsi from web] "\
+                    + f"[mmsi for imo {imo} not found]")
         else:
             log("[Update ship location] [Get mmsi from web] "\
-                + f"[mmsi for imo {imo} not found]")
-    else:
-        log("[Update ship location] [Get mmsi from web] "\
-                + f"[{r.status_code} for imo {imo}]")
+                    + f"[{r.status_code} for imo {imo}]")
+    return result
 
-def insert_ship_to_db(ship):
-    """Insert ship record to db."""
-    # Connect to database and update data
+def save_ships(db, ships):
+    """Upsert imo -> mmsi mappings of ships to ships collection
+    with one bulk write."""
+    now = datetime.now().replace(microsecond=0)
+    ops = [UpdateOne(
+        {"imo": ship["imo"]},
+        {"$set": {"vesselName": ship["vesselName"], "mmsi": ship["mmsi"],
+                  "lastUpdate": now}},
+        upsert=True
+        ) for ship in ships]
+    if ops:
+        db.ships.bulk_write(ops, ordered=False)
+
+def setup_ships():
+    """Create unique imo index of ships collection imo -> mmsi mappings.
+    Crawled ships (ships_web_scrapper.py) store int imo and are not
+    indexed. Non unique index of previous versions is replaced."""
     conn = MongoClient(access.update)
     try:
         conn.admin.command("ping")
-        now = datetime.now().replace(microsecond=0)
-        ship_copy = ship.copy()
-        del ship_copy["cntrNo"]
-        ship_copy["lastUpdate"] = now
-        cur = conn.one.ships.insert_one(ship_copy)
-        conn.close()
-        if cur.acknowledged == False:
-            log("[Update ship location] [Insert ship to db] "\
-                + f"[Imo {ship['imo']} not inserted]")
+        index = conn.one.ships.index_information().get("imo_index", {})
+        if index and not index.get("unique", False):
+            conn.one.ships.drop_index("imo_index")
+        conn.one.ships.create_index(
+            [("imo", ASCENDING)], name="imo_index", unique=True,
+            partialFilterExpression={"imo": {"$type": "string"}}
+            )
     except ConnectionFailure:
-        log("[Update ship location] [Insert ship to db] "\
-            + "[DB Connection failure for imo "\
-            + f"{ship['imo']}, mmsi {ship['mmsi']}]")
-        conn.close()
+        log("[Update ship location] [Setup ships] "\
+            + "[DB Connection failure]")
     except BaseException as err:
-        log("[Update ship location] [Insert ship to db] "\
-            + f"[{err} for imo {ship['imo']}, mmsi {ship['mmsi']}]")
-        conn.close()
+        log(f"[Update ship location] [Setup ships] [{err}]")
+    conn.close()
 
 def get_mmsi(ships):
-    """Get mmsi from db or web, add to 'ships' argument.
-    If mmsi not found in db, add it from web to db.
+    """Get mmsi from cache, db or web, add to 'ships' argument.
+    Db is queried once for all cache misses, mmsi not found in db
+    are requested from web and upserted to db with one bulk write.
     Return 'ships' agrument with mmsi."""
     # Check arguments
     if not ships:
@@ -146,47 +176,49 @@ def get_mmsi(ships):
             + "[No input arguments]")
         return False
     # Connect to database and get data
+    missing = {s["imo"] for s in ships if s["imo"] not in _mmsi_cache}
     conn = MongoClient(access.update)
+    try:
+        conn.admin.command("ping")
+        if missing:
+            cur = conn.one.ships.find(
+                {"imo": {"$in": list(missing), "$type": "string"}},
+                {"imo": 1, "mmsi": 1, "_id": 0}
+            )
+            for doc in cur:
+                _mmsi_cache[doc["imo"]] = doc["mmsi"]
+            missing -= set(_mmsi_cache)
+        # Get missing mmsi from web concurrently, one request per imo
+        if missing:
+            found = get_mmsi_from_web(missing)
+            _mmsi_cache.update(found)
+            names = {s["imo"]: s["vesselName"] for s in ships}
+            save_ships(conn.one, [
+                {"imo": imo, "mmsi": mmsi, "vesselName": names[imo]}
+                for imo, mmsi in found.items()
+            ])
+    except ConnectionFailure:
+        log("[Update ship location] [Get mmsi] "\
+            + "[DB Connection failure]")
+    except BaseException as err:
+        log(f"[Update ship location] [Get mmsi] [{err}]")
+    conn.close()
     for ship in ships:
-        try:
-            # Get record from db or from web
-            conn.admin.command("ping")
-            cur = conn.one.ships.find({"imo": ship["imo"]})
-            now = datetime.now().replace(microsecond=0)
-            db_data = json.loads(dumps(cur))
-            if len(db_data) == 0:
-                mmsi = get_mmsi_from_web(ship["imo"])
-                if mmsi:
-                    ship["mmsi"] = mmsi
-                    insert_ship_to_db(ship)
-                else:
-                    log("[Update ship location] [Get mmsi] "\
-                        + f"[MMSI for imo {ship['imo']} not inserted to db]")
-            elif len(db_data) == 1:
-                ship["mmsi"] = db_data[0]["mmsi"]
-        except ConnectionFailure:
-            log("[Update ship location] [Get mmsi] "\
-                + f"[DB Connection failure for imo {ship['imo']}]")
-            conn.close()
-        except BaseException as err:
+        if ship["imo"] in _mmsi_cache:
+            ship["mmsi"] = _mmsi_cache[ship["imo"]]
+        else:
             log("[Update ship location] [Get mmsi] "\
-                + f"[{err} for imo {ship['imo']}]")
-            conn.close()
+                + f"[MMSI for imo {ship['imo']} not found]")
     return ships
 
 def parse_lon_lat(html):
     """Get latitude and longitute from
     https://www.vesselfinder.com raw html."""
-    soup = BeautifulSoup(html, "html.parser")
     location = []
     for i in ["coordinate lon", "coordinate lat"]:
-        obj = soup.find("div", class_=i)
-        if obj:
-            text = obj.text
-            if text.replace(".", "").replace("-", "").isdigit():
-                location.append(text)
-            else:
-                location.append("")
+        text = coordinate(html, i)
+        if text and text.replace(".", "").replace("-", "").isdigit():
+            location.append(text)
         else:
             location.append("")
     return location
@@ -198,49 +230,83 @@ def get_ships_location(ships):
         log("[Update ship location] [Get ships location] "\
             + "[No input arguments]")
         return False
-    # Run get requests for locations
-    base_url = "https://www.vesselfinder.com/vessels/{}-IMO-{}-MMSI-{}"
-    headers = {"User-Agent": "Mozilla/5.0"}
+    # Run concurrent get requests for locations, one request per vessel
+    targets = {}
     for ship in ships:
-        url = base_url.format(ship["vesselName"].replace(" ", "-"),
-                              ship["imo"], ship["mmsi"])
-        r = requests.get(url, headers=headers)
+        ship["location"] = ["", ""]
+        if "mmsi" not in ship:
+            continue
+        url = LOCATION_URL.format(ship["vesselName"].replace(" ", "-"),
+                                  ship["imo"], ship["mmsi"])
+        targets.setdefault(url, []).append(ship)
+    jobs = [(url, url, None) for url in targets]
+    for url, r in fetch_all(jobs, log=log):
+        imo = targets[url][0]["imo"]
+        if r is None:
+            continue
         if r.status_code == 200:
             location = parse_lon_lat(r.text)
-            ship["location"] = location
             if "" in location:
                 log("[Update ship location] [Get ships location] "\
-                    + f"[Parsing failed for imo {ship['imo']}]")
-                ship["location"] = location
+                    + f"[Parsing failed for imo {imo}]")
             else:
-                ship["location"] = [float(location[0]), float(location[1])]
+                location = [float(location[0]), float(location[1])]
+            for ship in targets[url]:
+                ship["location"] = location
         else:
             log("[Update ship location] [Get ships location] "\
-                + f"[{r.status_code} for imo {ship['imo']}]")
-            ship["location"] = ["", ""]
+                + f"[{r.status_code} for imo {imo}]")
     return ships
 
-def update(ships):
-    """Update ships location in tracking collection."""
+def app_ships(app):
+    """Return vessels of active app shipments in ships_to_update()
+    format without container number."""
+    try:
+        return [dict(i, cntrNo=None) for i in active_vessels(app)]
+    except BaseException as err:
+        log(f"[Update ship location] [App ships] [{err}]")
+        return []
+
+def update(ships, app=None):
+    """Save one position per vessel to vessel_positions time series
+    collection of one and app databases and link containers to vessel
+    by imo in tracking collection with one update per vessel."""
+    # Check arguments
+    if not ships:
+        return False
+    # Group containers by vessel
+    vessels = {}
+    for ship in ships:
+        vessel = vessels.setdefault(ship["imo"], {
+            "vesselName": ship["vesselName"], "location": ship["location"],
+            "containers": []
+        })
+        if ship["cntrNo"]:
+            vessel["containers"].append(ship["cntrNo"])
+    positions = {}
+    for imo, vessel in vessels.items():
+        if "" in vessel["location"]:
+            log("[Update ship location] [Update] "\
+                + f"[No lon lat to update imo {imo}]")
+        else:
+            positions[imo] = vessel["location"]
     # Connect to database and update
     conn = MongoClient(access.update)
     try:
         conn.admin.command("ping")
-        for ship in ships:
-            if "" in ship["location"]:
-                log("[Update ship location] [Update] "\
-                    + "[No lon lat to update imo "\
-                    + f"{ship['imo']}/cntr {ship['cntrNo']}]")
-            else:
-                query = {"cntrNo": ship["cntrNo"]}
-                change = {"$set": {
-                    "vesselName": ship["vesselName"],
-                    "location": ship["location"]
-                }}
-                cur = conn.one.tracking.update_one(query, change)
-                if cur.acknowledged == False:
-                    log("[Update ship location] [Update] "\
-                    + f"[{ship['cntrNo']} location not updated]")
+        setup_positions(conn.one)
+        save_positions(conn.one, positions)
+        if app is not None:
+            setup_positions(app)
+            save_positions(app, positions)
+        for imo, vessel in vessels.items():
+            if not vessel["containers"]:
+                continue
+            conn.one.tracking.update_many(
+                {"cntrNo": {"$in": vessel["containers"]}},
+                {"$set": {"vesselName": vessel["vesselName"],
+                          "vesselImo": imo}}
+            )
         conn.close()
     except ConnectionFailure:
         log(f"[Update ship location] [Update] [Connection failure]")
@@ -251,10 +317,17 @@ def update(ships):
 
 def main():
 	"""Pipeline."""
-	ships = ships_to_update()
+	setup_ships()
+	ships = ships_to_update() or []
+	app_conn, app = None, None
+	if os.path.exists(APP_CONFIG):
+		app_conn, app = conn_db(APP_CONFIG, APP_ENV)
+		ships += app_ships(app)
 	ships_with_mmsi = get_mmsi(ships)
 	ships_with_location = get_ships_location(ships_with_mmsi)
-	update(ships_with_location)
+	update(ships_with_location, app)
+	if app_conn:
+		app_conn.close()
 
 if __name__ == '__main__':
 	sys.exit(main())
\ No newline at end of file
@@ -54,4 +54,12 @@ def create_app(test_config=None):
     app.register_blueprint(dashboard.bp)
     app.add_url_rule("/dashboard", endpoint="dashboard")
 
+    # Register dashboard analytics blueprint
+    from . import analytics
+    app.register_blueprint(analytics.bp)
+
+    # Register dashboard JSON API blueprint
+    from . import api
+    app.register_blueprint(api.bp)
+
     return app
@@ -3,19 +3,23 @@
 # https://github.com/evgeny81d/seacargos/blob/main/LICENSE
 
 from flask import Blueprint
+from flask import current_app
 from flask import flash
 from flask import g
+from flask import jsonify
+from flask import Response
 from flask import session
 from flask import redirect
 from flask import render_template
 from flask import request
 from flask import url_for
+from flask import stream_with_context
 
 
 from bson.objectid import ObjectId
-from bson.json_util import dumps
-import json
+from pymongo import ASCENDING
 import functools
+import re
 from werkzeug.exceptions import abort
 from werkzeug.security import check_password_hash, generate_password_hash
 from seacargos.db import db_conn
@@ -23,6 +27,9 @@ import os
 
 bp = Blueprint('admin', __name__)
 
+# Number of users per page on view-users page and user selectors
+USERS_PAGE_SIZE = 50
+
 @bp.before_app_request
 def load_logged_in_user():
     """Loads logged in user from session to g."""
@@ -92,6 +99,7 @@ def edit_user():
     db = db_conn()[g.db_name]
     content = {"roles": ["admin", "user"]}
     content["user_names"] = active_user_names_from_db(db)
+    content["active"] = 1
     # POST method
     if request.method == "POST":
         query = {}
@@ -115,6 +123,8 @@ def edit_user():
         
         # Check request and change data, and make update or send error message
         if len(query) == 1 and len(change) > 0:
+            # Only active users are listed in the user selector
+            query["active"] = True
             cur = db.users.update_one(query, {"$set": change})
             if cur.raw_result["updatedExisting"]:
                 content["info"] = "User data successfully updated."
@@ -132,14 +142,14 @@ def edit_user():
 def block_user():
     """Block user form page."""
     db = db_conn()[g.db_name]
-    content = {}
+    content = {"active": 1}
     content["user_names"] = active_user_names_from_db(db)
     # POST method
     if request.method == "POST":
         form_data = dict(request.form)
         if form_data["user-name"] != "":
             cur = db.users.update_one(
-                {"name": form_data["user-name"]},
+                {"name": form_data["user-name"], "active": True},
                 {"$set": {"active": False}}
                 )
             if cur.raw_result["updatedExisting"]:
@@ -156,14 +166,14 @@ def block_user():
 def unblock_user():
     """Unblock user form page."""
     db = db_conn()[g.db_name]
-    content = {}
+    content = {"active": 0}
     content["user_names"] = blocked_user_names_from_db(db)
     # POST method
     if request.method == "POST":
         form_data = dict(request.form)
         if form_data["user-name"] != "":
             cur = db.users.update_one(
-                {"name": form_data["user-name"]},
+                {"name": form_data["user-name"], "active": False},
                 {"$set": {"active": True}}
                 )
             if cur.raw_result["updatedExisting"]:
@@ -178,13 +188,43 @@ def unblock_user():
 @bp.route("/admin/view-users")
 @admin_login_required
 def view_users():
-    """View users page."""
+    """View users page (one page of users sorted by name)."""
     db = db_conn()[g.db_name]
     content = {}
-    content["users"] = users_from_db(db)
+    content["search"] = request.args.get("q", "")
+    after = request.args.get("after", None)
+    content["users"], content["next"] = users_from_db(
+        db, search=content["search"], after=after
+        )
+
+    return Response(stream_with_context(
+        stream_template("admin/view_users.html", content=content)
+        ))
+
+@bp.route("/admin/user-names")
+@admin_login_required
+def user_names():
+    """Search-as-you-type source for user selectors.
+    Return one page of user names as JSON."""
+    db = db_conn()[g.db_name]
+    search = request.args.get("q", "")
+    after = request.args.get("after", None)
+    if request.args.get("active", "1") == "1":
+        names = active_user_names_from_db(db, search, after)
+    else:
+        names = blocked_user_names_from_db(db, search, after)
+    next_name = names[-1] if len(names) == USERS_PAGE_SIZE else None
+    return jsonify({"names": names, "next": next_name})
 
-    return render_template("admin/view_users.html", content=content)
 # Helper functions
+def stream_template(template_name, **context):
+    """Render template as generator of strings to stream response."""
+    current_app.update_template_context(context)
+    template = current_app.jinja_env.get_template(template_name)
+    stream = template.stream(context)
+    stream.enable_buffering(5)
+    return stream
+
 # Admin
 def size(bytes):
     """Accepts size in bytes as integer and returns size as string
@@ -238,26 +278,46 @@ def etl_log_stats():
     stats["size"] = size(os.path.getsize("etl.log"))
     return stats
 
+# Admin/edit-user, admin/block-user, admin/unblock-user, admin/view-users
+def name_query(query, search=None, after=None):
+    """Add name prefix search and name cursor conditions to query.
+    Anchored prefix regex and $gt cursor are both served by name_index."""
+    name = {}
+    if search:
+        name["$regex"] = "^" + re.escape(search)
+    if after:
+        name["$gt"] = after
+    if name:
+        query["name"] = name
+    return query
+
 # Admin/edit-user and admin/block-user
-def active_user_names_from_db(db):
-    """Returns list of active user names from database."""
-    names = []
-    cursor = db.users.find({"active": True}, {"_id": 0, "name": 1})
-    for c in cursor:
-        names.append(c["name"])
-    return names
+def active_user_names_from_db(db, search=None, after=None,
+                              limit=USERS_PAGE_SIZE):
+    """Returns one page of active user names from database."""
+    query = name_query({"active": True}, search, after)
+    cursor = db.users.find(query, {"_id": 0, "name": 1})\
+        .sort("name", ASCENDING).limit(limit)
+    return [c["name"] for c in cursor]
 
 # Admin/unblock-user
-def blocked_user_names_from_db(db):
-    """Returns list of blocked user names from database."""
-    names = []
-    cursor = db.users.find({"active": False}, {"_id": 0, "name": 1})
-    for c in cursor:
-        names.append(c["name"])
-    return names   
+def blocked_user_names_from_db(db, search=None, after=None,
+                               limit=USERS_PAGE_SIZE):
+    """Returns one page of blocked user names from database."""
+    query = name_query({"active": False}, search, after)
+    cursor = db.users.find(query, {"_id": 0, "name": 1})\
+        .sort("name", ASCENDING).limit(limit)
+    return [c["name"] for c in cursor]
 
 # Admin/view-users
-def users_from_db(db):
-    """Returns users info from database."""
-    cursor = db.users.find({}, {"_id": 0, "password": 0})
-    return json.loads(dumps(cursor))
+def users_from_db(db, search=None, after=None, limit=USERS_PAGE_SIZE):
+    """Returns one page of users info from database and name to start
+    next page from (None for the last page)."""
+    cursor = db.users.find(
+        name_query({}, search, after), {"_id": 0, "password": 0}
+        ).sort("name", ASCENDING).limit(limit + 1)
+    users = list(cursor)
+    if len(users) > limit:
+        users = users[:limit]
+        return users, users[-1]["name"]
+    return users, None
@@ -0,0 +1,180 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Transit time and delay analytics by lane, outbound or inbound terminal.
+# Tracking fields are loaded column-wise into NumPy arrays and all
+# groups are computed in one vectorized pass. Results are cached per
+# user and invalidated when user tracking data version changes.
+# Large accounts read statistics materialized by etl/lane_stats.py.
+
+from collections import OrderedDict
+from datetime import datetime as dt
+from datetime import timedelta
+
+import numpy as np
+from flask import Blueprint, g, render_template, request
+
+from seacargos.db import db_conn
+from seacargos.dashboard import user_login_required
+from seacargos.dashboard import tracking_version
+from seacargos.dashboard import parse_date
+
+bp = Blueprint("analytics", __name__)
+
+GROUPS = ["lane", "outboundTerminal", "inboundTerminal"]
+PROJECTION = {
+    "outboundTerminal": 1, "inboundTerminal": 1, "departureDate": 1,
+    "arrivalDate": 1, "requestedETA": 1, "plannedArrivalDate": 1, "_id": 0
+}
+CACHE_SIZE = 128
+LARGE_ACCOUNT = 10000
+_cache = OrderedDict()
+
+@bp.route("/dashboard/analytics")
+@user_login_required
+def analytics():
+    """Transit time and delay statistics view."""
+    db = db_conn()[g.db_name]
+    content = request_args()
+    content["stats"] = lane_stats(db, g.user["name"], **content)
+    content["groups"] = GROUPS
+    return render_template("dashboard/analytics.html", content=content)
+
+# Helper functions
+def request_args():
+    """Validate analytics request arguments."""
+    group_by = request.args.get("group", "lane")
+    return {
+        "group_by": group_by if group_by in GROUPS else "lane",
+        "date_from": parse_date(request.args.get("from", None)),
+        "date_to": parse_date(request.args.get("to", None))
+    }
+
+def date_or_none(value):
+    """Return value if it is datetime object, else None."""
+    return value if isinstance(value, dt) else None
+
+def load_columns(db, user, date_from=None, date_to=None):
+    """Load user records (active and archived) departed in date
+    range (date_to day inclusive) as dict of NumPy arrays.
+    Unknown dates are NaT."""
+    query = {"user": user}
+    if date_from or date_to:
+        query["departureDate"] = {}
+    if date_from:
+        query["departureDate"]["$gte"] = date_from
+    if date_to:
+        query["departureDate"]["$lt"] = date_to + timedelta(days=1)
+    names = ["outbound", "inbound", "departure", "arrival", "eta", "planned"]
+    columns = {name: [] for name in names}
+    for coll in [db.tracking, db.tracking_archive]:
+        for c in coll.find(query, PROJECTION, batch_size=1000):
+            columns["outbound"].append(c.get("outboundTerminal") or "")
+            columns["inbound"].append(c.get("inboundTerminal") or "")
+            columns["departure"].append(date_or_none(c.get("departureDate")))
+            columns["arrival"].append(date_or_none(c.get("arrivalDate")))
+            columns["eta"].append(date_or_none(c.get("requestedETA")))
+            columns["planned"].append(
+                date_or_none(c.get("plannedArrivalDate"))
+                )
+    arrays = {}
+    for name in names[:2]:
+        arrays[name] = np.array(columns[name], dtype=str)
+    for name in names[2:]:
+        arrays[name] = np.array(columns[name], dtype="datetime64[m]")
+    return arrays
+
+def group_keys(columns, group_by):
+    """Return group key array: 'from - to' locations for lane,
+    'location|terminal' strings for terminals."""
+    if group_by == "outboundTerminal":
+        return columns["outbound"]
+    if group_by == "inboundTerminal":
+        return columns["inbound"]
+    outbound = np.char.partition(columns["outbound"], "|")[:, 0]
+    inbound = np.char.partition(columns["inbound"], "|")[:, 0]
+    return np.char.add(np.char.add(outbound, " - "), inbound)
+
+def summary(values):
+    """Summary of days values, NaN values are skipped."""
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return None
+    p50, p90 = np.percentile(values, [50, 90])
+    return {
+        "mean": round(float(values.mean()), 1), "p50": round(float(p50), 1),
+        "p90": round(float(p90), 1), "min": round(float(values.min()), 1),
+        "max": round(float(values.max()), 1)
+    }
+
+def compute_stats(columns, group_by="lane"):
+    """Compute transit days and planned vs actual arrival slippage
+    distributions and on-time rate (arrival <= requested ETA)
+    for every group."""
+    if columns["departure"].size == 0:
+        return []
+    names, inverse = np.unique(
+        group_keys(columns, group_by), return_inverse=True
+        )
+    day = np.timedelta64(1, "D")
+    transit = (columns["arrival"] - columns["departure"]) / day
+    slippage = (columns["arrival"] - columns["planned"]) / day
+    has_eta = ~np.isnat(columns["eta"]) & ~np.isnat(columns["arrival"])
+    on_time = has_eta & (columns["arrival"] <= columns["eta"])
+
+    # Per group counters
+    counts = np.bincount(inverse, minlength=names.size)
+    eta_counts = np.bincount(inverse, weights=has_eta, minlength=names.size)
+    on_time_counts = np.bincount(
+        inverse, weights=on_time, minlength=names.size
+        )
+
+    # Group values segments for percentiles
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.cumsum(counts)[:-1]
+    transit_groups = np.split(transit[order], bounds)
+    slippage_groups = np.split(slippage[order], bounds)
+
+    stats = []
+    for i, name in enumerate(names):
+        rate = None
+        if eta_counts[i] > 0:
+            rate = round(float(on_time_counts[i] / eta_counts[i]), 3)
+        stats.append({
+            "group": str(name), "shipments": int(counts[i]),
+            "transitDays": summary(transit_groups[i]),
+            "slippageDays": summary(slippage_groups[i]),
+            "onTimeRate": rate
+        })
+    return stats
+
+def stored_lane_stats(db, user, group_by="lane"):
+    """Return statistics from lane_stats collection."""
+    cursor = db.lane_stats.find(
+        {"user": user, "groupBy": group_by},
+        {"_id": 0, "user": 0, "groupBy": 0, "updated": 0}
+        ).sort("group", 1)
+    return list(cursor)
+
+def lane_stats(db, user, group_by="lane", date_from=None, date_to=None):
+    """Return statistics. Whole history of large accounts is read from
+    lane_stats collection, otherwise cached statistics are returned and
+    recomputed when user tracking data version has changed."""
+    if not date_from and not date_to:
+        stored = stored_lane_stats(db, user, group_by)
+        if sum(i["shipments"] for i in stored) >= LARGE_ACCOUNT:
+            return stored
+    version = tracking_version(db, user)
+    key = (user, group_by, date_from, date_to)
+    cached = _cache.get(key, None)
+    if cached and cached[0] == version:
+        _cache.move_to_end(key)
+        return cached[1]
+    stats = compute_stats(
+        load_columns(db, user, date_from, date_to), group_by
+        )
+    _cache[key] = (version, stats)
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return stats
@@ -0,0 +1,151 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Read-only JSON API for dashboard data.
+# Responses carry ETag of user tracking data version, unchanged
+# polls get 304 Not Modified without running data queries.
+
+import functools
+from datetime import datetime
+
+from flask import Blueprint, g, jsonify, request, Response
+from werkzeug.exceptions import abort
+
+from seacargos.db import db_conn
+from seacargos.dashboard import tracking_summary
+from seacargos.dashboard import tracking_version
+from seacargos.dashboard import db_tracking_data
+from seacargos.dashboard import table_page
+from seacargos.dashboard import schedule_table_data
+from seacargos.dashboard import db_get_details
+from seacargos.dashboard import parse_sort
+from seacargos.dashboard import page_size
+from seacargos.dashboard import decode_cursor
+from seacargos.dashboard import TABLE_DEFAULT_SORT
+from seacargos.dashboard import TABLE_MAX_PAGE_SIZE
+from seacargos.dashboard import TABLE_ROW_PROJECTION
+from seacargos.dashboard import last_record_update
+from seacargos.dashboard import changed_records
+from seacargos.analytics import lane_stats
+from seacargos.analytics import request_args
+
+bp = Blueprint("api", __name__, url_prefix="/api")
+
+def api_login_required(view):
+    @functools.wraps(view)
+    def wrapped_view(**kwargs):
+        if g.user is None:
+            abort(401, "Login required.")
+        elif g.user["role"] != "user":
+            abort(403, "You are not authorized to view this page.")
+        return view(**kwargs)
+    return wrapped_view
+
+def conditional(view):
+    """Answer 304 Not Modified if client ETag matches user tracking
+    data version, otherwise run view and tag response."""
+    @functools.wraps(view)
+    def wrapped_view(**kwargs):
+        db = db_conn()[g.db_name]
+        etag = tracking_version(db, g.user["name"])
+        if etag and request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = view(**kwargs)
+        if etag:
+            response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+    return wrapped_view
+
+@bp.route("/dashboard/summary")
+@api_login_required
+@conditional
+def summary():
+    """Tracking summary."""
+    db = db_conn()[g.db_name]
+    return jsonify(tracking_summary(db, g.user["name"]))
+
+@bp.route("/dashboard/table")
+@api_login_required
+@conditional
+def table():
+    """One page of active shipments table."""
+    db = db_conn()[g.db_name]
+    sort = parse_sort(request.args.get("sort", TABLE_DEFAULT_SORT))
+    size = page_size(request.args.get("size", None))
+    after = decode_cursor(request.args.get("after", None))
+    cursor = db_tracking_data(g.user["name"], db, sort, after, size)
+    page, next_page = table_page(cursor, sort, size)
+    content = schedule_table_data(page)
+    content["next"] = next_page
+    return jsonify(content)
+
+@bp.route("/dashboard/<bkg_number>")
+@api_login_required
+@conditional
+def details(bkg_number):
+    """Shipment details."""
+    db = db_conn()[g.db_name]
+    record = db_get_details(db, bkg_number, g.user["name"])
+    if not record:
+        abort(404, f"Record {bkg_number} not found in database.")
+    return jsonify({
+        "bkg_number": bkg_number,
+        "record_update": record["recordUpdate"].strftime("%d-%m-%Y %H:%M"),
+        "details": record["details"]
+    })
+
+@bp.route("/dashboard/analytics")
+@api_login_required
+@conditional
+def analytics():
+    """Transit time and delay statistics by group."""
+    db = db_conn()[g.db_name]
+    args = request_args()
+    return jsonify(lane_stats(db, g.user["name"], **args))
+
+@bp.route("/dashboard/rows")
+@api_login_required
+def rows():
+    """Active shipments table rows for bkgNo request arguments."""
+    db = db_conn()[g.db_name]
+    bookings = request.args.getlist("bkgNo")[:TABLE_MAX_PAGE_SIZE]
+    cursor = db.tracking.find(
+        {"user": g.user["name"], "trackEnd": None,
+         "bkgNo": {"$in": bookings}},
+        dict(TABLE_ROW_PROJECTION, _id=0)
+        )
+    return jsonify(schedule_table_data(cursor))
+
+@bp.route("/dashboard/changes")
+@api_login_required
+@conditional
+def changes():
+    """User records updated or closed by ETL after since request
+    argument. Answers at once, browser polls with If-None-Match
+    every POLL_INTERVAL seconds and gets 304 until ETL changes
+    user data, so no worker is held between polls."""
+    db = db_conn()[g.db_name]
+    user = g.user["name"]
+    since = parse_since(request.args.get("since", None))
+    result = None
+    if since is None:
+        since = last_record_update(db, user) or datetime.now()
+    else:
+        result = changed_records(db, user, since)
+    # No changes on first poll or database error (False), client
+    # polls again from the same date
+    if not result:
+        result = {"updated": [], "closed": [], "since": since}
+    result["since"] = result["since"].isoformat()
+    return jsonify(result)
+
+# Helper functions
+def parse_since(value):
+    """Convert since request argument to datetime object or None."""
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
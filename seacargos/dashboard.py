@@ -3,7 +3,8 @@
 # https://github.com/evgeny81d/seacargos/blob/main/LICENSE
 
 from flask import (
-    Blueprint, flash, g, redirect, render_template, session, request, url_for
+    Blueprint, flash, g, redirect, render_template, session, request, url_for,
+    Response, stream_with_context
 )
 from werkzeug.exceptions import abort
 from werkzeug.security import check_password_hash, generate_password_hash
@@ -11,18 +12,65 @@ from markupsafe import escape
 
 import functools
 import json
+import base64
+import csv
+import io
+import os
+import tempfile
+import hashlib
+import heapq
+import itertools
 from datetime import datetime as dt
-from bson.json_util import dumps
+from datetime import timedelta
+from bson.json_util import dumps, loads
 from bson.objectid import ObjectId
-from seacargos.db import db_conn
+from seacargos.db import db_conn, TABLE_SORT_COLUMNS
+from pymongo import ASCENDING, DESCENDING
 from pymongo.errors import ConnectionFailure
 
 from seacargos.etl.oneline import etl_one
 from seacargos.etl.oneline_update import user_schedule_update
 from seacargos.etl.oneline_update import record_schedule_update
+from seacargos.etl.fields import table_row, record_details
+from seacargos.etl.schedule import unpack, planned_dates
+from seacargos.etl.refs import decode_schedule, vessel_name
+from seacargos.etl.positions import latest_positions
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
 
 bp = Blueprint("dashboard", __name__)
 
+# Dashboard shipments table paging and sorting
+TABLE_PAGE_SIZE = 50
+TABLE_MAX_PAGE_SIZE = 500
+TABLE_DEFAULT_SORT = "-departureDate"
+HISTORY_SORT = "-trackEnd"
+# Precomputed table row and fields of table_row() for documents without it
+TABLE_ROW_PROJECTION = {
+    "tableRow": 1, "refId": 1, "bkgNo": 1, "cntrNo": 1, "cntrType": 1,
+    "requestedETA": 1, "outboundTerminal": 1, "departureDate": 1,
+    "inboundTerminal": 1, "arrivalDate": 1
+}
+# MongoDB sort order of value types (keyset pagination)
+BSON_TYPE_ORDER = [
+    "null", "number", "string", "object", "objectId", "bool", "date"
+]
+
+# Shipments table export
+EXPORT_BATCH_SIZE = 500
+EXPORT_STATUSES = ["active", "arrived", "all"]
+EXPORT_COLUMNS = [
+    ("Ref Id", "refId"), ("Booking", "booking"), ("Container", "container"),
+    ("Type", "type"), ("From", "from.location"),
+    ("From terminal", "from.terminal"), ("Departure", "departure"),
+    ("To", "to.location"), ("To terminal", "to.terminal"),
+    ("Arrival", "arrival"), ("Requested ETA", "requestedETA"),
+    ("Total Days", "totalDays"), ("ETA delay", "etaDelay")
+]
+
 @bp.before_app_request
 def load_logged_in_user():
     """Loads logged in user from session to g."""
@@ -82,21 +130,42 @@ def dashboard():
     
     # GET request
     content.update(tracking_summary(db, g.user["name"]))
-    cursor = db_tracking_data(g.user["name"], db)
-    table_data = schedule_table_data(cursor)
+    content.update(location_summary(db, g.user["name"]) or {})
+    sort = parse_sort(request.args.get("sort", TABLE_DEFAULT_SORT))
+    size = page_size(request.args.get("size", None))
+    after = decode_cursor(request.args.get("after", None))
+    cursor = db_tracking_data(g.user["name"], db, sort, after, size)
+    page, content["next"] = table_page(cursor, sort, size)
+    table_data = schedule_table_data(page)
     content.update(table_data)
+    content["sort"] = sort
+    content["size"] = size
 
     return render_template("dashboard/dashboard.html", content=content)
 
+@bp.route("/dashboard/history")
+@user_login_required
+def history():
+    """Arrived shipments view (active and archived records)."""
+    db = db_conn()[g.db_name]
+    content = {}
+    size = page_size(request.args.get("size", None))
+    after = decode_cursor(request.args.get("after", None))
+    cursor = db_history_data(g.user["name"], db, after, size)
+    page, content["next"] = table_page(cursor, HISTORY_SORT, size)
+    content.update(schedule_table_data(page))
+    content["size"] = size
+    return render_template("dashboard/history.html", content=content)
+
 @bp.route("/dashboard/<bkg_number>")
 @user_login_required
 def details(bkg_number):
     """View to display shipment details."""
     db = db_conn()[g.db_name]
     content = {}
-    record = db_get_record(db, bkg_number, g.user["name"])
+    record = db_get_details(db, bkg_number, g.user["name"])
     if record:
-        content["details"] = prepare_record_details(record)
+        content["details"] = record["details"]
         content["bkg_number"] = bkg_number
         content["record_update"] = \
             dt.strftime(record["recordUpdate"], "%d-%m-%Y %H:%M")
@@ -104,6 +173,38 @@ def details(bkg_number):
         flash(f"Record {bkg_number} not found in database.")
     return render_template("/dashboard/details.html", content=content)
 
+@bp.route("/dashboard/export")
+@user_login_required
+def export():
+    """Download shipments table as CSV or XLSX file. Rows are streamed
+    from database cursor, whole table is never held in memory.
+    Request arguments: format (csv, xlsx), status (active, arrived,
+    all), from and to departure dates (YYYY-MM-DD)."""
+    db = db_conn()[g.db_name]
+    file_format = request.args.get("format", "csv")
+    status = request.args.get("status", "active")
+    if status not in EXPORT_STATUSES or file_format not in ["csv", "xlsx"]:
+        abort(400, "Wrong export format or status.")
+    if file_format == "xlsx" and xlsxwriter is None:
+        abort(501, "XLSX export is not available.")
+    date_from = parse_date(request.args.get("from", None))
+    date_to = parse_date(request.args.get("to", None))
+    rows = export_rows(db, g.user["name"], status, date_from, date_to)
+    name = f"shipments-{status}-{dt.now().strftime('%Y%m%d')}"
+    if file_format == "csv":
+        response = Response(
+            stream_with_context(csv_stream(rows)), mimetype="text/csv"
+            )
+    else:
+        response = Response(
+            stream_with_context(xlsx_stream(rows)),
+            mimetype="application/vnd.openxmlformats-officedocument."\
+                + "spreadsheetml.sheet"
+            )
+    response.headers["Content-Disposition"] = \
+        f"attachment; filename={name}.{file_format}"
+    return response
+
 @bp.route("/dashboard/update")
 @user_login_required
 def update():
@@ -126,6 +227,13 @@ def update_record(bkg_number):
 
     return redirect(url_for("dashboard.details", bkg_number=bkg_number))
 
+# Projection of tracking record fields used to compute details
+# for records without precomputed details field
+DETAILS_PROJECTION = {
+    "schedule": 1, "plannedDates": 1, "initSchedule.eventDate": 1,
+    "recordUpdate": 1, "_id": 0
+}
+
 # Helper functions
 def ping(func):
     """Catch database CRUD ops exceptions."""
@@ -183,14 +291,15 @@ def check_db_records(query, db):
 
 @ping
 def tracking_summary(db, user):
-    """Get tracking summary from database."""
+    """Get tracking summary from database. Arrived shipments are
+    counted in tracking and tracking_archive collections."""
     active = db.tracking.count_documents(
         {"user": user, "trackEnd": None}
         )
     arrived = db.tracking.count_documents(
         {"user": user, "trackEnd": {"$ne": None}}
-        )
-    total = db.tracking.count_documents({"user": user})
+        ) + db.tracking_archive.count_documents({"user": user})
+    total = active + arrived
     last_update = db.tracking.aggregate(
         [{"$match": {"user": user, "trackEnd": None}},
          {"$sort": {"regularUpdate": -1}},
@@ -210,71 +319,316 @@ def tracking_summary(db, user):
     return summary
 
 @ping
-def db_tracking_data(user, db):
+def location_summary(db, user):
+    """Get vessels of active shipments with number of containers on
+    board and latest vessel position."""
+    cur = db.tracking.aggregate([
+        {"$match": {"user": user, "trackEnd": None,
+                    "vesselImo": {"$ne": None}}},
+        {"$group": {"_id": "$vesselImo", "containers": {"$sum": 1}}},
+        {"$sort": {"_id": 1}}
+    ])
+    vessels = list(cur)
+    positions = latest_positions(db, [i["_id"] for i in vessels])
+    locations = []
+    for i in vessels:
+        position = positions.get(i["_id"], None)
+        locations.append({
+            "vessel": vessel_name(db, i["_id"]) or i["_id"], "imo": i["_id"],
+            "containers": i["containers"],
+            "lon": position["lon"] if position else None,
+            "lat": position["lat"] if position else None,
+            "updated_on": position["ts"].strftime("%d-%m-%Y %H:%M")
+                if position else "-"
+        })
+    return {"locations": locations}
+
+def parse_sort(value):
+    """Validate sort request argument ("field" or "-field" for
+    descending order). Return default sort for unknown fields."""
+    if value and value.lstrip("-") in TABLE_SORT_COLUMNS:
+        return value
+    return TABLE_DEFAULT_SORT
+
+def page_size(value):
+    """Validate page size request argument."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return TABLE_PAGE_SIZE
+    return min(max(size, 1), TABLE_MAX_PAGE_SIZE)
+
+def encode_cursor(record, sort):
+    """Encode sort field value and _id of the last table row
+    as url safe next page cursor."""
+    field = sort.lstrip("-")
+    raw = dumps([record.get(field), record["_id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(token):
+    """Decode next page cursor. Return [value, _id] or None."""
+    if not token:
+        return None
+    try:
+        value, _id = loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(_id, ObjectId):
+        return None
+    return [value, _id]
+
+def bson_type(value):
+    """Return BSON type alias of sort column value."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, dt):
+        return "date"
+    if isinstance(value, ObjectId):
+        return "objectId"
+    return "object"
+
+def keyset_query(query, sort, after):
+    """Add keyset pagination condition to query: documents follow
+    [sort value, _id] after cursor in sort order. Comparison operators
+    match values of the same BSON type only, so values of types which
+    follow cursor value type in BSON sort order are added explicitly
+    (not yet known dates "" and None in date columns)."""
+    if not after:
+        return query
+    field = sort.lstrip("-")
+    value, _id = after
+    descending = sort.startswith("-")
+    op = "$lt" if descending else "$gt"
+    rank = BSON_TYPE_ORDER.index(bson_type(value))
+    if descending:
+        following = BSON_TYPE_ORDER[:rank]
+    else:
+        following = BSON_TYPE_ORDER[rank + 1:]
+    conditions = [{field: value, "_id": {op: _id}}]
+    if value is not None:
+        conditions.append({field: {op: value}})
+    if "null" in following:
+        # Null and missing values
+        conditions.append({field: None})
+        following = [i for i in following if i != "null"]
+    if following:
+        conditions.append({field: {"$type": following}})
+    query["$or"] = conditions
+    return query
+
+@ping
+def db_tracking_data(user, db, sort=TABLE_DEFAULT_SORT, after=None,
+                     limit=None):
     """Get shipments that did not reach destination from
-    tracking collection."""
-    cursor = db.tracking.aggregate(
-        [{"$match": {"user": user, "trackEnd": None}},
-         {"$sort": {"departureDate": -1}},
-         {"$project": {"_id": 0, "schedule": 0, "initSchedule": 0}}]
-    )
+    tracking collection. Keyset pagination: documents follow
+    [sort value, _id] after cursor, limit + 1 documents are
+    requested to check if next page exists."""
+    field = sort.lstrip("-")
+    direction = DESCENDING if sort.startswith("-") else ASCENDING
+    query = keyset_query({"user": user, "trackEnd": None}, sort, after)
+    cursor = db.tracking.find(
+        query, dict(TABLE_ROW_PROJECTION, **{field: 1})
+        ).sort([(field, direction), ("_id", direction)])
+    if limit:
+        cursor = cursor.limit(limit + 1)
     return cursor
 
+@ping
+def db_history_data(user, db, after=None, limit=TABLE_PAGE_SIZE):
+    """Get shipments which reached destination from tracking and
+    tracking_archive collections, latest closed first. Same keyset
+    pagination as db_tracking_data() on [trackEnd, _id]."""
+    sort = [("trackEnd", DESCENDING), ("_id", DESCENDING)]
+    query = keyset_query(
+        {"user": user, "trackEnd": {"$ne": None}}, HISTORY_SORT, after
+        )
+    cursors = [
+        coll.find(query, dict(TABLE_ROW_PROJECTION, trackEnd=1))\
+            .sort(sort).limit(limit + 1)
+        for coll in [db.tracking, db.tracking_archive]
+    ]
+    merged = heapq.merge(
+        *cursors, key=lambda r: (r["trackEnd"], r["_id"]), reverse=True
+        )
+    return itertools.islice(merged, limit + 1)
+
+def table_page(cursor, sort, limit):
+    """Split documents from db_tracking_data() into table page and
+    next page cursor (None for the last page)."""
+    if not cursor:
+        return [], None
+    records = list(cursor)
+    if len(records) > limit:
+        records = records[:limit]
+        return records, encode_cursor(records[-1], sort)
+    return records, None
+
+def stored_table_row(record):
+    """Return precomputed table row of record, compute it for legacy
+    records without tableRow or with partial one."""
+    row = record.get("tableRow", None)
+    if row and "booking" in row:
+        return row
+    return table_row(record)
+
 def schedule_table_data(cursor):
-    """Prepare schedule data for schedule table."""
-    format_string = "%d-%m-%Y %H:%M"
+    """Prepare schedule data for schedule table. Rows are precomputed
+    by ETL, rows of records without complete tableRow field are
+    computed here (see TABLE_ROW_PROJECTION)."""
     table_data = {"table": []}
     for c in cursor:
-        # Check requestedETA and convert to string
-        eta_delay = "-"
-        if isinstance(c["requestedETA"], dt):
-            eta_delay = (c["arrivalDate"] - c["requestedETA"]).days
-            c["requestedETA"] = c["requestedETA"].strftime("%d-%m-%Y")
-
-        # Construct and append table data row
-        table_data["table"].append(
-            {"refId": c["refId"],
-             "booking": c["bkgNo"], "container": c["cntrNo"],
-             "type": c["cntrType"],
-             "from": {
-                 "location": c["outboundTerminal"].split("|")[0],
-                 "terminal": c["outboundTerminal"].split("|")[-1]
-             },
-             #"departure": dt.strftime(c["departureDate"], format_string),
-             "departure": c["departureDate"].strftime(format_string),
-             "to": {
-                 "location": c["inboundTerminal"].split("|")[0],
-                 "terminal": c["inboundTerminal"].split("|")[-1]
-             },
-             #"arrival": dt.strftime(c["arrivalDate"], format_string),
-             "arrival": c["arrivalDate"].strftime(format_string),
-             "totalDays": (c["arrivalDate"] - c["departureDate"]).days,
-             "requestedETA": c["requestedETA"],
-             "etaDelay": eta_delay
-            }
-        )
+        table_data["table"].append(stored_table_row(c))
     return table_data
 
 @ping
-def db_get_record(db, bkg_number, user):
+def tracking_version(db, user):
+    """Return version tag of user tracking data. Changes when ETL
+    updates, closes, adds or deletes any of user records."""
+    last_update = db.tracking.find_one(
+        {"user": user}, {"recordUpdate": 1, "_id": 0},
+        sort=[("recordUpdate", DESCENDING)]
+        )
+    last_end = db.tracking.find_one(
+        {"user": user, "trackEnd": {"$ne": None}}, {"trackEnd": 1, "_id": 0},
+        sort=[("trackEnd", DESCENDING)]
+        )
+    count = db.tracking.count_documents({"user": user})
+    version = f"{user}|{last_update}|{last_end}|{count}"
+    return hashlib.md5(version.encode()).hexdigest()
+
+@ping
+def last_record_update(db, user):
+    """Return latest recordUpdate of user records or None."""
+    record = db.tracking.find_one(
+        {"user": user}, {"recordUpdate": 1, "_id": 0},
+        sort=[("recordUpdate", DESCENDING)]
+        )
+    return record["recordUpdate"] if record else None
+
+@ping
+def changed_records(db, user, since):
+    """Find user records updated or closed by ETL after since date.
+    Return {"updated": [bkgNo], "closed": [bkgNo], "since": date}."""
+    changes = {"updated": [], "closed": [], "since": since}
+    cursor = db.tracking.find(
+        {"user": user, "$or": [
+            {"recordUpdate": {"$gt": since}}, {"trackEnd": {"$gt": since}}
+        ]},
+        {"bkgNo": 1, "recordUpdate": 1, "trackEnd": 1, "_id": 0}
+        )
+    for c in cursor:
+        if c.get("trackEnd", None):
+            changes["closed"].append(c["bkgNo"])
+            changes["since"] = max(changes["since"], c["trackEnd"])
+        else:
+            changes["updated"].append(c["bkgNo"])
+        changes["since"] = max(changes["since"], c["recordUpdate"])
+    return changes
+
+@ping
+def db_get_record(db, bkg_number, user, project=None):
     """Get record from database tracking collection."""
     return db.tracking.find_one(
-        {"bkgNo": bkg_number, "trackEnd": None, "user": user}
+        {"bkgNo": bkg_number, "trackEnd": None, "user": user}, project
         )
 
-def prepare_record_details(record):
-    """Prepare tracking collection record details."""
+def prepare_record_details(record, db=None):
+    """Prepare tracking collection record details. Place and vessel
+    references are resolved if db is passed."""
     if record:
-        format_string = "%d-%m-%Y %H:%M"
-        details = []
-        for i in zip(record["schedule"], record["initSchedule"]):
-            row = {}
-            row["event"] = i[0]["event"]
-            row["placeName"] = i[0]["placeName"]
-            row["yardName"] = i[0]["yardName"]
-            row["plannedDate"] = dt.strftime(i[1]["eventDate"], format_string)
-            row["actualDate"] = dt.strftime(i[0]["eventDate"], format_string)
-            row["delta"] = (i[0]["eventDate"] - i[1]["eventDate"]).days
-            row["status"] = i[0]["status"]
-            details.append(row)
-        return details
\ No newline at end of file
+        schedule = record["schedule"]
+        if db is not None:
+            schedule = decode_schedule(db, schedule)
+        return record_details(unpack(schedule), planned_dates(record))
+
+@ping
+def db_get_details(db, bkg_number, user):
+    """Get record precomputed details and recordUpdate fields.
+    Compute details for records written without them."""
+    record = db_get_record(
+        db, bkg_number, user, {"details": 1, "recordUpdate": 1, "_id": 0}
+        )
+    if record and "details" not in record:
+        record = db_get_record(db, bkg_number, user, DETAILS_PROJECTION)
+        record["details"] = prepare_record_details(record, db)
+    return record
+
+def parse_date(value):
+    """Convert YYYY-MM-DD string to datetime object or None."""
+    try:
+        return dt.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+def export_rows(db, user, status="active", date_from=None, date_to=None):
+    """Generate shipments table rows for export. Active records are
+    read in departureDate order (user_departureDate_index), arrived
+    records (tracking and tracking_archive) in trackEnd order
+    (user_trackEnd_index)."""
+    parts = []
+    if status in ["active", "all"]:
+        parts.append((db.tracking, None, "departureDate"))
+    if status in ["arrived", "all"]:
+        parts.append((db.tracking, {"$ne": None}, "trackEnd"))
+        parts.append((db.tracking_archive, {"$ne": None}, "trackEnd"))
+    for coll, track_end, sort in parts:
+        query = {"user": user, "trackEnd": track_end}
+        if date_from or date_to:
+            query["departureDate"] = {}
+        if date_from:
+            query["departureDate"]["$gte"] = date_from
+        if date_to:
+            query["departureDate"]["$lt"] = date_to + timedelta(days=1)
+        cursor = coll.find(
+            query, TABLE_ROW_PROJECTION, batch_size=EXPORT_BATCH_SIZE
+            ).sort([(sort, DESCENDING), ("_id", DESCENDING)])
+        for c in cursor:
+            yield stored_table_row(c)
+
+def export_values(row):
+    """Flatten table row to list of EXPORT_COLUMNS values."""
+    values = []
+    for _, key in EXPORT_COLUMNS:
+        value = row
+        for part in key.split("."):
+            value = value.get(part, "") if isinstance(value, dict) else ""
+        values.append(value)
+    return values
+
+def csv_stream(rows):
+    """Generate CSV file chunks, one chunk per row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([caption for caption, _ in EXPORT_COLUMNS])
+    for row in rows:
+        writer.writerow(export_values(row))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+def xlsx_stream(rows, chunk_size=65536):
+    """Generate XLSX file chunks. Workbook is written row by row to
+    temporary file in xlsxwriter constant memory mode, then streamed."""
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        sheet = workbook.add_worksheet("Shipments")
+        sheet.write_row(0, 0, [caption for caption, _ in EXPORT_COLUMNS])
+        for idx, row in enumerate(rows, start=1):
+            sheet.write_row(idx, 0, export_values(row))
+        workbook.close()
+        with open(path, "rb") as f:
+            chunk = f.read(chunk_size)
+            while chunk:
+                yield chunk
+                chunk = f.read(chunk_size)
+    finally:
+        os.remove(path)
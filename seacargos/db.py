@@ -2,7 +2,7 @@
 # Copyright (C) 2022 Evgeny Deriglazov
 # https://github.com/evgeny81d/seacargos/blob/main/LICENSE
 
-from pymongo import MongoClient, ASCENDING
+from pymongo import MongoClient, ASCENDING, DESCENDING
 from pymongo.errors import ConnectionFailure
 from bson.json_util import dumps
 import json
@@ -12,6 +12,20 @@ import click
 from flask import current_app, g
 from flask.cli import with_appcontext
 
+from seacargos.etl.positions import setup_positions
+
+# Dashboard shipments table sort columns, each one backed by
+# {user, trackEnd, <column>, _id} index of tracking collection
+TABLE_SORT_COLUMNS = [
+    "departureDate", "arrivalDate", "bkgNo", "cntrNo", "refId"
+]
+# Fields read by lane statistics pipelines, covered by
+# {user, <fields>} index of tracking and tracking_archive collections
+LANE_STATS_FIELDS = [
+    "outboundTerminal", "inboundTerminal", "departureDate", "arrivalDate",
+    "requestedETA", "plannedArrivalDate"
+]
+
 def db_conn():
     """Open MongoDB connection, add connection to g as g.conn and
     database name to g as g.db. Return g.conn."""
@@ -71,4 +85,65 @@ def setup_db(app):
             name="name_index"
             )
 
-    conn.close()
\ No newline at end of file
+    # Add tracking collection indexes
+    setup_indexes(db)
+
+    conn.close()
+
+def setup_indexes(db):
+    """Add tracking and tracking_archive collections indexes
+    (no-op for existing ones)."""
+    for column in TABLE_SORT_COLUMNS:
+        db.tracking.create_index(
+            [("user", ASCENDING), ("trackEnd", ASCENDING),
+             (column, DESCENDING), ("_id", DESCENDING)],
+            name=f"user_{column}_index"
+            )
+    db.tracking.create_index(
+        [("user", ASCENDING), ("recordUpdate", DESCENDING)],
+        name="user_recordUpdate_index"
+        )
+    db.tracking.create_index([("trackEnd", ASCENDING)], name="trackEnd_index")
+    # Arrived records and records due for regular update
+    db.tracking.create_index(
+        [("trackEnd", ASCENDING), ("lastEventStatus", ASCENDING)],
+        name="trackEnd_lastEventStatus_index"
+        )
+    db.tracking.create_index(
+        [("trackEnd", ASCENDING), ("nextExpectedEventAt", ASCENDING)],
+        name="trackEnd_nextExpectedEventAt_index"
+        )
+    # Arrived records history and export in trackEnd order
+    for coll in [db.tracking, db.tracking_archive]:
+        coll.create_index(
+            [("user", ASCENDING), ("trackEnd", DESCENDING),
+             ("_id", DESCENDING)],
+            name="user_trackEnd_index"
+            )
+
+    # Lane statistics pipeline covering indexes
+    lane_fields = [("user", ASCENDING)] + [
+        (field, ASCENDING) for field in LANE_STATS_FIELDS
+        ]
+    db.tracking.create_index(lane_fields, name="user_lane_stats_index")
+    db.tracking_archive.create_index(lane_fields, name="user_lane_stats_index")
+    db.lane_stats.create_index(
+        [("user", ASCENDING), ("groupBy", ASCENDING), ("group", ASCENDING)],
+        name="user_groupBy_index"
+        )
+
+    # Reference collections indexes
+    db.places.create_index(
+        [("name", ASCENDING), ("yard", ASCENDING)],
+        unique=True, name="name_yard_index"
+        )
+
+    # Location summary vessels of active shipments
+    db.tracking.create_index(
+        [("user", ASCENDING), ("trackEnd", ASCENDING),
+         ("vesselImo", ASCENDING)],
+        name="user_vesselImo_index"
+        )
+
+    # Vessel positions time series collection
+    setup_positions(db)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Archive script. Moves closed tracking records (trackEnd is set)
+# older than ARCHIVE_AFTER_DAYS into tracking_archive collection.
+# Will be started on schedule by crontab.
+
+import sys
+import os
+from datetime import datetime, timedelta
+from pymongo import ReplaceOne, ASCENDING
+from pymongo.errors import ConnectionFailure
+
+from seacargos.etl.oneline_update import conn_db
+
+ARCHIVE_AFTER_DAYS = 30
+BATCH_SIZE = 500
+
+def log(message):
+    """Log function to log errors."""
+    timestamp = datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S")
+    with open("etl.log", "a") as f:
+        f.write("\n" + timestamp + " " + message)
+
+def archive_closed(conn, db, days=ARCHIVE_AFTER_DAYS, batch_size=BATCH_SIZE):
+    """Move closed records with trackEnd older than days to archive
+    in batches. Records are upserted to archive before delete, so an
+    interrupted run is safely repeated. Return number of moved records."""
+    cutoff = datetime.now().replace(microsecond=0) - timedelta(days=days)
+    query = {"trackEnd": {"$lt": cutoff}}
+    moved = 0
+    try:
+        conn.admin.command("ping")
+        while True:
+            batch = list(
+                db.tracking.find(query).sort("_id", ASCENDING)\
+                    .limit(batch_size)
+                )
+            if not batch:
+                break
+            db.tracking_archive.bulk_write(
+                [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True)
+                 for doc in batch],
+                ordered=False
+                )
+            cursor = db.tracking.delete_many(
+                {"_id": {"$in": [doc["_id"] for doc in batch]}}
+                )
+            moved += cursor.deleted_count
+    except ConnectionFailure:
+        log("[archive.py] [archive_closed()] [DB connection failure]")
+    except BaseException as err:
+        log(f"[archive.py] [archive_closed()] [{err}]")
+    return moved
+
+if __name__ == "__main__":
+    """Archive script."""
+    env = "production"
+    prod_path = "../../instance/prod_config.json"
+    if os.path.exists(prod_path):
+        conn, db = conn_db(prod_path, env)
+        archive_closed(conn, db)
+        conn.close()
+    sys.exit()
@@ -0,0 +1,24 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Fast parser for ONE 'YYYY-MM-DD HH:MM' event date strings.
+# Slices fixed positions instead of datetime.strptime() format matching
+# and memoizes results, as the same dates repeat across bookings.
+
+from datetime import datetime
+from functools import lru_cache
+
+CACHE_SIZE = 8192
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_datetime(string):
+    """Convert 'YYYY-MM-DD HH:MM' string to datetime object.
+    Raise ValueError for other formats."""
+    if len(string) != 16 or string[4] != "-" or string[7] != "-"\
+            or string[10] != " " or string[13] != ":":
+        raise ValueError(f"time data {string!r} does not match format")
+    return datetime(
+        int(string[0:4]), int(string[5:7]), int(string[8:10]),
+        int(string[11:13]), int(string[14:16])
+        )
@@ -0,0 +1,59 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Table-driven ONE schedule transform engine shared by initial load
+# (oneline.py, one-line/etl_init.py) and update (oneline_update.py).
+# Event name rules are compiled into one regex, so each event status
+# name is scanned once for all rules. Rule table row:
+#   (event name marker, terminal field, date field or None)
+# Matched event 'placeNm|yardNm' is saved to terminal field and its date
+# to date field, later events overwrite earlier ones.
+
+import re
+
+from seacargos.etl.dates import parse_datetime
+
+# Tracking document rules
+ROUTE_RULES = [
+    ("Departure from Port of Loading", "outboundTerminal", "departureDate"),
+    ("Arrival at Port of Discharging", "inboundTerminal", "arrivalDate"),
+]
+# Legacy one-line/etl_init.py rules
+TERMINAL_RULES = [
+    ("Outbound Terminal", "outboundTerminal", None),
+    ("Inbound Terminal", "inboundTerminal", None),
+]
+
+def compile_engine(rules, parse_date=parse_datetime):
+    """Compile rules table into transform function which converts
+    raw schedule rows to (schedule, route fields) tuple."""
+    pattern = re.compile("|".join(
+        f"(?P<r{idx}>{re.escape(marker)})"
+        for idx, (marker, _, _) in enumerate(rules)
+    ))
+    targets = {f"r{idx}": (terminal, date)
+               for idx, (_, terminal, date) in enumerate(rules)}
+    search = pattern.search
+
+    def transform_schedule(rows):
+        """Transform raw schedule rows in one pass."""
+        schedule = []
+        fields = {}
+        for i in rows:
+            event_date = parse_date(i["eventDt"])
+            schedule.append({
+                "no": int(i["no"]), "event": i["statusNm"],
+                "placeName": i["placeNm"], "yardName": i["yardNm"],
+                "eventDate": event_date, "status": i["actTpCd"],
+                "vesselName": i["vslEngNm"], "imo": i["lloydNo"]
+            })
+            match = search(i["statusNm"])
+            if match:
+                terminal, date = targets[match.lastgroup]
+                fields[terminal] = i["placeNm"] + "|" + i["yardNm"]
+                if date:
+                    fields[date] = event_date
+        return schedule, fields
+
+    return transform_schedule
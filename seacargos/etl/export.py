@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Shipment history export script for analytics.
+# Streams tracking and tracking_archive documents, flattens schedule
+# events (one row per event) and writes them in batches into Parquet or
+# Arrow IPC files partitioned by departure month:
+#   <out>/departure_month=YYYY-MM/part-N.parquet
+# At most batch_size rows are buffered over all partitions and at most
+# MAX_OPEN_WRITERS files are open, partition writer closed to make room
+# continues in the next part file.
+# Requires pyarrow (pip install seacargos[export]).
+#
+# Usage: python -m seacargos.etl.export <config path> <db name> <out dir>
+#        [--format parquet|arrow] [--batch-size N] [--max-writers N]
+
+import sys
+import os
+import json
+import argparse
+from collections import OrderedDict
+from datetime import datetime
+from pymongo import MongoClient
+
+from seacargos.etl.schedule import unpack, planned_dates
+from seacargos.etl.refs import decode_schedule
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+BATCH_SIZE = 10000
+MAX_OPEN_WRITERS = 16
+
+# Flattened schedule event row columns
+COLUMNS = [
+    ("bkgNo", "string"), ("cntrNo", "string"), ("cntrType", "string"),
+    ("user", "string"), ("line", "string"),
+    ("outboundTerminal", "string"), ("inboundTerminal", "string"),
+    ("departureDate", "timestamp"), ("arrivalDate", "timestamp"),
+    ("requestedETA", "timestamp"), ("trackStart", "timestamp"),
+    ("trackEnd", "timestamp"), ("archived", "bool"),
+    ("no", "int"), ("event", "string"), ("placeName", "string"),
+    ("yardName", "string"), ("plannedDate", "timestamp"),
+    ("eventDate", "timestamp"), ("status", "string"),
+    ("vesselName", "string"), ("imo", "string")
+]
+
+# Projection of fields used by flatten_record()
+PROJECTION = {name: 1 for name, _ in COLUMNS[:12]}
+PROJECTION.update({
+    "schedule": 1, "plannedDates": 1, "initSchedule.eventDate": 1, "_id": 0
+})
+
+def log(message):
+    """Log function to log errors."""
+    timestamp = datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S")
+    with open("etl.log", "a") as f:
+        f.write("\n" + timestamp + " " + message)
+
+def date_or_none(value):
+    """Return value if it is datetime object, else None."""
+    return value if isinstance(value, datetime) else None
+
+def flatten_record(doc, archived=False):
+    """Generate one flat row per schedule event of tracking document."""
+    record = {
+        "bkgNo": doc.get("bkgNo"), "cntrNo": doc.get("cntrNo"),
+        "cntrType": doc.get("cntrType"), "user": doc.get("user"),
+        "line": doc.get("line"),
+        "outboundTerminal": doc.get("outboundTerminal") or None,
+        "inboundTerminal": doc.get("inboundTerminal") or None,
+        "departureDate": date_or_none(doc.get("departureDate")),
+        "arrivalDate": date_or_none(doc.get("arrivalDate")),
+        "requestedETA": date_or_none(doc.get("requestedETA")),
+        "trackStart": date_or_none(doc.get("trackStart")),
+        "trackEnd": date_or_none(doc.get("trackEnd")),
+        "archived": archived
+    }
+    planned = planned_dates(doc)
+    for idx, event in enumerate(unpack(doc.get("schedule")) or []):
+        row = dict(record)
+        row.update({
+            "no": event.get("no"), "event": event.get("event"),
+            "placeName": event.get("placeName"),
+            "yardName": event.get("yardName"),
+            "plannedDate": planned[idx] if idx < len(planned) else None,
+            "eventDate": date_or_none(event.get("eventDate")),
+            "status": event.get("status"),
+            "vesselName": event.get("vesselName"), "imo": event.get("imo")
+        })
+        yield row
+
+def partition(row):
+    """Return partition name of flat row (departure month)."""
+    if row["departureDate"]:
+        return "departure_month=" + row["departureDate"].strftime("%Y-%m")
+    return "departure_month=unknown"
+
+def arrow_schema():
+    """Build Arrow schema from COLUMNS."""
+    types = {
+        "string": pa.string(), "timestamp": pa.timestamp("ms"),
+        "bool": pa.bool_(), "int": pa.int32()
+    }
+    return pa.schema([(name, types[kind]) for name, kind in COLUMNS])
+
+def open_writer(path, schema, file_format):
+    """Open Parquet or Arrow IPC file writer."""
+    if file_format == "parquet":
+        return pq.ParquetWriter(path, schema, compression="zstd")
+    return pa.ipc.new_file(path, schema)
+
+def export(db, out_dir, file_format="parquet", batch_size=BATCH_SIZE,
+           max_writers=MAX_OPEN_WRITERS):
+    """Stream tracking and tracking_archive documents into partitioned
+    columnar files. Memory is bounded by batch_size buffered rows and
+    max_writers open files. Return number of exported rows."""
+    if pa is None:
+        log("[export.py] [export()] [pyarrow is not installed]")
+        return 0
+    schema = arrow_schema()
+    ext = "parquet" if file_format == "parquet" else "arrow"
+    buffers = {}
+    writers = OrderedDict()
+    parts = {}
+    buffered = 0
+    exported = 0
+
+    def flush(name):
+        """Write partition buffer as one row group / record batch."""
+        if name in writers:
+            writers.move_to_end(name)
+        else:
+            if len(writers) >= max_writers:
+                writers.popitem(last=False)[1].close()
+            os.makedirs(os.path.join(out_dir, name), exist_ok=True)
+            parts[name] = parts.get(name, -1) + 1
+            path = os.path.join(out_dir, name, f"part-{parts[name]}.{ext}")
+            writers[name] = open_writer(path, schema, file_format)
+        rows = buffers.pop(name)
+        table = pa.Table.from_pylist(rows, schema=schema)
+        writers[name].write_table(table)
+        return len(rows)
+
+    try:
+        for coll, archived in [(db.tracking, False),
+                               (db.tracking_archive, True)]:
+            cursor = coll.find({}, PROJECTION, batch_size=1000)
+            for doc in cursor:
+                doc["schedule"] = decode_schedule(db, doc.get("schedule"))
+                for row in flatten_record(doc, archived):
+                    buffers.setdefault(partition(row), []).append(row)
+                    buffered += 1
+                    exported += 1
+                    if buffered >= batch_size:
+                        # Largest partition buffer first
+                        name = max(buffers, key=lambda i: len(buffers[i]))
+                        buffered -= flush(name)
+        for name in list(buffers):
+            flush(name)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return exported
+
+def main(args):
+    """Export script."""
+    parser = argparse.ArgumentParser(
+        description="Export shipment history to columnar files."
+        )
+    parser.add_argument("config", help="path to app config json file")
+    parser.add_argument("db_name", help="database name")
+    parser.add_argument("out_dir", help="output directory")
+    parser.add_argument("--format", choices=["parquet", "arrow"],
+                        default="parquet")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-writers", type=int, default=MAX_OPEN_WRITERS)
+    opts = parser.parse_args(args)
+    with open(opts.config, "r") as f:
+        conf = json.load(f)
+    conn = MongoClient(conf["DB_FRONTEND_URI"])
+    rows = export(conn[opts.db_name], opts.out_dir, opts.format,
+                  opts.batch_size, opts.max_writers)
+    conn.close()
+    print(f"Exported {rows} rows to {opts.out_dir}")
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,72 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Derived display fields of tracking collection documents.
+# Computed by ETL on write so dashboard renders stored values as is.
+
+from datetime import datetime
+
+DATE_FORMAT = "%d-%m-%Y %H:%M"
+ETA_FORMAT = "%d-%m-%Y"
+
+def terminal(string):
+    """Split 'location|terminal' string into dict."""
+    parts = string.split("|") if isinstance(string, str) else [""]
+    return {"location": parts[0], "terminal": parts[-1]}
+
+def format_date(date):
+    """Format datetime object for display, "-" for unknown date."""
+    if isinstance(date, datetime):
+        return date.strftime(DATE_FORMAT)
+    return "-"
+
+def route_fields(record):
+    """Prepare route display fields which change on schedule update."""
+    departure = record.get("departureDate", None)
+    arrival = record.get("arrivalDate", None)
+    eta = record.get("requestedETA", None)
+    fields = {
+        "from": terminal(record.get("outboundTerminal", "")),
+        "departure": format_date(departure),
+        "to": terminal(record.get("inboundTerminal", "")),
+        "arrival": format_date(arrival),
+        "totalDays": "-",
+        "etaDelay": "-"
+    }
+    if isinstance(departure, datetime) and isinstance(arrival, datetime):
+        fields["totalDays"] = (arrival - departure).days
+    if isinstance(eta, datetime) and isinstance(arrival, datetime):
+        fields["etaDelay"] = (arrival - eta).days
+    return fields
+
+def table_row(record):
+    """Prepare dashboard shipments table row for tracking record."""
+    eta = record.get("requestedETA", "-")
+    if isinstance(eta, datetime):
+        eta = eta.strftime(ETA_FORMAT)
+    row = {
+        "refId": record.get("refId", "-"),
+        "booking": record.get("bkgNo", None),
+        "container": record.get("cntrNo", None),
+        "type": record.get("cntrType", None),
+        "requestedETA": eta
+    }
+    row.update(route_fields(record))
+    return row
+
+def record_details(schedule, planned_dates):
+    """Prepare details view rows: schedule events with planned
+    (initial schedule) vs actual dates and delta days."""
+    details = []
+    for event, planned in zip(schedule, planned_dates):
+        details.append({
+            "event": event["event"],
+            "placeName": event["placeName"],
+            "yardName": event["yardName"],
+            "plannedDate": format_date(planned),
+            "actualDate": format_date(event["eventDate"]),
+            "delta": (event["eventDate"] - planned).days,
+            "status": event["status"]
+        })
+    return details
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Lane statistics materialization script.
+# Computes per user transit days, planned vs actual arrival slippage
+# and on-time rate by lane, outbound and inbound terminal with $group
+# pipelines over tracking and tracking_archive collections and merges
+# results into lane_stats collection. Refreshed for affected users by
+# ETL update pipelines, full rebuild is started by crontab.
+
+import sys
+import os
+from datetime import datetime
+from pymongo.errors import ConnectionFailure
+
+GROUPS = ["lane", "outboundTerminal", "inboundTerminal"]
+DAY_MS = 86400000
+
+def log(message):
+    """Log function to log errors."""
+    timestamp = datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S")
+    with open("etl.log", "a") as f:
+        f.write("\n" + timestamp + " " + message)
+
+def is_date(field):
+    """Expression: field value is date."""
+    return {"$eq": [{"$type": field}, "date"]}
+
+def days_between(end, start):
+    """Expression: days between two date fields or null."""
+    return {"$cond": [
+        {"$and": [is_date(end), is_date(start)]},
+        {"$divide": [{"$subtract": [end, start]}, DAY_MS]},
+        None
+    ]}
+
+def location(field):
+    """Expression: location part of 'location|terminal' field."""
+    return {"$arrayElemAt": [
+        {"$split": [{"$ifNull": [field, ""]}, "|"]}, 0
+    ]}
+
+def group_key(group_by):
+    """Expression: group key, same as analytics.group_keys()."""
+    if group_by == "lane":
+        return {"$concat": [
+            location("$outboundTerminal"), " - ", location("$inboundTerminal")
+        ]}
+    return {"$ifNull": ["$" + group_by, ""]}
+
+def percentile(values, p):
+    """Expression: percentile of sorted array with linear interpolation
+    between closest ranks, same as analytics.summary() np.percentile()."""
+    pos = {"$multiply": [p, {"$subtract": [{"$size": values}, 1]}]}
+    return {"$let": {"vars": {"pos": pos}, "in": {"$let": {
+        "vars": {
+            "lo": {"$arrayElemAt": [values, {"$toInt": {"$floor": "$$pos"}}]},
+            "hi": {"$arrayElemAt": [values, {"$toInt": {"$ceil": "$$pos"}}]},
+            "frac": {"$subtract": ["$$pos", {"$floor": "$$pos"}]}
+        },
+        "in": {"$round": [{"$add": ["$$lo", {"$multiply": [
+            {"$subtract": ["$$hi", "$$lo"]}, "$$frac"
+        ]}]}, 1]}
+    }}}}
+
+def summary(field):
+    """Expression: summary of sorted days array, null values skipped."""
+    return {"$let": {
+        "vars": {"v": {"$filter": {
+            "input": field, "cond": {"$ne": ["$$this", None]}
+        }}},
+        "in": {"$cond": [{"$eq": [{"$size": "$$v"}, 0]}, None, {
+            "mean": {"$round": [{"$avg": "$$v"}, 1]},
+            "p50": percentile("$$v", 0.5), "p90": percentile("$$v", 0.9),
+            "min": {"$round": [{"$arrayElemAt": ["$$v", 0]}, 1]},
+            "max": {"$round": [{"$arrayElemAt": ["$$v", -1]}, 1]}
+        }]}
+    }}
+
+def pipeline(match, group_by, timestamp):
+    """Build lane statistics pipeline for group_by key."""
+    project = {
+        "outboundTerminal": 1, "inboundTerminal": 1, "departureDate": 1,
+        "arrivalDate": 1, "requestedETA": 1, "plannedArrivalDate": 1,
+        "user": 1, "_id": 0
+    }
+    has_eta = {"$and": [is_date("$arrivalDate"), is_date("$requestedETA")]}
+    return [
+        {"$match": match},
+        {"$project": project},
+        {"$unionWith": {"coll": "tracking_archive", "pipeline": [
+            {"$match": match}, {"$project": project}
+        ]}},
+        {"$project": {
+            "user": 1, "group": group_key(group_by),
+            "transit": days_between("$arrivalDate", "$departureDate"),
+            "slippage": days_between("$arrivalDate", "$plannedArrivalDate"),
+            "hasEta": {"$cond": [has_eta, 1, 0]},
+            "onTime": {"$cond": [{"$and": [
+                has_eta, {"$lte": ["$arrivalDate", "$requestedETA"]}
+            ]}, 1, 0]}
+        }},
+        # Pushed arrays keep sort order, sort each metric before its push
+        {"$sort": {"transit": 1}},
+        {"$group": {
+            "_id": {"user": "$user", "groupBy": group_by, "group": "$group"},
+            "shipments": {"$sum": 1}, "transit": {"$push": "$transit"},
+            "slippage": {"$push": "$slippage"},
+            "hasEta": {"$sum": "$hasEta"}, "onTime": {"$sum": "$onTime"}
+        }},
+        {"$unwind": {"path": "$slippage", "preserveNullAndEmptyArrays": True}},
+        {"$sort": {"slippage": 1}},
+        {"$group": {
+            "_id": "$_id", "shipments": {"$first": "$shipments"},
+            "transit": {"$first": "$transit"},
+            "slippage": {"$push": "$slippage"},
+            "hasEta": {"$first": "$hasEta"}, "onTime": {"$first": "$onTime"}
+        }},
+        {"$project": {
+            "user": "$_id.user", "groupBy": "$_id.groupBy",
+            "group": "$_id.group", "shipments": 1,
+            "transitDays": summary("$transit"),
+            "slippageDays": summary("$slippage"),
+            "onTimeRate": {"$cond": [
+                {"$gt": ["$hasEta", 0]},
+                {"$round": [{"$divide": ["$onTime", "$hasEta"]}, 3]}, None
+            ]},
+            "updated": timestamp
+        }},
+        {"$merge": {
+            "into": "lane_stats", "on": "_id",
+            "whenMatched": "replace", "whenNotMatched": "insert"
+        }}
+    ]
+
+def refresh_lane_stats(conn, db, users=None, since=None):
+    """Recompute lane_stats for users, for users with records updated
+    since date, or for all users if both are None. Return True on
+    success."""
+    timestamp = datetime.now().replace(microsecond=0)
+    try:
+        conn.admin.command("ping")
+        if since:
+            users = db.tracking.distinct(
+                "user", {"recordUpdate": {"$gte": since}}
+                )
+            if not users:
+                return True
+        match = {"user": {"$in": users}} if users else {}
+        for group_by in GROUPS:
+            db.tracking.aggregate(
+                pipeline(match, group_by, timestamp), allowDiskUse=True
+                )
+        # Remove groups which no longer exist
+        db.lane_stats.delete_many(dict(match, updated={"$lt": timestamp}))
+        return True
+    except ConnectionFailure:
+        log("[lane_stats.py] [refresh_lane_stats()] [DB connection failure]")
+        return False
+    except BaseException as err:
+        log(f"[lane_stats.py] [refresh_lane_stats()] [{err}]")
+        return False
+
+if __name__ == "__main__":
+    """Lane statistics full rebuild script."""
+    from seacargos.etl.oneline_update import conn_db
+    env = "production"
+    prod_path = "../../instance/prod_config.json"
+    if os.path.exists(prod_path):
+        conn, db = conn_db(prod_path, env)
+        refresh_lane_stats(conn, db)
+        conn.close()
+    sys.exit()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Backfill derived fields of tracking collection documents
+# written before the fields were introduced.
+
+import sys
+import os
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import ConnectionFailure
+
+from seacargos.etl.fields import table_row, record_details
+from seacargos.etl.schedule import unpack, planned_dates, compact_document
+from seacargos.etl.schedule import status_fields
+from seacargos.etl.refs import encode_schedule, decode_schedule
+from seacargos.etl.oneline_update import conn_db
+
+BATCH_SIZE = 500
+
+def log(message):
+    """Log function to log errors."""
+    timestamp = datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S")
+    with open("etl.log", "a") as f:
+        f.write("\n" + timestamp + " " + message)
+
+def backfill_table_rows(conn, db, batch_size=BATCH_SIZE):
+    """Add tableRow field to documents which do not have it or have
+    partial one (route fields only). Return number of updated documents."""
+    query = {"tableRow.booking": {"$exists": False}}
+    project = {"schedule": 0, "initSchedule": 0, "plannedDates": 0}
+    updated = 0
+    try:
+        conn.admin.command("ping")
+        ops = []
+        for rec in db.tracking.find(query, project, batch_size=batch_size):
+            ops.append(UpdateOne(
+                {"_id": rec["_id"]}, {"$set": {"tableRow": table_row(rec)}}
+                ))
+            if len(ops) == batch_size:
+                updated += db.tracking.bulk_write(ops).modified_count
+                ops = []
+        if ops:
+            updated += db.tracking.bulk_write(ops).modified_count
+    except ConnectionFailure:
+        log("[migrate.py] [backfill_table_rows()] [DB connection failure]")
+    except BaseException as err:
+        log(f"[migrate.py] [backfill_table_rows()] [{err}]")
+    return updated
+
+def backfill_details(conn, db, batch_size=BATCH_SIZE):
+    """Add details field to documents which do not have it.
+    Return number of updated documents."""
+    query = {"details": {"$exists": False}, "schedule": {"$ne": None}}
+    project = {"schedule": 1, "plannedDates": 1, "initSchedule.eventDate": 1}
+    updated = 0
+    try:
+        conn.admin.command("ping")
+        ops = []
+        for rec in db.tracking.find(query, project, batch_size=batch_size):
+            details = record_details(
+                unpack(decode_schedule(db, rec["schedule"])),
+                planned_dates(rec)
+                )
+            ops.append(UpdateOne(
+                {"_id": rec["_id"]}, {"$set": {"details": details}}
+                ))
+            if len(ops) == batch_size:
+                updated += db.tracking.bulk_write(ops).modified_count
+                ops = []
+        if ops:
+            updated += db.tracking.bulk_write(ops).modified_count
+    except ConnectionFailure:
+        log("[migrate.py] [backfill_details()] [DB connection failure]")
+    except BaseException as err:
+        log(f"[migrate.py] [backfill_details()] [{err}]")
+    return updated
+
+def planned_arrival(rec):
+    """Return initially planned arrival at port of discharging date."""
+    init = planned_dates(rec)
+    for idx, event in enumerate(unpack(rec.get("schedule", None)) or []):
+        if event["event"].find("Arrival at Port of Discharging") > -1:
+            if idx < len(init):
+                return init[idx]
+    return ""
+
+def backfill_planned_arrival(conn, db, batch_size=BATCH_SIZE):
+    """Add plannedArrivalDate field to documents which do not have it.
+    Return number of updated documents."""
+    query = {"plannedArrivalDate": {"$exists": False}}
+    project = {"schedule": 1, "plannedDates": 1, "initSchedule.eventDate": 1}
+    updated = 0
+    try:
+        conn.admin.command("ping")
+        ops = []
+        for rec in db.tracking.find(query, project, batch_size=batch_size):
+            ops.append(UpdateOne(
+                {"_id": rec["_id"]},
+                {"$set": {"plannedArrivalDate": planned_arrival(rec)}}
+                ))
+            if len(ops) == batch_size:
+                updated += db.tracking.bulk_write(ops).modified_count
+                ops = []
+        if ops:
+            updated += db.tracking.bulk_write(ops).modified_count
+    except ConnectionFailure:
+        log("[migrate.py] [backfill_planned_arrival()]"\
+            + " [DB connection failure]")
+    except BaseException as err:
+        log(f"[migrate.py] [backfill_planned_arrival()] [{err}]")
+    return updated
+
+def backfill_status_fields(conn, db, batch_size=BATCH_SIZE):
+    """Add schedule status fields to active documents which do not have
+    them. Return number of updated documents."""
+    query = {"trackEnd": None, "vesselImo": {"$exists": False}}
+    updated = 0
+    try:
+        conn.admin.command("ping")
+        ops = []
+        for rec in db.tracking.find(query, {"schedule": 1},
+                                    batch_size=batch_size):
+            ops.append(UpdateOne(
+                {"_id": rec["_id"]},
+                {"$set": status_fields(rec.get("schedule", None))}
+                ))
+            if len(ops) == batch_size:
+                updated += db.tracking.bulk_write(ops).modified_count
+                ops = []
+        if ops:
+            updated += db.tracking.bulk_write(ops).modified_count
+    except ConnectionFailure:
+        log("[migrate.py] [backfill_status_fields()]"\
+            + " [DB connection failure]")
+    except BaseException as err:
+        log(f"[migrate.py] [backfill_status_fields()] [{err}]")
+    return updated
+
+def compact_schedules(conn, db, batch_size=BATCH_SIZE):
+    """Convert tracking and tracking_archive documents schedule to
+    compact format and replace initSchedule with plannedDates.
+    Return number of updated documents."""
+    query = {"initSchedule": {"$exists": True}}
+    project = {"schedule": 1, "initSchedule.eventDate": 1}
+    updated = 0
+    try:
+        conn.admin.command("ping")
+        for coll in [db.tracking, db.tracking_archive]:
+            ops = []
+            for rec in coll.find(query, project, batch_size=batch_size):
+                ops.append(UpdateOne(
+                    {"_id": rec["_id"]}, compact_document(rec)
+                    ))
+                if len(ops) == batch_size:
+                    updated += coll.bulk_write(ops).modified_count
+                    ops = []
+            if ops:
+                updated += coll.bulk_write(ops).modified_count
+    except ConnectionFailure:
+        log("[migrate.py] [compact_schedules()] [DB connection failure]")
+    except BaseException as err:
+        log(f"[migrate.py] [compact_schedules()] [{err}]")
+    return updated
+
+def reference_schedules(conn, db, batch_size=BATCH_SIZE):
+    """Replace place and vessel names of compact schedules with
+    references. Return number of updated documents."""
+    query = {"schedule.p": {"$type": "string"}}
+    updated = 0
+    try:
+        conn.admin.command("ping")
+        for coll in [db.tracking, db.tracking_archive]:
+            ops = []
+            for rec in coll.find(query, {"schedule": 1}, batch_size=batch_size):
+                ops.append(UpdateOne(
+                    {"_id": rec["_id"]},
+                    {"$set": {"schedule": encode_schedule(db, rec["schedule"])}}
+                    ))
+                if len(ops) == batch_size:
+                    updated += coll.bulk_write(ops).modified_count
+                    ops = []
+            if ops:
+                updated += coll.bulk_write(ops).modified_count
+    except ConnectionFailure:
+        log("[migrate.py] [reference_schedules()] [DB connection failure]")
+    except BaseException as err:
+        log(f"[migrate.py] [reference_schedules()] [{err}]")
+    return updated
+
+def migrate(conn, db):
+    """Run all backfill functions."""
+    compact_schedules(conn, db)
+    reference_schedules(conn, db)
+    backfill_table_rows(conn, db)
+    backfill_details(conn, db)
+    backfill_planned_arrival(conn, db)
+    backfill_status_fields(conn, db)
+    del db
+    conn.close()
+
+if __name__ == "__main__":
+    """Migration script."""
+    env = "production"
+    prod_path = "../../instance/prod_config.json"
+    if os.path.exists(prod_path):
+        conn, db = conn_db(prod_path, env)
+        sys.exit(migrate(conn, db))
+    else:
+        sys.exit()
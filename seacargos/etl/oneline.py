@@ -7,6 +7,15 @@ import time
 from datetime import datetime
 from pymongo.errors import ConnectionFailure
 
+from seacargos.etl.fields import table_row, record_details
+from seacargos.etl.schedule import pack, status_fields
+from seacargos.etl.refs import encode_schedule
+from seacargos.etl.schema import validate_container, validate_schedule_row
+from seacargos.etl.schema import validate_rows, quarantine
+from seacargos.etl.engine import compile_engine, ROUTE_RULES
+
+transform_schedule = compile_engine(ROUTE_RULES)
+
 URL = "https://ecomm.one-line.com/ecom/CUP_HOM_3301GS.do"
 
 def log(message):
@@ -91,22 +100,32 @@ def extract_data(query):
             + f" [No container data for {query}]")
         return False
 
+def reasons(rejected):
+    """Format rejected rows reason codes for log."""
+    return ", ".join(f"{idx} {reason}" for idx, reason in rejected)
+
+def quarantine_rejected(db, query, rows, rejected):
+    """Save rejected rows to quarantine collection if db is passed."""
+    if db is None:
+        return
+    key = query.get("bkgNo", query.get("cntrNo", None))
+    try:
+        quarantine(db, "oneline", key, rows, rejected)
+    except BaseException as err:
+        log(f"[oneline.py] [quarantine_rejected()] [{err}]")
+
 # Main transform_data() function
-def transform_data(data):
-    """Transform raw data to be ready for database load."""
+def transform_data(data, db=None):
+    """Transform raw data to be ready for database load. Rejected
+    rows are quarantined if db is passed."""
     if not data:
         log("[oneline.py] [transform_data()]"\
             + f" [No raw data]")
         return False
     
-    def to_date_obj(string):
-        """Transform string date to datetime object."""
-        f_str = "%Y-%m-%d %H:%M"
-        return datetime.strptime(string, f_str)
-    
     # Check contnainer keys and extract container info
-    cntr_keys = ["cntrNo", "cntrTpszNm", "copNo", "blNo"]
-    if set(cntr_keys).issubset(set(data["container_data"])):
+    reason = validate_container(data["container_data"])
+    if not reason:
         # Prepare requested ETA field
         if len(data["query"]["requestedETA"]) > 1:
             data["query"]["requestedETA"] =\
@@ -132,37 +151,40 @@ def transform_data(data):
             "location": None, "schedule": None,
         }
     else:
+        quarantine_rejected(
+            db, data["query"], data["container_data"], [(None, reason)]
+            )
         log("[oneline.py] [transform_data()]"\
-            + f" [Keys do not match in container data {data['query']}]")
+            + f" [Keys do not match in container data {data['query']}]"\
+            + f" [{reason}]")
         return False
-    # Check schedule keys and extract schedule data
-    schedule_keys = ["no", "statusNm", "placeNm", "yardNm", "eventDt",
-                     "actTpCd", "actTpCd", "vslEngNm", "lloydNo"]
-    if set(schedule_keys).issubset(set(data["schedule_data"][0])):
-        schedule = []
-        for i in data["schedule_data"]:
-            # Add schedule item point
-            schedule.append({
-            "no": int(i["no"]), "event": i["statusNm"],
-            "placeName": i["placeNm"], "yardName": i["yardNm"],
-            "eventDate": to_date_obj(i["eventDt"]), "status": i["actTpCd"],
-            "vesselName": i["vslEngNm"], "imo": i["lloydNo"]
-            })
-            # Find & save outbound/inbound terminals & departure/arrival dates
-            if i["statusNm"].find("Departure from Port of Loading") > -1:
-                result["outboundTerminal"] = i["placeNm"]\
-                + "|" + i["yardNm"]
-                result["departureDate"] = to_date_obj(i["eventDt"])
-            if i["statusNm"].find("Arrival at Port of Discharging") > -1:
-                result["inboundTerminal"] = i["placeNm"]\
-                + "|" + i["yardNm"]
-                result["arrivalDate"] = to_date_obj(i["eventDt"])
-        result["schedule"] = schedule
-        result["initSchedule"] = schedule
+    # Check every schedule row and extract schedule data
+    rejected = validate_rows(validate_schedule_row, data["schedule_data"])
+    if not rejected:
+        # Transform schedule, find outbound/inbound terminals and
+        # departure/arrival dates
+        schedule, route = transform_schedule(data["schedule_data"])
+        result.update(route)
+        # Store compact schedule and initial schedule planned dates only
+        result["schedule"] = pack(schedule)
+        result["plannedDates"] = [i["eventDate"] for i in schedule]
+        # Indexed arrival and due update query fields
+        result.update(status_fields(schedule))
+        # Keep initially planned arrival date for slippage analytics
+        result["plannedArrivalDate"] = result["arrivalDate"]
+        # Precompute dashboard table row and details view rows
+        result["tableRow"] = table_row(result)
+        result["details"] = record_details(
+            schedule, [i["eventDate"] for i in schedule]
+            )
    
     else:
+        quarantine_rejected(
+            db, data["query"], data["schedule_data"], rejected
+            )
         log("[oneline.py] [transform_data()]"\
-            + f" [Keys do not match in schedule data {data['query']}]")
+            + f" [Keys do not match in schedule data {data['query']}]"\
+            + f" [{reasons(rejected)}]")
         return False
     return result
 
@@ -174,6 +196,7 @@ def load_data(data, conn, db):
         return {"etl_message": "No data to load yet."}
     try:
         conn.admin.command("ping")
+        data["schedule"] = encode_schedule(db, data["schedule"])
         cursor = db.tracking.insert_one(data)
         if cursor.acknowledged == False:
             log("[oneline.py] [load_data()] "\
@@ -194,6 +217,6 @@ def load_data(data, conn, db):
 def etl_one(query, conn, db):
     """Main data pipeline flow."""
     raw_data = extract_data(query)
-    transformed_data = transform_data(raw_data)
+    transformed_data = transform_data(raw_data, db)
     result = load_data(transformed_data, conn, db)
     return result
\ No newline at end of file
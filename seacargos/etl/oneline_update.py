@@ -8,11 +8,25 @@ import json
 from datetime import datetime
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
-from bson.json_util import dumps
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+from seacargos.etl.fields import table_row, record_details
+from seacargos.etl.lane_stats import refresh_lane_stats
+from seacargos.etl.schedule import pack, planned_dates, status_fields
+from seacargos.etl.refs import encode_schedule
+from seacargos.etl.schema import validate_update_row, validate_rows
+from seacargos.etl.schema import quarantine
+from seacargos.etl.dates import parse_datetime
+from seacargos.etl.engine import compile_engine, ROUTE_RULES
 
 URL = "https://ecomm.one-line.com/ecom/CUP_HOM_3301GS.do"
+# Process pool transform mode (regular_schedule_update() workers > 0)
+TRANSFORM_WORKERS = int(os.environ.get("ETL_TRANSFORM_WORKERS", 0))
+TRANSFORM_CHUNK_SIZE = int(os.environ.get("ETL_TRANSFORM_CHUNK_SIZE", 50))
+# Regular update through pipelined stages (pipeline.py)
+PIPELINED_UPDATE = os.environ.get("ETL_PIPELINED_UPDATE", "0") == "1"
 
 # ETL functions
 def log(message):
@@ -21,29 +35,44 @@ def log(message):
     with open("etl.log", "a") as f:
         f.write("\n" + timestamp + " " + message)
 
-def records_to_update(conn, db, user=None, bkg_number=None):
-    """Prepare records which require update."""
-    # Check function args
-    project = {"user": 1, "bkgNo": 1, "copNo": 1, "_id": 0}
+def update_query(user=None, bkg_number=None):
+    """Return query and projection of records which require update."""
+    # Stored route fields and table row fields are projected for
+    # table_row() in update_document()
+    project = {
+        "user": 1, "bkgNo": 1, "copNo": 1, "requestedETA": 1,
+        "plannedDates": 1, "initSchedule.eventDate": 1, "refId": 1,
+        "cntrNo": 1, "cntrType": 1, "outboundTerminal": 1,
+        "departureDate": 1, "inboundTerminal": 1, "arrivalDate": 1,
+        "_id": 0
+        }
     if user and bkg_number:
         query = {"trackEnd": None, "user": user, "bkgNo": bkg_number}
     elif user:
         query = {"trackEnd": None, "user": user}
     else:  
         now = datetime.now().replace(microsecond=0)
-        query = {
-            "trackEnd": None,
-            "schedule": {"$elemMatch": {
-                "status": "E", "eventDate": {"$lte": now}
-                }
-            }
-        }
+        # Documents without nextExpectedEventAt (not yet backfilled by
+        # migrate.py) are checked by compact or long key schedule events
+        query = {"trackEnd": None, "$or": [
+            {"nextExpectedEventAt": {"$lte": now}},
+            {"nextExpectedEventAt": {"$exists": False},
+             "schedule": {"$elemMatch": {"$or": [
+                 {"s": "E", "d": {"$lte": now}},
+                 {"status": "E", "eventDate": {"$lte": now}}
+             ]}}}
+        ]}
         project.pop("user")
+    return query, project
+
+def records_to_update(conn, db, user=None, bkg_number=None):
+    """Prepare records which require update."""
+    query, project = update_query(user, bkg_number)
     # Run query
     try:
         conn.admin.command("ping")
         cur = db.tracking.find(query, project)
-        records = json.loads(dumps(cur))
+        records = list(cur)
         if len(records) > 0:
             return records
         else:
@@ -59,8 +88,9 @@ def records_to_update(conn, db, user=None, bkg_number=None):
             + f"[{err.details}]")
         return False
 
-def extract_schedule_details(records):
-    """Extract schedule details for update."""
+def extract_schedule_details(records, raw=False):
+    """Extract schedule details for update. If raw is True response
+    bytes are kept in record payload field for decode_payload()."""
     # Check input
     if not records:
         return False
@@ -73,110 +103,150 @@ def extract_schedule_details(records):
         }
         # Run request and fetch json data
         r = requests.get(URL, params=payload)
-        data = r.json()
-        # Get schedule, clean and add to record
-        if "list" in data:
-            schedule_details = data["list"]
-            schedule_details[0].pop("hashColumns", None)
-            rec["schedule"] = schedule_details
+        if raw:
+            rec["payload"] = r.content
         else:
-            log("[oneline_update.py] [extract_schedule_details()]"\
-                + f" [No schedule for {rec['bkgNo']}]")
-            rec["schedule"] = None
+            add_schedule(rec, r.json())
     return records
 
+def add_schedule(rec, data):
+    """Get schedule from response data, clean and add to record."""
+    if "list" in data:
+        schedule_details = data["list"]
+        schedule_details[0].pop("hashColumns", None)
+        rec["schedule"] = schedule_details
+    else:
+        log("[oneline_update.py] [extract_schedule_details()]"\
+            + f" [No schedule for {rec['bkgNo']}]")
+        rec["schedule"] = None
+
+def decode_payload(rec):
+    """Decode record raw payload bytes and add schedule to record."""
+    try:
+        add_schedule(rec, json.loads(rec.pop("payload")))
+    except ValueError:
+        log("[oneline_update.py] [decode_payload()]"\
+            + f" [Bad JSON payload for {rec['bkgNo']}]")
+        rec["schedule"] = None
+    return rec
+
 def str_to_date(string):
         """Convert string to date."""
         if len(string) == 16:
-            return datetime.strptime(string, "%Y-%m-%d %H:%M")
+            return parse_datetime(string)
         else:
             return datetime.fromtimestamp(0)
 
+transform_schedule = compile_engine(ROUTE_RULES, str_to_date)
+
 def transform(records):
     """Transforms raw data."""
     # Check input
     if not records:
         return False
     
-    # Check schedule keys and extract schedule data
-    schedule_keys = ["no", "statusNm", "placeNm", "yardNm",
-                     "eventDt", "actTpCd", "actTpCd", "vslEngNm",
-                     "lloydNo"]
+    # Check every schedule row and extract schedule data
     for rec in records:
-        if set(schedule_keys).issubset(set(rec["schedule"][0])):
-            transformed_schedule = []
-            for i in rec["schedule"]:
-                transformed_schedule.append(
-                    {"no": int(i["no"]),
-                     "event": i["statusNm"],
-                     "placeName": i["placeNm"],
-                     "yardName": i["yardNm"],
-                     "eventDate": str_to_date(i["eventDt"]),
-                     "status": i["actTpCd"],
-                     "vesselName": i["vslEngNm"],
-                     "imo": i["lloydNo"]}
-                )
-                # Update arr/dep dates and terminals
-                if i["statusNm"].find("Departure from Port of Loading") > -1: 
-                    rec["departureDate"] = str_to_date(i["eventDt"])
-                    rec["outboundTerminal"] = i["placeNm"]\
-                        + "|" + i["yardNm"]
-                if i["statusNm"].find("Arrival at Port of Discharging") > -1:
-                    rec["arrivalDate"] = str_to_date(i["eventDt"])
-                    rec["inboundTerminal"] = i["placeNm"]\
-                        + "|" + i["yardNm"]
+        if rec["schedule"] is None:
+            continue
+        rejected = validate_rows(validate_update_row, rec["schedule"])
+        if not rejected:
+            # Update schedule, arr/dep dates and terminals
+            transformed_schedule, route = transform_schedule(rec["schedule"])
+            rec.update(route)
             rec["schedule"] = transformed_schedule
+            # Precompute details rows
+            if planned_dates(rec):
+                rec["details"] = record_details(
+                    transformed_schedule, planned_dates(rec)
+                    )
         else:
             log("[oneline_update.py] [transform()] "\
-                + f"[Keys do not match in schedule data {rec['bkgNo']}]")
+                + f"[Keys do not match in schedule data {rec['bkgNo']}] "\
+                + "[" + ", ".join(f"{i} {r}" for i, r in rejected) + "]")
+            # Keep rejected rows for quarantine() in update()
+            rec["rejected"] = {"rows": rec["schedule"], "reasons": rejected}
             rec["schedule"] = None
     return records
 
-def update(conn, db, records, regular_update=True):
-    """Update records in database."""
-    # Check function args
+def transform_payload(rec):
+    """Decode and transform one record, return it with compact schedule
+    ready for update(). Process pool worker function."""
+    rec = transform([decode_payload(rec)])[0]
+    if rec["schedule"]:
+        rec["schedule"] = pack(rec["schedule"])
+    return rec
+
+def transform_parallel(records, workers=TRANSFORM_WORKERS,
+                       chunk_size=TRANSFORM_CHUNK_SIZE):
+    """Decode and transform records with raw payloads in process pool."""
     if not records:
         return False
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(transform_payload, records, chunksize=chunk_size))
 
-    # Prepare reusable parameters
-    timestamp = datetime.now().replace(microsecond=0)
-    query = {"bkgNo": None, "trackEnd": None}
+def update_document(db, rec, timestamp, regular_update=True):
+    """Return query and update documents for one record."""
+    query = {"bkgNo": rec["bkgNo"], "trackEnd": None}
     update = {"$set": {
-        "schedule": None,
+        "schedule": encode_schedule(db, pack(rec["schedule"])),
         "recordUpdate": timestamp
         }
     }
+    update["$set"].update(status_fields(rec["schedule"]))
     if regular_update:
         update["$set"]["regularUpdate"] = timestamp
-    
+    if "user" in rec:
+        query["user"] = rec["user"]
+    if "departureDate" in rec:
+        update["$set"]["departureDate"] = rec["departureDate"]
+    if "outboundTerminal" in rec:
+        update["$set"]["outboundTerminal"] = rec["outboundTerminal"]
+    if "arrivalDate" in rec:
+        update["$set"]["arrivalDate"] = rec["arrivalDate"]
+    if "inboundTerminal" in rec:
+        update["$set"]["inboundTerminal"] = rec["inboundTerminal"]
+    if "details" in rec:
+        update["$set"]["details"] = rec["details"]
+    # Whole row, legacy documents may not have tableRow yet
+    update["$set"]["tableRow"] = table_row(rec)
+    return query, update
+
+def update_record(db, rec, timestamp, regular_update=True):
+    """Update one record in database."""
+    query, update = update_document(db, rec, timestamp, regular_update)
+    cursor = db.tracking.update_one(query, update)
+    if not cursor.raw_result["updatedExisting"]:
+        log("[oneline_update.py] [update()] "\
+        + f"[{rec['bkgNo']} user: {rec.get('user', None)} "\
+        + f"{cursor.raw_result}]")
+
+def update(conn, db, records, regular_update=True):
+    """Update records in database. Errors are handled per record,
+    so one bad record does not stop batch update."""
+    # Check function args
+    if not records:
+        return False
+
     # Start update
+    timestamp = datetime.now().replace(microsecond=0)
     try:
         conn.admin.command("ping")
         for rec in records:
             if rec["schedule"]:
-                query["bkgNo"] = rec["bkgNo"]
-                update["$set"]["schedule"] = rec["schedule"]
-                if "user" in rec:
-                    query["user"] = rec["user"]
-                if "departureDate" in rec:
-                    update["$set"]["departureDate"] = rec["departureDate"]
-                if "outboundTerminal" in rec:
-                    update["$set"]["outboundTerminal"] = rec["outboundTerminal"]
-                if "arrivalDate" in rec:
-                    update["$set"]["arrivalDate"] = rec["arrivalDate"]
-                if "inboundTerminal" in rec:
-                    update["$set"]["inboundTerminal"] = rec["inboundTerminal"]
-                cursor = db.tracking.update_one(query, update)
-                #if cursor.acknowledged == False:
-                #    log("[oneline_update.py] [update()] "\
-                #    + f"[{rec['bkgNo']} user: {rec.get('user', None)} "\
-                #    + "curosor.acknowledged==False]")
-                if not cursor.raw_result["updatedExisting"]:
+                try:
+                    update_record(db, rec, timestamp, regular_update)
+                except ConnectionFailure:
+                    raise
+                except BaseException as err:
                     log("[oneline_update.py] [update()] "\
-                    + f"[{rec['bkgNo']} user: {rec.get('user', None)} "\
-                    + f"{cursor.raw_result}]")
-
+                        + f"[{rec['bkgNo']} not updated: {err}]")
             else:
+                if "rejected" in rec:
+                    quarantine(
+                        db, "oneline_update", rec["bkgNo"],
+                        rec["rejected"]["rows"], rec["rejected"]["reasons"]
+                        )
                 log("[oneline_update.py] [update()] "\
                 + f"[{rec['bkgNo']} missing schedule data, not updated]")
     except ConnectionFailure:
@@ -184,65 +254,37 @@ def update(conn, db, records, regular_update=True):
     except BaseException as err:
         log(f"[oneline_update.py] [update()] [{err}]")
 
-def arrived(conn, db, user=None):
-    """Find containers which arrived to destination."""
-    # Check function args
+def close_arrived(conn, db, user=None):
+    """Set trackEnd for records which arrived to destination (last
+    schedule event is actual) in one update. Return counts."""
+    # Check function args. Documents without lastEventStatus (not yet
+    # backfilled by migrate.py) are checked by last schedule event,
+    # compact (s) or long key (status) one.
+    query = {"trackEnd": None, "$or": [
+        {"lastEventStatus": "A"},
+        {"lastEventStatus": {"$exists": False},
+         "$expr": {"$eq": [{"$ifNull": [
+             {"$last": "$schedule.s"}, {"$last": "$schedule.status"}
+         ]}, "A"]}}
+    ]}
     if user:
-        query = {"trackEnd": None, "user": user}
-    else:
-        query = {"trackEnd": None}
-    # Query database
-    try:
-        conn.admin.command("ping")
-        cur = db.tracking.aggregate([
-            {"$match": query},
-            {"$addFields": {"last": {"$last": "$schedule"}}},
-            {"$match": {"last.status": "A" }},
-            {"$project": {"bkgNo": 1, "_id": 0}}
-        ])
-        records = json.loads(dumps(cur))
-        if len(records) > 0:
-            return records
-        else:
-            return False
-    except ConnectionFailure:
-        log("[oneline_update.py] [arrived()] "\
-            + f"[DB connection failure]")
-        return False
-    except BaseException as err:
-        log("[oneline_update.py] [arrived()] "\
-            + f"[{err}]")
-        return False
-    
-def track_end(conn, db, records):
-    """Set trackEnd field in database to current date and time."""
-    # Check function args
-    if not records:
-        return False
+        query["user"] = user
     # Run update
     try:
         conn.admin.command("ping")
-        query = {"bkgNo": None, "trackEnd": None}
-        for rec in records:
-            query["bkgNo"] = rec["bkgNo"]
-            cursor = db.tracking.update_one(
-                query,
-                {"$set": {"trackEnd": datetime.now().replace(microsecond=0)}},
-            )
-            #if cursor.acknowledged == False:
-            #    log("[oneline_update.py] [track_end()] "\
-            #        + f"[{rec['bkgNo']} not closed for {rec.get('user', None)}]")
-            if not cursor.raw_result["updatedExisting"]:
-                log("[oneline_update.py] [track_end()] "\
-                    + f"[Failed to set track end for {rec['bkgNo']} "\
-                    + f"{cursor.raw_result}]")
+        result = db.tracking.update_many(
+            query,
+            {"$set": {"trackEnd": datetime.now().replace(microsecond=0)}}
+        )
+        return {"matched": result.matched_count,
+                "closed": result.modified_count}
     except ConnectionFailure:
-        log("[oneline_update.py] [track_end()] "\
+        log("[oneline_update.py] [close_arrived()] "\
             + f"[DB connection failure]")
         return False
     except BaseException as err:
-        log("[oneline_update.py] [track_end()] "\
-            + f"[{err.details}]")
+        log("[oneline_update.py] [close_arrived()] "\
+            + f"[{err}]")
         return False
 
 # Helper fuction for main()
@@ -255,15 +297,31 @@ def conn_db(path, env):
     return conn, db
 
 # ETL Pipelines
-def regular_schedule_update(conn, db):
+def regular_schedule_update(conn, db, workers=TRANSFORM_WORKERS,
+                            chunk_size=TRANSFORM_CHUNK_SIZE,
+                            pipelined=PIPELINED_UPDATE):
     """Update records schedule which require update for all users.
-    Will be started on schedule by crontab."""
-    records = records_to_update(conn, db)
-    raw_data = extract_schedule_details(records)
-    transformed_data = transform(raw_data)
-    update(conn, db, transformed_data)
-    arrived_records = arrived(conn, db)
-    track_end(conn, db, arrived_records)
+    Records flow through pipeline.run_pipeline() stages if pipelined,
+    else payloads are decoded and transformed in process pool of
+    workers if workers > 0. Will be started on schedule by crontab."""
+    start = datetime.now().replace(microsecond=0)
+    if pipelined:
+        # pipeline.py imports this module
+        from seacargos.etl.pipeline import run_pipeline
+        run_pipeline(conn, db)
+    else:
+        records = records_to_update(conn, db)
+        if workers > 0:
+            raw_data = extract_schedule_details(records, raw=True)
+            transformed_data = transform_parallel(
+                raw_data, workers, chunk_size
+                )
+        else:
+            raw_data = extract_schedule_details(records)
+            transformed_data = transform(raw_data)
+        update(conn, db, transformed_data)
+    close_arrived(conn, db)
+    refresh_lane_stats(conn, db, since=start)
     del db
     conn.close()
 
@@ -274,8 +332,8 @@ def user_schedule_update(conn, db, user):
     raw_data = extract_schedule_details(records)
     transformed_data = transform(raw_data)
     update(conn, db, transformed_data)
-    arrived_records = arrived(conn, db, user)
-    track_end(conn, db, arrived_records)
+    close_arrived(conn, db, user)
+    refresh_lane_stats(conn, db, users=[user])
 
 def record_schedule_update(conn, db, user, bkg_number):
     """Update one record schedule for single user."""
@@ -0,0 +1,157 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Pipelined regular schedule update.
+# Stages run in threads connected by bounded queues, so records flow
+# through continuously with backpressure and memory is bounded by queue
+# sizes instead of number of records:
+#   extract (db cursor) -> fetch (N threads, ONE requests)
+#   -> transform -> load (bulk writes of batch_size records)
+# Per stage record counters are logged and returned.
+# Started by oneline_update.regular_schedule_update() if
+# ETL_PIPELINED_UPDATE=1 is set.
+
+import time
+import threading
+from queue import Queue
+from datetime import datetime
+from pymongo import UpdateOne
+
+from seacargos.etl.oneline_update import update_query
+from seacargos.etl.oneline_update import extract_schedule_details
+from seacargos.etl.oneline_update import transform
+from seacargos.etl.oneline_update import update_document
+from seacargos.etl.schema import quarantine
+
+FETCH_THREADS = 4
+QUEUE_SIZE = 100
+BATCH_SIZE = 100
+STAGES = ["extract", "fetch", "transform", "load", "errors"]
+
+# End of stream marker
+DONE = None
+
+def log(message):
+    """Log function to log errors."""
+    timestamp = datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S")
+    with open("etl.log", "a") as f:
+        f.write("\n" + timestamp + " " + message)
+
+def run_pipeline(conn, db, user=None, fetch_threads=FETCH_THREADS,
+                 queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE,
+                 regular_update=True):
+    """Update records which require update through pipelined stages.
+    Return per stage counters of processed records."""
+    counters = dict.fromkeys(STAGES, 0)
+    lock = threading.Lock()
+    fetch_queue = Queue(queue_size)
+    transform_queue = Queue(queue_size)
+    load_queue = Queue(queue_size)
+    timestamp = datetime.now().replace(microsecond=0)
+
+    def count(stage, number=1):
+        """Increment stage counter."""
+        with lock:
+            counters[stage] += number
+
+    def extract():
+        """Stream records from database to fetch queue."""
+        query, project = update_query(user)
+        try:
+            conn.admin.command("ping")
+            cursor = db.tracking.find(query, project, batch_size=batch_size)
+            for rec in cursor:
+                rec.pop("_id", None)
+                fetch_queue.put(rec)
+                count("extract")
+        except BaseException as err:
+            log(f"[pipeline.py] [extract()] [{err}]")
+            count("errors")
+        finally:
+            for _ in range(fetch_threads):
+                fetch_queue.put(DONE)
+
+    def fetch():
+        """Request record schedule from ONE web site."""
+        rec = fetch_queue.get()
+        while rec is not DONE:
+            try:
+                extract_schedule_details([rec])
+                transform_queue.put(rec)
+                count("fetch")
+            except BaseException as err:
+                log(f"[pipeline.py] [fetch()] [{rec['bkgNo']} {err}]")
+                count("errors")
+            rec = fetch_queue.get()
+        transform_queue.put(DONE)
+
+    def transform_stage():
+        """Transform records until all fetch threads are done."""
+        running = fetch_threads
+        while running:
+            rec = transform_queue.get()
+            if rec is DONE:
+                running -= 1
+                continue
+            try:
+                load_queue.put(transform([rec])[0])
+                count("transform")
+            except BaseException as err:
+                log(f"[pipeline.py] [transform()] [{rec['bkgNo']} {err}]")
+                count("errors")
+        load_queue.put(DONE)
+
+    def write(ops):
+        """Write batch of updates, keep draining queue on failure."""
+        try:
+            db.tracking.bulk_write(ops, ordered=False)
+            count("load", len(ops))
+        except BaseException as err:
+            log(f"[pipeline.py] [load()] [{err}]")
+            count("errors", len(ops))
+
+    def load():
+        """Write transformed records to database in batches."""
+        ops = []
+        rec = load_queue.get()
+        while rec is not DONE:
+            if rec["schedule"]:
+                try:
+                    ops.append(UpdateOne(
+                        *update_document(db, rec, timestamp, regular_update)
+                        ))
+                except BaseException as err:
+                    log(f"[pipeline.py] [load()] [{rec['bkgNo']} {err}]")
+                    count("errors")
+            elif "rejected" in rec:
+                try:
+                    quarantine(
+                        db, "pipeline", rec["bkgNo"],
+                        rec["rejected"]["rows"], rec["rejected"]["reasons"]
+                        )
+                except BaseException as err:
+                    log(f"[pipeline.py] [load()] [{err}]")
+                count("errors")
+            else:
+                count("errors")
+            if len(ops) >= batch_size:
+                write(ops)
+                ops = []
+            rec = load_queue.get()
+        if ops:
+            write(ops)
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=extract), threading.Thread(target=load),
+               threading.Thread(target=transform_stage)]
+    threads += [threading.Thread(target=fetch) for _ in range(fetch_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.monotonic() - start
+    log("[pipeline.py] [run_pipeline()] ["\
+        + ", ".join(f"{k}: {v}" for k, v in counters.items())\
+        + f", {counters['load'] / max(seconds, 0.001):.1f} records/s]")
+    return counters
@@ -0,0 +1,70 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Vessel positions time series collection. One measurement per vessel
+# and location update, containers reference vessel by IMO number
+# (tracking vesselImo field, see schedule.status_fields()):
+#   {"ts": datetime, "imo": "9806079",
+#    "position": {"type": "Point", "coordinates": [lon, lat]}}
+# Indexes: {imo, ts} for latest position lookup, 2dsphere on position.
+# Positions are written by one-line/update_ships_location.py to the app
+# database for vessels of active app shipments (active_vessels()).
+
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import CollectionInvalid
+
+from seacargos.etl.refs import vessel_name
+
+POSITIONS = "vessel_positions"
+
+def setup_positions(db):
+    """Create vessel positions time series collection and its indexes
+    (no-op for existing ones)."""
+    if POSITIONS not in db.list_collection_names():
+        try:
+            db.create_collection(POSITIONS, timeseries={
+                "timeField": "ts", "metaField": "imo", "granularity": "minutes"
+            })
+        except CollectionInvalid:
+            # Created by concurrent process
+            pass
+    db[POSITIONS].create_index(
+        [("imo", ASCENDING), ("ts", DESCENDING)], name="imo_ts_index"
+        )
+    db[POSITIONS].create_index(
+        [("position", "2dsphere")], name="position_index"
+        )
+
+def point(lon, lat):
+    """Return GeoJSON point."""
+    return {"type": "Point", "coordinates": [float(lon), float(lat)]}
+
+def save_positions(db, positions, timestamp=None):
+    """Save {imo: (lon, lat)} positions with one insert.
+    Return number of saved positions."""
+    timestamp = timestamp or datetime.now().replace(microsecond=0)
+    docs = [{"ts": timestamp, "imo": imo, "position": point(lon, lat)}
+            for imo, (lon, lat) in positions.items()]
+    if docs:
+        db[POSITIONS].insert_many(docs)
+    return len(docs)
+
+def active_vessels(db):
+    """Return [{"imo", "vesselName"}] of vessels of active shipments."""
+    imos = db.tracking.distinct(
+        "vesselImo", {"trackEnd": None, "vesselImo": {"$ne": None}}
+        )
+    return [{"imo": imo, "vesselName": vessel_name(db, imo)} for imo in imos]
+
+def latest_positions(db, imos):
+    """Return {imo: {"ts", "lon", "lat"}} latest positions of vessels.
+    One {imo, ts} index backed lookup per vessel."""
+    result = {}
+    for imo in imos:
+        doc = db[POSITIONS].find_one({"imo": imo}, sort=[("ts", DESCENDING)])
+        if doc:
+            lon, lat = doc["position"]["coordinates"]
+            result[imo] = {"ts": doc["ts"], "lon": lon, "lat": lat}
+    return result
@@ -0,0 +1,144 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Places and vessels reference collections.
+# Compact schedule events store place id instead of place and yard names
+# and only IMO number instead of vessel name (name is kept inline for
+# events without IMO number):
+#   places:  {"_id": 17, "name": "NAGOYA, AICHI, JAPAN", "yard": "TCB"}
+#   vessels: {"_id": "9806079", "name": "ONE APUS"}
+# References are upserted on first seen (vessel name is updated when
+# vessel is renamed) and id <-> name lookups are served by in-process
+# LRU caches.
+
+from collections import OrderedDict
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+CACHE_SIZE = 4096
+_place_ids = OrderedDict()
+_places = OrderedDict()
+_vessels = OrderedDict()
+
+# LRU cache helpers
+def cache_get(cache, key):
+    """Return cached value or None."""
+    value = cache.get(key, None)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+def cache_put(cache, key, value):
+    """Add value to cache, drop least recently used item."""
+    cache[key] = value
+    cache.move_to_end(key)
+    if len(cache) > CACHE_SIZE:
+        cache.popitem(last=False)
+
+def clear_cache():
+    """Clear all reference caches."""
+    _place_ids.clear()
+    _places.clear()
+    _vessels.clear()
+
+# Places
+def next_id(db, name):
+    """Return next value of counters collection sequence."""
+    counter = db.counters.find_one_and_update(
+        {"_id": name}, {"$inc": {"seq": 1}}, upsert=True,
+        return_document=ReturnDocument.AFTER
+        )
+    return counter["seq"]
+
+def place_id(db, name, yard):
+    """Return place id, add place on first seen."""
+    key = (db.name, name, yard)
+    pid = cache_get(_place_ids, key)
+    if pid is None:
+        query = {"name": name, "yard": yard}
+        place = db.places.find_one(query, {"_id": 1})
+        if not place:
+            try:
+                place = db.places.find_one_and_update(
+                    query, {"$setOnInsert": {"_id": next_id(db, "places")}},
+                    upsert=True, return_document=ReturnDocument.AFTER
+                    )
+            except DuplicateKeyError:
+                # Added by concurrent process
+                place = db.places.find_one(query, {"_id": 1})
+        pid = place["_id"]
+        cache_put(_place_ids, key, pid)
+    return pid
+
+def place(db, pid):
+    """Return (name, yard) tuple of place id."""
+    key = (db.name, pid)
+    value = cache_get(_places, key)
+    if value is None:
+        doc = db.places.find_one({"_id": pid}) or {}
+        value = (doc.get("name", ""), doc.get("yard", ""))
+        cache_put(_places, key, value)
+    return value
+
+# Vessels
+def vessel_ref(db, imo, name):
+    """Add vessel on first seen or update renamed vessel name,
+    return IMO number. Empty name does not overwrite known one."""
+    key = (db.name, imo)
+    cached = cache_get(_vessels, key)
+    if cached is None or (name and name != cached):
+        if name:
+            update = {"$set": {"name": name}}
+        else:
+            update = {"$setOnInsert": {"name": name}}
+        doc = db.vessels.find_one_and_update(
+            {"_id": imo}, update, upsert=True,
+            return_document=ReturnDocument.AFTER
+            )
+        cache_put(_vessels, key, doc["name"])
+    return imo
+
+def vessel_name(db, imo):
+    """Return vessel name of IMO number."""
+    key = (db.name, imo)
+    name = cache_get(_vessels, key)
+    if name is None:
+        doc = db.vessels.find_one({"_id": imo}) or {}
+        name = doc.get("name", "")
+        cache_put(_vessels, key, name)
+    return name
+
+# Compact schedule conversion
+def encode_event(db, event):
+    """Replace compact event names with references."""
+    if not isinstance(event.get("p"), str):
+        return event
+    result = dict(event)
+    result["p"] = place_id(db, result.pop("p"), result.pop("y", ""))
+    if result.get("i"):
+        vessel_ref(db, result["i"], result.pop("v", ""))
+    return result
+
+def decode_event(db, event):
+    """Replace compact event references with names."""
+    if isinstance(event.get("p"), str):
+        return event
+    result = dict(event)
+    result["p"], result["y"] = place(db, result["p"])
+    if "v" not in result:
+        result["v"] = vessel_name(db, result["i"]) if result.get("i") else ""
+    return result
+
+def encode_schedule(db, schedule):
+    """Replace compact schedule names with references."""
+    if schedule is None:
+        return None
+    return [encode_event(db, i) for i in schedule]
+
+def decode_schedule(db, schedule):
+    """Replace compact schedule references with names. Legacy
+    format schedule is returned as is."""
+    if schedule is None:
+        return None
+    return [decode_event(db, i) if "e" in i else i for i in schedule]
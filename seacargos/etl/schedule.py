@@ -0,0 +1,83 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Compact schedule storage format and accessors.
+# Schedule events are stored with short keys and initial schedule is
+# stored only as list of planned event dates (plannedDates field):
+#   {"n": 1, "e": "Departure from Port of Loading", "p": "NAGOYA",
+#    "y": "TCB", "d": datetime, "s": "A", "v": "ONE APUS", "i": "9806079"}
+# Readers use unpack() and planned_dates() which also accept documents
+# in legacy format (long keys, full initSchedule).
+# Stored documents reference place and vessel names by ids, see refs.py.
+# Schedule status fields are stored alongside schedule (status_fields())
+# for indexed arrival and due update queries and vessel position lookup.
+
+KEYS = {
+    "no": "n", "event": "e", "placeName": "p", "yardName": "y",
+    "eventDate": "d", "status": "s", "vesselName": "v", "imo": "i"
+}
+NAMES = {short: name for name, short in KEYS.items()}
+
+def field(name):
+    """Return dotted schedule event field path for queries."""
+    return "schedule." + KEYS[name]
+
+def pack_event(event):
+    """Convert schedule event to compact format."""
+    if "e" in event:
+        return event
+    return {KEYS[k]: v for k, v in event.items() if k in KEYS}
+
+def unpack_event(event):
+    """Convert compact schedule event to long keys format."""
+    if "e" not in event:
+        return event
+    return {NAMES[k]: v for k, v in event.items() if k in NAMES}
+
+def pack(schedule):
+    """Convert schedule to compact format."""
+    if schedule is None:
+        return None
+    return [pack_event(i) for i in schedule]
+
+def unpack(schedule):
+    """Return schedule of compact or legacy format with long keys."""
+    if schedule is None:
+        return None
+    return [unpack_event(i) for i in schedule]
+
+def planned_dates(doc):
+    """Return initially planned event dates of tracking document."""
+    if doc.get("plannedDates", None) is not None:
+        return doc["plannedDates"]
+    return [i["eventDate"] for i in doc.get("initSchedule", None) or []]
+
+def status_fields(schedule):
+    """Return schedule derived fields: last event status, number of
+    estimated events, earliest estimated event date and IMO number of
+    current vessel (last actual event with IMO)."""
+    events = [(i.get("s", i.get("status")), i.get("d", i.get("eventDate")),
+               i.get("i", i.get("imo")))
+              for i in schedule or []]
+    expected = [date for status, date, _ in events if status == "E" and date]
+    vessels = [imo for status, _, imo in events if status == "A" and imo]
+    return {
+        "lastEventStatus": events[-1][0] if events else None,
+        "pendingEvents": sum(1 for status, _, _ in events if status == "E"),
+        "nextExpectedEventAt": min(expected) if expected else None,
+        "vesselImo": vessels[-1] if vessels else None
+    }
+
+def compact_document(doc):
+    """Return $set/$unset update which converts legacy document to
+    compact format or None if document is compact already."""
+    if "initSchedule" not in doc and doc.get("plannedDates") is not None:
+        return None
+    return {
+        "$set": {
+            "schedule": pack(unpack(doc.get("schedule", None))),
+            "plannedDates": planned_dates(doc)
+        },
+        "$unset": {"initSchedule": ""}
+    }
@@ -0,0 +1,81 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# ONE payload validation. Schemas are compiled once into validator
+# functions which check every row and return None for valid row or
+# reason code for invalid one:
+#   "not_dict", "missing:<key>", "type:<key>", "format:<key>"
+# Records with invalid rows are quarantined individually, see quarantine().
+
+import re
+from datetime import datetime
+
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}$")
+OPTIONAL_DATE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2})?$")
+DIGITS_RE = re.compile(r"^\d+$")
+
+def compile_schema(fields, formats=None):
+    """Compile {key: type or tuple of types} schema and optional
+    {key: compiled regex} value formats into validator function."""
+    checks = tuple(
+        (key, types if isinstance(types, tuple) else (types,),
+         (formats or {}).get(key, None))
+        for key, types in fields.items()
+    )
+
+    def validate(row):
+        """Return None if row is valid, else reason code."""
+        if type(row) is not dict:
+            return "not_dict"
+        for key, types, pattern in checks:
+            if key not in row:
+                return "missing:" + key
+            value = row[key]
+            # Fast path exact type check before isinstance()
+            if type(value) not in types and not isinstance(value, types):
+                return "type:" + key
+            if pattern and type(value) is str and not pattern.match(value):
+                return "format:" + key
+        return None
+
+    return validate
+
+def validate_rows(validate, rows):
+    """Validate list of rows. Return list of (index, reason) tuples
+    of invalid rows, empty list if all rows are valid."""
+    if type(rows) is not list or not rows:
+        return [(None, "empty")]
+    rejected = []
+    for idx, row in enumerate(rows):
+        reason = validate(row)
+        if reason:
+            rejected.append((idx, reason))
+    return rejected
+
+def quarantine(db, source, key, rows, rejected):
+    """Save rejected rows with reason codes to quarantine collection."""
+    timestamp = datetime.now().replace(microsecond=0)
+    docs = [{
+        "source": source, "key": key, "reason": reason, "index": idx,
+        "row": rows[idx] if idx is not None else rows, "timestamp": timestamp
+    } for idx, reason in rejected]
+    if docs:
+        db.quarantine.insert_many(docs)
+
+# ONE payload schemas
+validate_container = compile_schema(
+    {"cntrNo": str, "cntrTpszNm": str, "copNo": str, "blNo": str, "bkgNo": str}
+)
+SCHEDULE_ROW = {
+    "no": (str, int), "statusNm": str, "placeNm": str, "yardNm": str,
+    "eventDt": str, "actTpCd": str, "vslEngNm": str, "lloydNo": str
+}
+# New records require all event dates
+validate_schedule_row = compile_schema(
+    SCHEDULE_ROW, {"no": DIGITS_RE, "eventDt": DATE_RE}
+)
+# Updates accept empty event date (see oneline_update.str_to_date())
+validate_update_row = compile_schema(
+    SCHEDULE_ROW, {"no": DIGITS_RE, "eventDt": OPTIONAL_DATE_RE}
+)
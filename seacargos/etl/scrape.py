@@ -0,0 +1,64 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+# Targeted HTML extraction for ships web pages (one-line scripts).
+# Precompiled patterns stop at the first matching element instead of
+# building full BeautifulSoup tree of the page. Results match
+# BeautifulSoup "html.parser" extraction, see tests/test_scrape.py:
+#   page_title(html)    soup.title.text
+#   vessel_link(html)   soup.find("a", class_="vessel-link").get("href")
+#   coordinate(html, "coordinate lon")
+#                       soup.find("div", class_="coordinate lon").text
+# Markup inside comments and scripts is not skipped, patterns match
+# start tags only.
+
+import re
+from html import unescape
+
+TITLE_RE = re.compile(r"<title(?:\s[^>]*)?>(.*?)</title\s*>", re.I | re.S)
+# Start tag with class attribute containing 'vessel-link' class
+A_TAG_RE = re.compile(
+    r"<a\s+(?:[^>]*?\s)?class\s*=\s*"
+    r"(?:\"(?:[^\"]*\s)?vessel-link(?:\s[^\"]*)?\""
+    r"|'(?:[^']*\s)?vessel-link(?:\s[^']*)?')[^>]*>", re.I
+    )
+HREF_RE = re.compile(
+    r"(?<![\w-])href\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+))", re.I
+    )
+TAG_RE = re.compile(r"<[^>]+>")
+_div_patterns = {}
+
+def text(fragment):
+    """Return text of html fragment without tags."""
+    return unescape(TAG_RE.sub("", fragment))
+
+def page_title(html):
+    """Return page title text or None."""
+    match = TITLE_RE.search(html)
+    return unescape(match.group(1)) if match else None
+
+def vessel_link(html):
+    """Return href of first 'vessel-link' class link or None."""
+    match = A_TAG_RE.search(html)
+    if not match:
+        return None
+    href = HREF_RE.search(match.group(0))
+    if not href:
+        return None
+    return unescape(next(i for i in href.groups() if i is not None))
+
+def coordinate(html, css_class):
+    """Return text of first div with class attribute equal to
+    css_class (whitespace insensitive) or None."""
+    pattern = _div_patterns.get(css_class)
+    if pattern is None:
+        value = r"\s+".join(map(re.escape, css_class.split()))
+        value = rf"\s*{value}\s*"
+        pattern = re.compile(
+            r"<div\s+(?:[^>]*?\s)?class\s*=\s*"
+            rf"(?:\"{value}\"|'{value}')[^>]*>(.*?)</div\s*>", re.I | re.S
+            )
+        _div_patterns[css_class] = pattern
+    match = pattern.search(html)
+    return text(match.group(1)) if match else None
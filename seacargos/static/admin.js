@@ -0,0 +1,30 @@
+/* Seacargos - sea cargos aggregator web application. */
+/* Copyright (C) 2022 Evgeny Deriglazov */
+/* https://github.com/evgeny81d/seacargos/blob/main/LICENSE */
+
+/* Search-as-you-type for admin user selectors. */
+/* Refill user names datalist from /admin/user-names on input. */
+(function () {
+    var input = document.getElementById("user-name");
+    var list = document.getElementById("user-names");
+    if (!input || !list) {
+        return;
+    }
+    var timer = null;
+    input.addEventListener("input", function () {
+        clearTimeout(timer);
+        timer = setTimeout(function () {
+            var url = input.dataset.source + "&q=" + encodeURIComponent(input.value);
+            fetch(url, {credentials: "same-origin"})
+                .then(function (r) { return r.json(); })
+                .then(function (data) {
+                    list.innerHTML = "";
+                    data.names.forEach(function (name) {
+                        var option = document.createElement("option");
+                        option.value = name;
+                        list.appendChild(option);
+                    });
+                });
+        }, 200);
+    });
+})();
@@ -0,0 +1,114 @@
+/* Seacargos - sea cargos aggregator web application. */
+/* Copyright (C) 2022 Evgeny Deriglazov */
+/* https://github.com/evgeny81d/seacargos/blob/main/LICENSE */
+
+/* Live dashboard updates. */
+/* Poll /api/dashboard/changes with If-None-Match and refetch only */
+/* changed table rows. Unchanged user data is answered with 304. */
+(function () {
+    var script = document.currentScript;
+    if (!window.fetch || !script) {
+        return;
+    }
+
+    function cells(row) {
+        return [
+            row.refId, row.booking, row.container, row.type,
+            row.from.location + "<br>" + row.from.terminal,
+            row.departure,
+            row.to.location + "<br>" + row.to.terminal,
+            row.arrival, row.requestedETA, row.totalDays, row.etaDelay
+        ];
+    }
+
+    function escape(value) {
+        var div = document.createElement("div");
+        div.textContent = String(value);
+        return div.innerHTML;
+    }
+
+    function updateRow(row) {
+        var tr = document.querySelector('tr[data-booking="' + row.booking + '"]');
+        if (!tr) {
+            return;
+        }
+        var values = cells(row);
+        for (var i = 0; i < tr.cells.length && i < values.length; i++) {
+            if (i === 1) {
+                tr.cells[i].querySelector("a").textContent = row.booking;
+            } else if (i === 4 || i === 6) {
+                tr.cells[i].innerHTML = values[i].split("<br>").map(escape).join("<br>");
+            } else {
+                tr.cells[i].textContent = values[i];
+            }
+        }
+    }
+
+    function refreshSummary() {
+        fetch(script.dataset.summary, {credentials: "same-origin"})
+            .then(function (r) { return r.json(); })
+            .then(function (data) {
+                ["active", "arrived", "total", "updated_on"].forEach(function (key) {
+                    var el = document.getElementById("summary-" + key);
+                    if (el) {
+                        el.textContent = data[key];
+                    }
+                });
+            });
+    }
+
+    function applyChanges(changes) {
+        changes.closed.forEach(function (booking) {
+            var tr = document.querySelector('tr[data-booking="' + booking + '"]');
+            if (tr) {
+                tr.parentNode.removeChild(tr);
+            }
+        });
+        if (changes.updated.length > 0) {
+            var query = changes.updated.map(function (booking) {
+                return "bkgNo=" + encodeURIComponent(booking);
+            }).join("&");
+            fetch(script.dataset.rows + "?" + query, {credentials: "same-origin"})
+                .then(function (r) { return r.json(); })
+                .then(function (data) { data.table.forEach(updateRow); });
+        }
+        if (changes.updated.length > 0 || changes.closed.length > 0) {
+            refreshSummary();
+        }
+    }
+
+    var since = null;
+    var etag = null;
+    var interval = parseInt(script.dataset.interval, 10) * 1000;
+
+    function poll() {
+        var url = script.dataset.changes;
+        var headers = {};
+        if (since) {
+            url += "?since=" + encodeURIComponent(since);
+        }
+        if (etag) {
+            headers["If-None-Match"] = etag;
+        }
+        fetch(url, {credentials: "same-origin", cache: "no-store", headers: headers})
+            .then(function (r) {
+                if (r.status !== 200) {
+                    return null;
+                }
+                etag = r.headers.get("ETag");
+                return r.json();
+            })
+            .then(function (changes) {
+                if (changes) {
+                    if (since) {
+                        applyChanges(changes);
+                    }
+                    since = changes.since;
+                }
+            })
+            .catch(function () {})
+            .then(function () { setTimeout(poll, interval); });
+    }
+
+    poll();
+})();
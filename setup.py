@@ -12,6 +12,11 @@ setup(
     zip_safe=False,
     install_requires=[
         'flask',
-        'gunicorn'
+        'gunicorn',
+        'numpy'
     ],
+    extras_require={
+        'export': ['pyarrow'],
+        'xlsx': ['xlsxwriter'],
+    },
 )
\ No newline at end of file
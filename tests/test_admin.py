@@ -12,6 +12,8 @@ from seacargos.admin import database_stats
 from seacargos.admin import etl_log_stats
 from seacargos.admin import active_user_names_from_db
 from seacargos.admin import blocked_user_names_from_db
+from seacargos.admin import name_query
+from seacargos.admin import users_from_db
 
 # Helper functions to run tests
 def login(client, user, pwd, follow=True):
@@ -137,7 +139,8 @@ def test_active_user_names_from_db(app):
     with app.app_context():
         db = db_conn()[g.db_name]
         active_users = active_user_names_from_db(db)
-        cur = db.users.find({"active": True}, {"_id": 0, "name": 1})
+        cur = db.users.find({"active": True}, {"_id": 0, "name": 1})\
+            .sort("name", 1)
         count = db.users.count_documents({"active": True})
         check = []
         for c in cur:
@@ -154,7 +157,8 @@ def test_blocked_user_names_from_db(app):
 
         # Check current database condition
         blocked_users = blocked_user_names_from_db(db)
-        cur = db.users.find({"active": False}, {"_id": 0, "name": 1})
+        cur = db.users.find({"active": False}, {"_id": 0, "name": 1})\
+            .sort("name", 1)
         count = db.users.count_documents({"active": False})
         check = []
         for c in cur:
@@ -165,7 +169,8 @@ def test_blocked_user_names_from_db(app):
         # Block all users in database
         db.users.update_many({}, {"$set": {"active": False}})
         blocked_users = blocked_user_names_from_db(db)
-        cur = db.users.find({"active": False}, {"_id": 0, "name": 1})
+        cur = db.users.find({"active": False}, {"_id": 0, "name": 1})\
+            .sort("name", 1)
         count = db.users.count_documents({"active": False})
         check = []
         for c in cur:
@@ -175,4 +180,45 @@ def test_blocked_user_names_from_db(app):
 
         # Restore test database data
         db.users.update_many({}, {"$set": {"active": True}})
-        del db
\ No newline at end of file
+        del db
+
+def test_name_query():
+    """Test name_query() function."""
+    assert name_query({}) == {}
+    assert name_query({"active": True}, search="te") ==\
+        {"active": True, "name": {"$regex": "^te"}}
+    assert name_query({}, after="abc") == {"name": {"$gt": "abc"}}
+    assert name_query({}, search="a.b", after="a") ==\
+        {"name": {"$regex": "^a\\.b", "$gt": "a"}}
+
+def test_users_from_db(app):
+    """Test users_from_db() function."""
+    with app.app_context():
+        db = db_conn()[g.db_name]
+        # Prepare database
+        db.users.delete_many({"name": {"$regex": "^page"}})
+        db.users.insert_many([
+            {"name": f"page{i}", "role": "user", "active": True,
+             "password": "x"} for i in range(5)
+        ])
+
+        # First page and cursor to next page
+        users, next_name = users_from_db(db, search="page", limit=2)
+        assert [u["name"] for u in users] == ["page0", "page1"]
+        assert "password" not in users[0]
+        assert next_name == "page1"
+
+        # Last page
+        users, next_name = users_from_db(
+            db, search="page", after="page3", limit=2
+            )
+        assert [u["name"] for u in users] == ["page4"]
+        assert next_name == None
+
+        # Search as you type for user selectors
+        assert active_user_names_from_db(db, "page", "page0", 2) ==\
+            ["page1", "page2"]
+        assert blocked_user_names_from_db(db, "page") == []
+
+        # Clean database
+        db.users.delete_many({"name": {"$regex": "^page"}})
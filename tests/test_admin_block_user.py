@@ -56,7 +56,6 @@ def test_admin_block_user_response(client, app):
 def test_admin_block_user_form(client, app):
     """Test block_user() form."""
     with app.app_context():
-        # Error "User data was not updated" not covered
         # Login and prepare database
         db = db_conn()[g.db_name]
         db.users.update_many({}, {"$set": {"active": True}})
@@ -74,6 +73,14 @@ def test_admin_block_user_form(client, app):
         assert b"User successfully blocked." in response.data
         assert db.users.count_documents({"active": False}) == 1
 
+        # Block already blocked user
+        response = client.post(
+            "/admin/block-user",
+            data={"user-name": "test"},
+            follow_redirects=True
+        )
+        assert b"User data was not updated." in response.data
+
         # Block empty user
         response = client.post(
             "/admin/block-user",
@@ -123,6 +123,16 @@ def test_admin_edit_user_form(client, app):
             follow_redirects=True)
         assert b"User data was not updated." in response.data
 
+        # Update blocked user
+        db.users.update_one({"name": "test_1"}, {"$set": {"active": False}})
+        response = client.post(
+            "/admin/edit-user",
+            data={"user-name": "test_1", "role": "user",
+                "pwd": "", "pwd-repeat": ""},
+            follow_redirects=True)
+        assert b"User data was not updated." in response.data
+        assert db.users.find_one({"name": "test_1"})["role"] == "admin"
+
         # Clear database
         db.users.delete_one({"name": "test_1"})
         del db
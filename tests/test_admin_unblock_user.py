@@ -56,7 +56,6 @@ def test_admin_unblock_user_response(client, app):
 def test_admin_unblock_user_form(client, app):
     """Test unblock_user() form."""
     with app.app_context():
-        # Error "User data was not updated" not covered
         # Login and prepare database
         db = db_conn()[g.db_name]
         db.users.update_many({"name": "test"}, {"$set": {"active": False}})
@@ -74,6 +73,14 @@ def test_admin_unblock_user_form(client, app):
         assert b"User successfully unblocked." in response.data
         assert db.users.count_documents({"active": False}) == 0
 
+        # Unblock active user
+        response = client.post(
+            "/admin/unblock-user",
+            data={"user-name": "test"},
+            follow_redirects=True
+        )
+        assert b"User data was not updated." in response.data
+
         # Block empty user
         response = client.post(
             "/admin/unblock-user",
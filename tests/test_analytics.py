@@ -0,0 +1,113 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+from pymongo.mongo_client import MongoClient
+from datetime import datetime
+
+from seacargos.analytics import load_columns
+from seacargos.analytics import compute_stats
+from seacargos.analytics import lane_stats
+
+USER = "test"
+
+# Helper functions to run tests
+def login(client, user, pwd, follow=True):
+    """Simple login function."""
+    return client.post(
+        "/", data={"username": user, "password": pwd},
+        follow_redirects=follow)
+
+def record(bkg, dep, arr, eta="-", planned="", to="BUSAN|PNC"):
+    """Test tracking record."""
+    return {
+        "user": USER, "bkgNo": bkg, "trackEnd": None,
+        "outboundTerminal": "NAGOYA|TCB", "inboundTerminal": to,
+        "departureDate": dep, "arrivalDate": arr, "requestedETA": eta,
+        "plannedArrivalDate": planned, "recordUpdate": datetime(2022, 1, 1)
+    }
+
+def test_analytics(client, app):
+    """Test analytics view and statistics functions."""
+    with app.app_context():
+        # Prepare variables and clean database
+        uri = app.config["DB_FRONTEND_URI"]
+        db_name = app.config["DB_NAME"]
+        conn = MongoClient(uri)
+        db = conn[db_name]
+        db.tracking.delete_many({})
+        db.tracking_archive.delete_many({})
+
+        # Not logged in user condition
+        response = client.get("/dashboard/analytics")
+        assert response.status_code == 302
+
+        # Write test data set to database
+        db.tracking.insert_many([
+            record("1", datetime(2022, 1, 1), datetime(2022, 1, 11),
+                   eta=datetime(2022, 1, 12), planned=datetime(2022, 1, 10)),
+            record("2", datetime(2022, 1, 1), datetime(2022, 1, 21),
+                   eta=datetime(2022, 1, 12), planned=datetime(2022, 1, 11)),
+            record("3", datetime(2022, 1, 1), "", to="OSAKA|DICT"),
+        ])
+        db.tracking_archive.insert_one(
+            record("4", datetime(2022, 2, 1), datetime(2022, 2, 16))
+            )
+
+        # Check load_columns() function
+        columns = load_columns(db, "test")
+        assert columns["departure"].size == 4
+        assert columns["arrival"].dtype.name == "datetime64[m]"
+        columns = load_columns(db, "test", date_to=datetime(2022, 1, 31))
+        assert columns["departure"].size == 3
+
+        # Records departed during date_to day are included
+        db.tracking.insert_one(dict(
+            record("5", datetime(2022, 2, 1, 10, 0), ""), user="late"
+            ))
+        date = datetime(2022, 2, 1)
+        assert load_columns(db, "late", date, date)["departure"].size == 1
+        assert load_columns(db, "late", date_to=datetime(2022, 1, 31))[
+            "departure"].size == 0
+
+        # Check compute_stats() function
+        stats = compute_stats(load_columns(db, "test"), "lane")
+        assert [i["group"] for i in stats] == ["NAGOYA - BUSAN", "NAGOYA - OSAKA"]
+        busan, osaka = stats
+        assert busan["shipments"] == 3
+        assert busan["transitDays"]["p50"] == 15.0
+        assert busan["transitDays"]["min"] == 10.0
+        assert busan["transitDays"]["max"] == 20.0
+        assert busan["slippageDays"]["mean"] == 5.5
+        assert busan["onTimeRate"] == 0.5
+        assert osaka == {"group": "NAGOYA - OSAKA", "shipments": 1,
+                         "transitDays": None, "slippageDays": None,
+                         "onTimeRate": None}
+        stats = compute_stats(load_columns(db, "test"), "inboundTerminal")
+        assert stats[0]["group"] == "BUSAN|PNC"
+        assert compute_stats(load_columns(db, "unknown")) == []
+
+        # Check lane_stats() cache invalidation
+        assert lane_stats(db, "test")[0]["shipments"] == 3
+        db.tracking.insert_one(
+            record("5", datetime(2022, 1, 1), datetime(2022, 1, 11))
+            )
+        assert lane_stats(db, "test")[0]["shipments"] == 4
+
+        # Check analytics view
+        user = app.config["USER_NAME"]
+        pwd = app.config["USER_PASSWORD"]
+        db.tracking.update_many({}, {"$set": {"user": user}})
+        db.tracking_archive.update_many({}, {"$set": {"user": user}})
+        with client:
+            login(client, user, pwd)
+            response = client.get("/dashboard/analytics?group=lane")
+            assert response.status_code == 200
+            assert b"NAGOYA - BUSAN" in response.data
+            response = client.get("/api/dashboard/analytics")
+            assert response.json[0]["group"] == "NAGOYA - BUSAN"
+
+        # Clean database and close connection
+        db.tracking.delete_many({})
+        db.tracking_archive.delete_many({})
+        conn.close()
@@ -0,0 +1,191 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+from flask import g
+from datetime import datetime
+from seacargos.db import db_conn
+from seacargos.dashboard import tracking_version
+from seacargos.dashboard import changed_records
+from seacargos import api
+from seacargos.api import parse_since
+from seacargos.etl.oneline import etl_one
+BKG_NO_1 = "OSAB67971900"
+
+# Helper functions to run tests
+def login(client, user, pwd, follow=True):
+    """Simple login function."""
+    return client.post(
+        "/", data={"username": user, "password": pwd},
+        follow_redirects=follow)
+
+def test_api_response(client, app):
+    """Test API for authenticated and not authenticated users."""
+    with app.app_context():
+        # Not logged user
+        response = client.get("/api/dashboard/summary")
+        assert response.status_code == 401
+
+        # Wrong user role
+        user = app.config["ADMIN_NAME"]
+        pwd = app.config["ADMIN_PASSWORD"]
+        login(client, user, pwd)
+        response = client.get("/api/dashboard/summary")
+        assert response.status_code == 403
+
+def test_api_etag(client, app):
+    """Test API ETag and 304 Not Modified responses."""
+    with app.app_context():
+        db = db_conn()[g.db_name]
+        db.tracking.delete_many({})
+        user = app.config["USER_NAME"]
+        pwd = app.config["USER_PASSWORD"]
+        login(client, user, pwd)
+
+        # First poll returns data and ETag
+        response = client.get("/api/dashboard/table")
+        assert response.status_code == 200
+        assert response.get_json() == {"table": [], "next": None}
+        etag = response.headers["ETag"]
+
+        # Unchanged data
+        for url in ["/api/dashboard/table", "/api/dashboard/summary"]:
+            response = client.get(url, headers={"If-None-Match": etag})
+            assert response.status_code == 304
+
+        # Changed data
+        db.tracking.insert_one(
+            {"user": user, "trackEnd": None, "bkgNo": "1",
+             "recordUpdate": datetime(2022, 1, 20)}
+            )
+        response = client.get(
+            "/api/dashboard/table", headers={"If-None-Match": etag}
+            )
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        db.tracking.delete_many({})
+
+def test_api_details(client, app):
+    """Test details API."""
+    with app.app_context():
+        conn = db_conn()
+        db = conn[g.db_name]
+        db.tracking.delete_many({})
+        user = app.config["USER_NAME"]
+        pwd = app.config["USER_PASSWORD"]
+        login(client, user, pwd)
+        response = client.get(f"/api/dashboard/{BKG_NO_1}")
+        assert response.status_code == 404
+
+        query = {"bkgNo": BKG_NO_1, "line": "ONE",
+                 "user": user, "trackEnd": None, "refId": "-",
+                 "requestedETA": "-"}
+        etl_one(query, conn, db)
+        response = client.get(f"/api/dashboard/{BKG_NO_1}")
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["bkg_number"] == BKG_NO_1
+        assert "plannedDate" in data["details"][0]
+        db.tracking.delete_many({})
+
+def test_tracking_version(app):
+    """Test tracking_version() function."""
+    with app.app_context():
+        db = db_conn()[g.db_name]
+        db.tracking.delete_many({})
+        empty = tracking_version(db, "test")
+        db.tracking.insert_one(
+            {"user": "test", "trackEnd": None,
+             "recordUpdate": datetime(2022, 1, 20)}
+            )
+        added = tracking_version(db, "test")
+        assert added != empty
+        db.tracking.update_one({}, {"$set": {"trackEnd": datetime.now()}})
+        assert tracking_version(db, "test") != added
+        assert tracking_version(db, "x") != tracking_version(db, "test")
+        db.tracking.delete_many({})
+
+def test_parse_since():
+    """Test parse_since() function."""
+    assert parse_since("2022-01-20T10:00:00") == datetime(2022, 1, 20, 10)
+    assert parse_since("x") == None
+    assert parse_since(None) == None
+
+def test_changed_records(app):
+    """Test changed_records() function."""
+    with app.app_context():
+        db = db_conn()[g.db_name]
+        db.tracking.delete_many({})
+        since = datetime(2022, 1, 20)
+        db.tracking.insert_many([
+            {"user": "test", "trackEnd": None, "bkgNo": "1",
+             "recordUpdate": datetime(2022, 1, 19)},
+            {"user": "test", "trackEnd": None, "bkgNo": "2",
+             "recordUpdate": datetime(2022, 1, 21)},
+            {"user": "test", "trackEnd": datetime(2022, 1, 22), "bkgNo": "3",
+             "recordUpdate": datetime(2022, 1, 18)},
+        ])
+        assert changed_records(db, "test", since) == {
+            "updated": ["2"], "closed": ["3"], "since": datetime(2022, 1, 22)
+            }
+        db.tracking.delete_many({})
+
+def test_api_rows_and_changes(client, app):
+    """Test rows() and changes() views."""
+    with app.app_context():
+        db = db_conn()[g.db_name]
+        db.tracking.delete_many({})
+        user = app.config["USER_NAME"]
+        pwd = app.config["USER_PASSWORD"]
+        login(client, user, pwd)
+        db.tracking.insert_many([
+            {"user": user, "trackEnd": None, "bkgNo": "1",
+             "tableRow": {"booking": "1"},
+             "recordUpdate": datetime(2022, 1, 19)},
+            {"user": user, "trackEnd": None, "bkgNo": "2",
+             "tableRow": {"booking": "2"},
+             "recordUpdate": datetime(2022, 1, 21)},
+        ])
+        response = client.get("/api/dashboard/rows?bkgNo=2")
+        assert response.get_json() == {"table": [{"booking": "2"}]}
+
+        # First poll starts from latest record update
+        response = client.get("/api/dashboard/changes")
+        assert response.get_json() == {
+            "updated": [], "closed": [], "since": "2022-01-21T00:00:00"
+            }
+        etag = response.headers["ETag"]
+
+        # Unchanged data: 304 without body
+        response = client.get(
+            "/api/dashboard/changes?since=2022-01-21T00:00:00",
+            headers={"If-None-Match": etag}
+            )
+        assert response.status_code == 304
+
+        # Changed data: updated records after since
+        db.tracking.update_one(
+            {"bkgNo": "1"}, {"$set": {"recordUpdate": datetime(2022, 1, 22)}}
+            )
+        response = client.get(
+            "/api/dashboard/changes?since=2022-01-21T00:00:00",
+            headers={"If-None-Match": etag}
+            )
+        assert response.status_code == 200
+        assert response.get_json() == {
+            "updated": ["1"], "closed": [], "since": "2022-01-22T00:00:00"
+            }
+        db.tracking.delete_many({})
+
+def test_api_changes_db_error(client, app, monkeypatch):
+    """Test changes() view when changed_records() fails."""
+    monkeypatch.setattr(api, "changed_records", lambda *args: False)
+    with app.app_context():
+        login(client, app.config["USER_NAME"], app.config["USER_PASSWORD"])
+        response = client.get(
+            "/api/dashboard/changes?since=2022-01-21T00:00:00"
+            )
+        assert response.status_code == 200
+        assert response.get_json() == {
+            "updated": [], "closed": [], "since": "2022-01-21T00:00:00"
+            }
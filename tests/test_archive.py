@@ -0,0 +1,45 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+from pymongo.mongo_client import MongoClient
+from datetime import datetime, timedelta
+
+from seacargos.etl.archive import archive_closed
+
+def test_archive_closed(app):
+    """Test archive_closed() function."""
+    with app.app_context():
+        # Prepare variables and clean database
+        uri = app.config["DB_FRONTEND_URI"]
+        db_name = app.config["DB_NAME"]
+        conn = MongoClient(uri)
+        db = conn[db_name]
+        db.tracking.delete_many({})
+        db.tracking_archive.delete_many({})
+
+        # Write test data set to database
+        now = datetime.now()
+        db.tracking.insert_many([
+            {"user": "test", "bkgNo": "1", "trackEnd": None},
+            {"user": "test", "bkgNo": "2", "trackEnd": now},
+            {"user": "test", "bkgNo": "3", "trackEnd": now - timedelta(40)},
+            {"user": "test", "bkgNo": "4", "trackEnd": now - timedelta(50)},
+            {"user": "test", "bkgNo": "5", "trackEnd": now - timedelta(60)},
+        ])
+
+        # Move 3 old closed records in batches of 2
+        assert archive_closed(conn, db, days=30, batch_size=2) == 3
+        assert db.tracking.count_documents({}) == 2
+        archived = db.tracking_archive.find({}, {"bkgNo": 1, "_id": 0})\
+            .sort("bkgNo", 1)
+        assert list(archived) == [{"bkgNo": "3"}, {"bkgNo": "4"},
+                                  {"bkgNo": "5"}]
+
+        # Nothing to move condition
+        assert archive_closed(conn, db, days=30) == 0
+
+        # Clean database and close connection
+        db.tracking.delete_many({})
+        db.tracking_archive.delete_many({})
+        conn.close()
@@ -7,16 +7,31 @@ from pymongo.mongo_client import MongoClient
 from seacargos.dashboard import validate_booking_number
 from seacargos.dashboard import check_db_records
 from seacargos.dashboard import tracking_summary
+from seacargos.dashboard import location_summary
 from seacargos.dashboard import db_tracking_data
 from seacargos.dashboard import schedule_table_data
 from seacargos.dashboard import ping
 from seacargos.dashboard import db_get_record
 from seacargos.dashboard import prepare_record_details
+from seacargos.dashboard import db_get_details
+from seacargos.dashboard import db_history_data
+from seacargos.dashboard import parse_date
+from seacargos.dashboard import export_rows
+from seacargos.dashboard import export_values
+from seacargos.dashboard import csv_stream
+from seacargos.dashboard import parse_sort
+from seacargos.dashboard import page_size
+from seacargos.dashboard import encode_cursor
+from seacargos.dashboard import decode_cursor
+from seacargos.dashboard import table_page
 from seacargos.db import db_conn
 import json
 from bson.json_util import dumps
+from bson.objectid import ObjectId
 from datetime import datetime
 from seacargos.etl.oneline import etl_one
+from seacargos.etl.positions import setup_positions, save_positions
+from seacargos.etl import refs
 BKG_NO_1 = "OSAB67971900"
 BKG_NO_2 = "OSAB76049500"
 
@@ -314,9 +329,58 @@ def test_tracking_summary(client, app):
             {"active": 2, "arrived": 1, "total": 3,
             "updated_on": "25-01-2022 00:00"}
 
+        # Check archived records condition
+        db.tracking_archive.insert_one(
+            {"user": "test", "trackEnd": date_1, "regularUpdate": date_1}
+            )
+        assert tracking_summary(db, user) == \
+            {"active": 2, "arrived": 2, "total": 4,
+            "updated_on": "25-01-2022 00:00"}
+
         # Clean database
         db.tracking.delete_many({})
-        
+        db.tracking_archive.delete_many({})
+
+def test_location_summary(app):
+    """Test location_summary() function."""
+    with app.app_context():
+        db = db_conn()[g.db_name]
+        db.tracking.delete_many({})
+        db.vessels.delete_many({})
+        db.drop_collection("vessel_positions")
+        refs.clear_cache()
+
+        # Check empty database
+        assert location_summary(db, "test") == {"locations": []}
+
+        # Check vessels of active shipments and latest positions
+        setup_positions(db)
+        refs.vessel_ref(db, "9806079", "ONE APUS")
+        db.tracking.insert_many([
+            {"user": "test", "trackEnd": None, "vesselImo": "9806079"},
+            {"user": "test", "trackEnd": None, "vesselImo": "9806079"},
+            {"user": "test", "trackEnd": None, "vesselImo": "9806081"},
+            {"user": "test", "trackEnd": None, "vesselImo": None},
+            {"user": "test", "trackEnd": datetime(2022, 1, 9),
+             "vesselImo": "9806079"},
+            {"user": "x", "trackEnd": None, "vesselImo": "9806079"}
+        ])
+        save_positions(db, {"9806079": (135.5, 34.6)}, datetime(2022, 1, 5))
+        save_positions(db, {"9806079": (136.0, 34.0)},
+                       datetime(2022, 1, 6, 8, 30))
+        assert location_summary(db, "test") == {"locations": [
+            {"vessel": "ONE APUS", "imo": "9806079", "containers": 2,
+             "lon": 136.0, "lat": 34.0, "updated_on": "06-01-2022 08:30"},
+            {"vessel": "9806081", "imo": "9806081", "containers": 1,
+             "lon": None, "lat": None, "updated_on": "-"}
+        ]}
+
+        # Clean database
+        db.tracking.delete_many({})
+        db.vessels.delete_many({})
+        db.drop_collection("vessel_positions")
+        refs.clear_cache()
+
 def test_db_tracking_data(client, app):
     """Test db_tracking_data() function."""
     with app.app_context():
@@ -362,6 +426,106 @@ def test_db_tracking_data(client, app):
         db.tracking.delete_many({})
             
 
+def test_parse_sort_and_page_size():
+    """Test parse_sort() and page_size() functions."""
+    assert parse_sort("-departureDate") == "-departureDate"
+    assert parse_sort("bkgNo") == "bkgNo"
+    assert parse_sort("-schedule") == "-departureDate"
+    assert parse_sort(None) == "-departureDate"
+    assert page_size(None) == 50
+    assert page_size("abc") == 50
+    assert page_size("0") == 1
+    assert page_size("20") == 20
+    assert page_size("100000") == 500
+
+def test_encode_decode_cursor():
+    """Test encode_cursor() and decode_cursor() functions."""
+    _id = ObjectId()
+    date = datetime(2021, 12, 1, 7, 42)
+    token = encode_cursor({"_id": _id, "departureDate": date}, "-departureDate")
+    assert decode_cursor(token) == [date, _id]
+    token = encode_cursor({"_id": _id, "bkgNo": "OSAB1"}, "bkgNo")
+    assert decode_cursor(token) == ["OSAB1", _id]
+    assert decode_cursor(None) == None
+    assert decode_cursor("--broken--") == None
+
+def test_db_tracking_data_pages(client, app):
+    """Test db_tracking_data() keyset pagination."""
+    with app.app_context():
+        db = db_conn()[g.db_name]
+        db.tracking.delete_many({})
+        user = app.config["USER_NAME"]
+        records = [
+            {"user": user, "trackEnd": None, "bkgNo": f"OSAB{i}",
+             "departureDate": datetime(2022, 1, 1 + i % 3)}
+            for i in range(7)
+        ]
+        records.append({"user": user, "trackEnd": None, "bkgNo": "OSAB7",
+                        "departureDate": ""})
+        ids = db.tracking.insert_many(records).inserted_ids
+        bkg = {_id: r["bkgNo"] for _id, r in zip(ids, records)}
+
+        # Walk all pages with page size 3
+        seen = []
+        after = None
+        while True:
+            cursor = db_tracking_data(user, db, "-departureDate", after, 3)
+            page, token = table_page(cursor, "-departureDate", 3)
+            seen.extend(bkg[r["_id"]] for r in page)
+            if token is None:
+                break
+            after = decode_cursor(token)
+        assert len(seen) == 8
+        assert len(set(seen)) == 8
+        assert seen[-1] == "OSAB7"
+
+        # Ascending sort by booking number
+        cursor = db_tracking_data(user, db, "bkgNo", None, 3)
+        page, token = table_page(cursor, "bkgNo", 3)
+        assert [r["bkgNo"] for r in page] == ["OSAB0", "OSAB1", "OSAB2"]
+        cursor = db_tracking_data(user, db, "bkgNo", decode_cursor(token), 3)
+        page, token = table_page(cursor, "bkgNo", 3)
+        assert [r["bkgNo"] for r in page] == ["OSAB3", "OSAB4", "OSAB5"]
+
+        # Clear db
+        db.tracking.delete_many({})
+
+def test_db_tracking_data_mixed_pages(client, app):
+    """Test db_tracking_data() pagination across dates, "" and None."""
+    with app.app_context():
+        db = db_conn()[g.db_name]
+        db.tracking.delete_many({})
+        user = app.config["USER_NAME"]
+        values = [datetime(2022, 1, 1), datetime(2022, 1, 2),
+                  datetime(2022, 1, 3), "", "", None, None]
+        records = [
+            {"user": user, "trackEnd": None, "bkgNo": f"OSAB{i}",
+             "departureDate": value} for i, value in enumerate(values)
+            ]
+        # Missing field sorts as None
+        records.append({"user": user, "trackEnd": None, "bkgNo": "OSAB7"})
+        ids = db.tracking.insert_many(records).inserted_ids
+        bkg = {_id: r["bkgNo"] for _id, r in zip(ids, records)}
+
+        # Walk all pages with page size 2 in both sort orders
+        for sort, expected in [
+            ("departureDate", ["5", "6", "7", "3", "4", "0", "1", "2"]),
+            ("-departureDate", ["2", "1", "0", "4", "3", "7", "6", "5"])
+            ]:
+            seen = []
+            after = None
+            while True:
+                cursor = db_tracking_data(user, db, sort, after, 2)
+                page, token = table_page(cursor, sort, 2)
+                seen.extend(bkg[r["_id"]] for r in page)
+                if token is None:
+                    break
+                after = decode_cursor(token)
+            assert seen == [f"OSAB{i}" for i in expected], sort
+
+        # Clear db
+        db.tracking.delete_many({})
+
 def test_schedule_table_data():
     """Test schedule_table_data() function."""
     records = [{'cntrNo': 'SZLU3605702', 'refId': '-', 'cntrType': "20'REEFER",
@@ -384,6 +548,33 @@ def test_schedule_table_data():
          "totalDays": 9, "requestedETA": "-", "etaDelay": "-"}
         ]}
     assert schedule_table_data(records) == table
+    # Partial tableRow (route fields only) is recomputed
+    partial = dict(records[0], tableRow={"departure": "-"})
+    assert schedule_table_data([partial]) == table
+
+def test_dashboard_legacy_record(client, app):
+    """Test dashboard renders records without tableRow field."""
+    with app.app_context():
+        db = db_conn()[g.db_name]
+        db.tracking.delete_many({})
+        user = app.config["USER_NAME"]
+        pwd = app.config["USER_PASSWORD"]
+        login(client, user, pwd)
+        db.tracking.insert_one({
+            "user": user, "trackEnd": None, "bkgNo": "OSAB1", "refId": "-",
+            "cntrNo": "TCKU1", "cntrType": "40'HC", "requestedETA": "-",
+            "outboundTerminal": "NAGOYA|TCB",
+            "departureDate": datetime(2022, 1, 5),
+            "inboundTerminal": "BUSAN|PNC",
+            "arrivalDate": datetime(2022, 1, 9)
+            })
+        response = client.get("/dashboard")
+        assert response.status_code == 200
+        assert b"OSAB1" in response.data
+        rows = list(export_rows(db, user))
+        assert rows[0]["booking"] == "OSAB1"
+        assert rows[0]["totalDays"] == 4
+        db.tracking.delete_many({})
 
 def test_ping_decorator_function(app):
     """Test ping function."""
@@ -444,12 +635,13 @@ def test_prepare_record_details(app):
                  "requestedETA": "-"} 
         etl_one(query, conn, db)
         record =  db_get_record(db, BKG_NO_1, "test")
-        details = prepare_record_details(record)
+        details = prepare_record_details(record, db)
         keys = ["event", "placeName", "yardName", "plannedDate",
                 "actualDate", "delta", "status"]
         assert details != None
         assert isinstance(details, list) == True
         assert set(keys).issubset(set(details[0].keys())) == True
+        assert isinstance(details[0]["placeName"], str)
 
         # Clear test database
         db.tracking.delete_many({})
@@ -457,4 +649,121 @@ def test_prepare_record_details(app):
 
 
 
-        
\ No newline at end of file
+        
+
+def test_db_get_details(app):
+    """Test db_get_details() function."""
+    with app.app_context():
+        conn = db_conn()
+        db = conn[g.db_name]
+        db.tracking.delete_many({})
+        # Check empty database
+        assert db_get_details(db, BKG_NO_1, "test") == None
+
+        # Check precomputed details
+        user = app.config["USER_NAME"]
+        query = {"bkgNo": BKG_NO_1, "line": "ONE",
+                 "user": user, "trackEnd": None, "refId": "-",
+                 "requestedETA": "-"}
+        etl_one(query, conn, db)
+        record = db_get_details(db, BKG_NO_1, "test")
+        assert set(record) == {"details", "recordUpdate"}
+        assert record["details"][0]["delta"] == 0
+
+        # Check record without precomputed details
+        db.tracking.update_one({}, {"$unset": {"details": ""}})
+        assert db_get_details(db, BKG_NO_1, "test")["details"] ==\
+            record["details"]
+
+        # Clear test database
+        db.tracking.delete_many({})
+
+def test_db_history_data(app):
+    """Test db_history_data() function."""
+    with app.app_context():
+        db = db_conn()[g.db_name]
+        db.tracking.delete_many({})
+        db.tracking_archive.delete_many({})
+        db.tracking.insert_many([
+            {"user": "test", "tableRow": {"booking": "1"},
+             "trackEnd": None},
+            {"user": "test", "tableRow": {"booking": "2"},
+             "trackEnd": datetime(2022, 1, 5)},
+            {"user": "test", "tableRow": {"booking": "3"},
+             "trackEnd": datetime(2022, 1, 3)},
+        ])
+        db.tracking_archive.insert_many([
+            {"user": "test", "tableRow": {"booking": "4"},
+             "trackEnd": datetime(2022, 1, 4)},
+            {"user": "test", "tableRow": {"booking": "5"},
+             "trackEnd": datetime(2022, 1, 2)},
+        ])
+        cursor = db_history_data("test", db, None, 3)
+        page, token = table_page(cursor, "-trackEnd", 3)
+        assert [r["tableRow"]["booking"] for r in page] == ["2", "4", "3"]
+        cursor = db_history_data("test", db, decode_cursor(token), 3)
+        page, token = table_page(cursor, "-trackEnd", 3)
+        assert [r["tableRow"]["booking"] for r in page] == ["5"]
+        assert token == None
+        db.tracking.delete_many({})
+        db.tracking_archive.delete_many({})
+
+def test_export_helpers():
+    """Test parse_date(), export_values() and csv_stream() functions."""
+    assert parse_date("2022-01-20") == datetime(2022, 1, 20)
+    assert parse_date("20-01-2022") == None
+    assert parse_date(None) == None
+    row = {"refId": "-", "booking": "OSAB1", "container": "TCKU1",
+           "type": "40'HC", "from": {"location": "NAGOYA", "terminal": "TCB"},
+           "departure": "01-12-2021 07:42",
+           "to": {"location": "BUSAN", "terminal": "PNC"},
+           "arrival": "10-12-2021 10:00", "requestedETA": "-",
+           "totalDays": 9, "etaDelay": "-"}
+    assert export_values(row) == [
+        "-", "OSAB1", "TCKU1", "40'HC", "NAGOYA", "TCB", "01-12-2021 07:42",
+        "BUSAN", "PNC", "10-12-2021 10:00", "-", 9, "-"]
+    chunks = list(csv_stream(iter([row, row])))
+    assert chunks[0].startswith("Ref Id,Booking,")
+    assert chunks[1].startswith("-,OSAB1,TCKU1")
+    assert "".join(chunks).count("\n") == 3
+
+def test_export(client, app):
+    """Test export_rows() function and export() view."""
+    with app.app_context():
+        db = db_conn()[g.db_name]
+        db.tracking.delete_many({})
+        db.tracking_archive.delete_many({})
+        user = app.config["USER_NAME"]
+        pwd = app.config["USER_PASSWORD"]
+        db.tracking.insert_many([
+            {"user": user, "trackEnd": None, "tableRow": {"booking": "1"},
+             "departureDate": datetime(2022, 1, 5)},
+            {"user": user, "trackEnd": None, "tableRow": {"booking": "2"},
+             "departureDate": datetime(2022, 2, 5)},
+            {"user": user, "trackEnd": datetime(2022, 3, 1),
+             "tableRow": {"booking": "3"},
+             "departureDate": datetime(2022, 1, 10)},
+        ])
+        db.tracking_archive.insert_one(
+            {"user": user, "trackEnd": datetime(2022, 2, 1),
+             "tableRow": {"booking": "4"},
+             "departureDate": datetime(2022, 1, 1)}
+            )
+        bookings = lambda rows: [r["booking"] for r in rows]
+        assert bookings(export_rows(db, user)) == ["2", "1"]
+        assert bookings(export_rows(db, user, "arrived")) == ["3", "4"]
+        assert bookings(export_rows(db, user, "all")) == ["2", "1", "3", "4"]
+        assert bookings(export_rows(
+            db, user, "all", datetime(2022, 1, 5), datetime(2022, 1, 10)
+            )) == ["1", "3"]
+
+        # View
+        login(client, user, pwd)
+        response = client.get("/dashboard/export?status=all&format=csv")
+        assert response.status_code == 200
+        assert response.mimetype == "text/csv"
+        assert len(response.data.decode().splitlines()) == 5
+        response = client.get("/dashboard/export?status=x")
+        assert response.status_code == 400
+        db.tracking.delete_many({})
+        db.tracking_archive.delete_many({})
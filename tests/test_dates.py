@@ -0,0 +1,20 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+import pytest
+from datetime import datetime
+
+from seacargos.etl.dates import parse_datetime
+
+def test_parse_datetime():
+    """Test parse_datetime() function."""
+    assert parse_datetime("2022-01-05 07:42") == datetime(2022, 1, 5, 7, 42)
+    assert parse_datetime("2022-01-05 07:42") ==\
+        datetime.strptime("2022-01-05 07:42", "%Y-%m-%d %H:%M")
+    assert parse_datetime.cache_info().hits > 0
+
+    # Wrong format conditions
+    for value in ["", "2022-01-05", "2022/01/05 07:42", "2022-13-05 07:42"]:
+        with pytest.raises(ValueError):
+            parse_datetime(value)
@@ -3,7 +3,7 @@
 # https://github.com/evgeny81d/seacargos/blob/main/LICENSE
 
 import pytest
-from seacargos.db import db_conn, close_db_conn, setup_db
+from seacargos.db import db_conn, close_db_conn, setup_db, setup_indexes
 from pymongo import MongoClient
 from flask import g
 import json
@@ -81,3 +81,15 @@ def test_db_users_collection_name_index(app):
             {'v': 2, 'key': {'_id': 1}, 'name': '_id_'}, 
             {'v': 2, 'key': {'name': 1}, 'name': 'name_index', 'unique': True}
             ]
+
+def test_setup_indexes_arrived(app):
+    """Test arrived records export and history query uses index."""
+    with app.app_context():
+        db = db_conn()[g.db_name]
+        setup_indexes(db)
+        for coll in [db.tracking, db.tracking_archive]:
+            assert "user_trackEnd_index" in coll.index_information()
+            plan = coll.find(
+                {"user": "test", "trackEnd": {"$ne": None}}
+                ).sort([("trackEnd", -1), ("_id", -1)]).explain()
+            assert "SORT" not in json.dumps(plan["queryPlanner"]["winningPlan"])
@@ -0,0 +1,52 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+from datetime import datetime
+
+from seacargos.etl.engine import compile_engine
+from seacargos.etl.engine import ROUTE_RULES
+from seacargos.etl.engine import TERMINAL_RULES
+
+def row(no, event, place, date):
+    """Raw ONE schedule row."""
+    return {
+        "no": str(no), "statusNm": event, "placeNm": place, "yardNm": "Y",
+        "eventDt": date, "actTpCd": "A", "vslEngNm": "V", "lloydNo": "1"
+    }
+
+ROWS = [
+    row(1, "Gate Out from Outbound Terminal", "NAGOYA", "2022-01-01 10:00"),
+    row(2, "Departure from Port of Loading", "NAGOYA", "2022-01-02 10:00"),
+    row(3, "Arrival at Port of Discharging", "BUSAN", "2022-01-05 10:00"),
+    row(4, "Unloaded at Inbound Terminal", "BUSAN", "2022-01-06 10:00")
+]
+
+def test_compile_engine():
+    """Test compile_engine() function."""
+    engine = compile_engine(ROUTE_RULES)
+    schedule, route = engine(ROWS)
+    assert schedule[1] == {
+        "no": 2, "event": "Departure from Port of Loading",
+        "placeName": "NAGOYA", "yardName": "Y",
+        "eventDate": datetime(2022, 1, 2, 10, 0), "status": "A",
+        "vesselName": "V", "imo": "1"
+        }
+    assert route == {
+        "outboundTerminal": "NAGOYA|Y",
+        "departureDate": datetime(2022, 1, 2, 10, 0),
+        "inboundTerminal": "BUSAN|Y",
+        "arrivalDate": datetime(2022, 1, 5, 10, 0)
+        }
+
+    # Terminal rules without dates
+    schedule, terminals = compile_engine(TERMINAL_RULES)(ROWS)
+    assert terminals == {
+        "outboundTerminal": "NAGOYA|Y", "inboundTerminal": "BUSAN|Y"
+        }
+
+    # Custom date parser and no matches condition
+    engine = compile_engine(ROUTE_RULES, lambda s: s)
+    schedule, route = engine([ROWS[0]])
+    assert schedule[0]["eventDate"] == "2022-01-01 10:00"
+    assert route == {}
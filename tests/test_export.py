@@ -0,0 +1,85 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+import pytest
+from datetime import datetime
+from pymongo.mongo_client import MongoClient
+
+from seacargos.etl.export import flatten_record
+from seacargos.etl.export import partition
+from seacargos.etl.export import export
+from seacargos.etl.schedule import pack
+
+DOC = {
+    "bkgNo": "OSAB1", "cntrNo": "TCKU1", "cntrType": "40'HC", "user": "test",
+    "line": "ONE", "outboundTerminal": "NAGOYA|TCB",
+    "inboundTerminal": "BUSAN|PNC", "departureDate": datetime(2022, 1, 5),
+    "arrivalDate": datetime(2022, 1, 9), "requestedETA": "-",
+    "trackStart": datetime(2022, 1, 1), "trackEnd": None,
+    "schedule": [
+        {"no": 1, "event": "Departure", "placeName": "NAGOYA",
+         "yardName": "TCB", "eventDate": datetime(2022, 1, 5),
+         "status": "A", "vesselName": "V", "imo": "1"},
+        {"no": 2, "event": "Arrival", "placeName": "BUSAN",
+         "yardName": "PNC", "eventDate": datetime(2022, 1, 9),
+         "status": "E", "vesselName": "V", "imo": "1"}
+    ],
+    "initSchedule": [
+        {"eventDate": datetime(2022, 1, 4)}, {"eventDate": datetime(2022, 1, 8)}
+    ]
+}
+
+def test_flatten_record():
+    """Test flatten_record() and partition() functions."""
+    rows = list(flatten_record(DOC))
+    assert len(rows) == 2
+    assert rows[0]["bkgNo"] == "OSAB1"
+    assert rows[0]["requestedETA"] == None
+    assert rows[0]["archived"] == False
+    assert rows[1]["event"] == "Arrival"
+    assert rows[1]["plannedDate"] == datetime(2022, 1, 8)
+    assert partition(rows[0]) == "departure_month=2022-01"
+    assert partition(dict(rows[0], departureDate=None)) ==\
+        "departure_month=unknown"
+
+    # Compact schedule format record
+    compact = dict(DOC, schedule=pack(DOC["schedule"]),
+                   plannedDates=[datetime(2022, 1, 4), datetime(2022, 1, 8)])
+    compact.pop("initSchedule")
+    assert list(flatten_record(compact)) == rows
+
+    # Record without schedule
+    assert list(flatten_record(dict(DOC, schedule=None))) == []
+
+def test_export(app, tmp_path):
+    """Test export() function."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    with app.app_context():
+        conn = MongoClient(app.config["DB_FRONTEND_URI"])
+        db = conn[app.config["DB_NAME"]]
+        db.tracking.delete_many({})
+        db.tracking_archive.delete_many({})
+        db.tracking.insert_one(dict(DOC))
+        db.tracking_archive.insert_one(
+            dict(DOC, departureDate=datetime(2021, 12, 1))
+            )
+        assert export(db, str(tmp_path), batch_size=1) == 4
+        table = pq.read_table(
+            tmp_path / "departure_month=2022-01" / "part-0.parquet"
+            )
+        assert table.num_rows == 2
+        assert table.column("archived").to_pylist() == [False, False]
+
+        # One open writer: partition reopened in the next part file
+        db.tracking_archive.insert_one(dict(DOC))
+        out = tmp_path / "limited"
+        assert export(db, str(out), batch_size=1, max_writers=1) == 6
+        month = out / "departure_month=2022-01"
+        assert sorted(i.name for i in month.iterdir()) == \
+            ["part-0.parquet", "part-1.parquet"]
+        assert pq.read_table(month / "part-1.parquet").column(
+            "archived").to_pylist() == [True, True]
+        db.tracking.delete_many({})
+        db.tracking_archive.delete_many({})
+        conn.close()
@@ -0,0 +1,96 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+import os
+import sys
+import time
+import socket
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "one-line")
+    )
+from fetch_pool import RateLimiter
+from fetch_pool import fetch_all
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Respond to /<seconds> after sleeping given seconds, record
+    request arrival times."""
+    arrivals = []
+
+    def do_GET(self):
+        StubHandler.arrivals.append(time.monotonic())
+        time.sleep(float(self.path.strip("/").split("?")[0] or 0))
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def base():
+    """Start stub server, yield its base url."""
+    StubHandler.arrivals = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+def closed_port():
+    """Return local port nobody listens on."""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+def test_rate_limiter():
+    """Test RateLimiter class."""
+    limiter = RateLimiter(0.1)
+    start = time.monotonic()
+    for _ in range(3):
+        limiter.wait("http://a.example/x")
+    assert time.monotonic() - start >= 0.19
+    # Other host has its own slots
+    start = time.monotonic()
+    limiter.wait("http://b.example/x")
+    assert time.monotonic() - start < 0.05
+
+def test_fetch_all_host_interval(base):
+    """Test fetch_all() keeps interval between requests to one host."""
+    jobs = [(i, base + "/0", None) for i in range(4)]
+    results = dict(fetch_all(jobs, workers=4, interval=0.1))
+    assert sorted(results) == [0, 1, 2, 3]
+    assert all(r.status_code == 200 for r in results.values())
+    arrivals = sorted(StubHandler.arrivals)
+    gaps = [b - a for a, b in zip(arrivals, arrivals[1:])]
+    assert min(gaps) >= 0.09
+
+def test_fetch_all_as_completed(base):
+    """Test fetch_all() yields results as requests complete."""
+    jobs = [("slow", base + "/0.5", None), ("fast", base + "/0", None)]
+    keys = [key for key, _ in fetch_all(jobs, workers=2, interval=0)]
+    assert keys == ["fast", "slow"]
+
+def test_fetch_all_errors(base):
+    """Test fetch_all() yields None for timeout and connection error."""
+    messages = []
+    jobs = [
+        ("timeout", base + "/1", None),
+        ("refused", f"http://127.0.0.1:{closed_port()}/0", None),
+        ("ok", base + "/0", {"q": "1"})
+    ]
+    results = dict(fetch_all(
+        jobs, workers=3, interval=0, timeout=0.2, log=messages.append
+        ))
+    assert results["timeout"] is None
+    assert results["refused"] is None
+    assert results["ok"].text == "ok"
+    assert len(messages) == 2
+    assert all(i.startswith("[Fetch pool] [Fetch]") for i in messages)
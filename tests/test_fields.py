@@ -0,0 +1,81 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+from datetime import datetime
+
+from seacargos.etl.fields import terminal
+from seacargos.etl.fields import format_date
+from seacargos.etl.fields import route_fields
+from seacargos.etl.fields import table_row
+from seacargos.etl.fields import record_details
+
+RECORD = {
+    'cntrNo': 'SZLU3605702', 'refId': '-', 'cntrType': "20'REEFER",
+    'bkgNo': 'OSAB67971900', 'user': 'test', 'trackEnd': None,
+    'outboundTerminal': 'NAGOYA, AICHI, JAPAN|TCB',
+    'departureDate': datetime(2021, 12, 1, 7, 42),
+    'inboundTerminal': 'ST PETERSBURG, RUSSIAN FEDERATION|JSC',
+    'arrivalDate': datetime(2021, 12, 10, 10, 0), 'requestedETA': '-'
+    }
+
+def test_terminal():
+    """Test terminal() function."""
+    assert terminal("NAGOYA|TCB") == {"location": "NAGOYA", "terminal": "TCB"}
+    assert terminal("") == {"location": "", "terminal": ""}
+    assert terminal(None) == {"location": "", "terminal": ""}
+
+def test_format_date():
+    """Test format_date() function."""
+    assert format_date(datetime(2021, 12, 1, 7, 42)) == "01-12-2021 07:42"
+    assert format_date("") == "-"
+
+def test_route_fields():
+    """Test route_fields() function."""
+    fields = route_fields(RECORD)
+    assert fields["departure"] == "01-12-2021 07:42"
+    assert fields["arrival"] == "10-12-2021 10:00"
+    assert fields["totalDays"] == 9
+    assert fields["etaDelay"] == "-"
+
+    # Requested ETA condition
+    record = dict(RECORD, requestedETA=datetime(2021, 12, 5))
+    assert route_fields(record)["etaDelay"] == 5
+
+    # Unknown departure date condition
+    record = dict(RECORD, departureDate="")
+    assert route_fields(record)["departure"] == "-"
+    assert route_fields(record)["totalDays"] == "-"
+
+def test_table_row():
+    """Test table_row() function."""
+    assert table_row(RECORD) == {
+        "booking": "OSAB67971900", "refId": "-", "container": "SZLU3605702",
+        "type": "20'REEFER",
+        "from": {"location": "NAGOYA, AICHI, JAPAN", "terminal": "TCB"},
+        "departure": "01-12-2021 07:42",
+        "to": {"location": "ST PETERSBURG, RUSSIAN FEDERATION",
+               "terminal": "JSC"},
+        "arrival": "10-12-2021 10:00",
+        "totalDays": 9, "requestedETA": "-", "etaDelay": "-"}
+    record = dict(RECORD, requestedETA=datetime(2021, 12, 5))
+    assert table_row(record)["requestedETA"] == "05-12-2021"
+
+def test_record_details():
+    """Test record_details() function."""
+    schedule = [
+        {"event": "Departure", "placeName": "NAGOYA", "yardName": "TCB",
+         "eventDate": datetime(2021, 12, 3, 10, 0), "status": "A"},
+        {"event": "Arrival", "placeName": "BUSAN", "yardName": "PNC",
+         "eventDate": datetime(2021, 12, 9, 10, 0), "status": "E"}
+    ]
+    planned = [datetime(2021, 12, 1, 12, 0), datetime(2021, 12, 10, 10, 0)]
+    assert record_details(schedule, planned) == [
+        {"event": "Departure", "placeName": "NAGOYA", "yardName": "TCB",
+         "plannedDate": "01-12-2021 12:00", "actualDate": "03-12-2021 10:00",
+         "delta": 1, "status": "A"},
+        {"event": "Arrival", "placeName": "BUSAN", "yardName": "PNC",
+         "plannedDate": "10-12-2021 10:00", "actualDate": "09-12-2021 10:00",
+         "delta": -1, "status": "E"}
+    ]
+    assert record_details(schedule, []) == []
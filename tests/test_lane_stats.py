@@ -0,0 +1,92 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+from pymongo.mongo_client import MongoClient
+from datetime import datetime
+
+from seacargos.etl.lane_stats import refresh_lane_stats
+from seacargos import analytics
+
+def record(user, bkg, dep, arr, eta="-", planned="", to="BUSAN|PNC"):
+    """Test tracking record."""
+    return {
+        "user": user, "bkgNo": bkg, "trackEnd": None,
+        "outboundTerminal": "NAGOYA|TCB", "inboundTerminal": to,
+        "departureDate": dep, "arrivalDate": arr, "requestedETA": eta,
+        "plannedArrivalDate": planned, "recordUpdate": datetime(2022, 1, 1)
+    }
+
+def test_refresh_lane_stats(app, monkeypatch):
+    """Test refresh_lane_stats() function."""
+    with app.app_context():
+        # Prepare variables and clean database
+        uri = app.config["DB_FRONTEND_URI"]
+        db_name = app.config["DB_NAME"]
+        conn = MongoClient(uri)
+        db = conn[db_name]
+        db.tracking.delete_many({})
+        db.tracking_archive.delete_many({})
+        db.lane_stats.delete_many({})
+
+        # Write test data set to database
+        db.tracking.insert_many([
+            record("test", "1", datetime(2022, 1, 1), datetime(2022, 1, 11),
+                   eta=datetime(2022, 1, 12), planned=datetime(2022, 1, 10)),
+            record("test", "2", datetime(2022, 1, 1), datetime(2022, 1, 21),
+                   eta=datetime(2022, 1, 12), planned=datetime(2022, 1, 11)),
+            record("test", "3", datetime(2022, 1, 1), "", to="OSAKA|DICT"),
+            record("other", "5", datetime(2022, 1, 1), datetime(2022, 1, 2)),
+        ])
+        db.tracking_archive.insert_one(
+            record("test", "4", datetime(2022, 2, 1), datetime(2022, 2, 16))
+            )
+
+        # Refresh one user and compare with vectorized statistics
+        assert refresh_lane_stats(conn, db, users=["test"])
+        assert db.lane_stats.count_documents({"user": "other"}) == 0
+        stored = analytics.stored_lane_stats(db, "test", "lane")
+        assert [i["group"] for i in stored] == ["NAGOYA - BUSAN",
+                                                "NAGOYA - OSAKA"]
+        busan = stored[0]
+        assert busan["shipments"] == 3
+        assert busan["transitDays"] == {
+            "mean": 15.0, "p50": 15.0, "p90": 19.0, "min": 10.0, "max": 20.0
+            }
+        # Same percentiles as vectorized statistics
+        vectorized = analytics.compute_stats(
+            analytics.load_columns(db, "test"), "lane"
+            )
+        for metric in ["transitDays", "slippageDays"]:
+            assert busan[metric] == vectorized[0][metric]
+        assert busan["slippageDays"]["min"] == 1.0
+        assert busan["slippageDays"]["max"] == 10.0
+        assert busan["onTimeRate"] == 0.5
+        assert stored[1]["transitDays"] is None
+        stored = analytics.stored_lane_stats(db, "test", "inboundTerminal")
+        assert [i["group"] for i in stored] == ["BUSAN|PNC", "OSAKA|DICT"]
+
+        # Stale groups are removed
+        db.tracking.delete_one({"bkgNo": "3"})
+        assert refresh_lane_stats(conn, db, users=["test"])
+        stored = analytics.stored_lane_stats(db, "test", "lane")
+        assert [i["group"] for i in stored] == ["NAGOYA - BUSAN"]
+
+        # Incremental refresh of recently updated users
+        db.tracking.update_one(
+            {"bkgNo": "5"}, {"$set": {"recordUpdate": datetime.now()}}
+            )
+        assert refresh_lane_stats(conn, db, since=datetime(2022, 6, 1))
+        assert db.lane_stats.count_documents({"user": "other"}) == 3
+
+        # Large accounts read materialized statistics
+        monkeypatch.setattr(analytics, "LARGE_ACCOUNT", 1)
+        db.tracking.delete_many({"user": "test"})
+        stats = analytics.lane_stats(db, "test")
+        assert stats[0]["shipments"] == 3
+
+        # Clean database and close connection
+        db.tracking.delete_many({})
+        db.tracking_archive.delete_many({})
+        db.lane_stats.delete_many({})
+        conn.close()
@@ -174,18 +174,20 @@ def test_transform_data():
         "cntrNo", "cntrType", "copNo", "bkgNo", "blNo", "user", "refId",
         "trackStart", "regularUpdate", "recordUpdate", "trackEnd",
         "outboundTerminal", "departureDate", "inboundTerminal", "arrivalDate",
-        "vesselName", "location", "schedule", "initSchedule", "line",
-        "requestedETA"]
+        "vesselName", "location", "schedule", "plannedDates", "line",
+        "requestedETA", "tableRow", "details", "plannedArrivalDate",
+        "lastEventStatus", "pendingEvents", "nextExpectedEventAt",
+        "vesselImo"]
     assert set(cntr_info_keys) == set(data)
+    assert data["lastEventStatus"] == data["schedule"][-1]["s"]
+    assert data["pendingEvents"] == \
+        len([i for i in data["schedule"] if i["s"] == "E"])
 
-    # Check schedule keys
-    schedule_keys =[
-        "no", "event", "placeName", "yardName", "eventDate", "status", 
-        "vesselName", "imo"]
+    # Check compact schedule keys and planned dates
+    schedule_keys = ["n", "e", "p", "y", "d", "s", "v", "i"]
     for i in data["schedule"]:
         assert set(schedule_keys) == set(i)
-    for i in data["initSchedule"]:
-        assert set(schedule_keys) == set(i)
+    assert data["plannedDates"] == [i["d"] for i in data["schedule"]]
 
     # Missing container keys condition
     missing_keys = extract_data(query)
@@ -209,6 +211,54 @@ def test_transform_data():
     assert "[oneline.py] [transform_data()]"\
         + f" [Keys do not match in schedule data {query}]" in check[-1]
 
+def test_transform_data_quarantine(app):
+    """Test transform_data() quarantines rejected rows."""
+    with app.app_context():
+        conn = MongoClient(app.config["DB_FRONTEND_URI"])
+        db = conn[app.config["DB_NAME"]]
+        db.quarantine.delete_many({})
+        query = {
+            "bkgNo": "OSAB1", "user": None,
+            "line": "ONE", "refId": "1", "requestedETA": "-"
+            }
+        container = {
+            "cntrNo": "TCKU1", "cntrTpszNm": "40'HC", "copNo": "C1",
+            "blNo": "OSAB1", "bkgNo": "OSAB1"
+            }
+        row = {
+            "no": "1", "statusNm": "Departure", "placeNm": "NAGOYA",
+            "yardNm": "TCB", "eventDt": "2022-01-05 10:00",
+            "actTpCd": "A", "vslEngNm": "V", "lloydNo": "1"
+            }
+
+        # Rejected schedule row
+        bad_row = dict(row)
+        bad_row.pop("statusNm")
+        raw = {"query": dict(query), "container_data": container,
+               "schedule_data": [row, bad_row]}
+        assert transform_data(raw, db) == False
+        check = db.quarantine.find_one({}, {"_id": 0, "timestamp": 0})
+        assert check == {"source": "oneline", "key": "OSAB1",
+                         "reason": "missing:statusNm", "index": 1,
+                         "row": bad_row}
+
+        # Rejected container data
+        db.quarantine.delete_many({})
+        bad_container = dict(container)
+        bad_container.pop("cntrNo")
+        raw = {"query": dict(query), "container_data": bad_container,
+               "schedule_data": [row]}
+        assert transform_data(raw, db) == False
+        check = db.quarantine.find_one({})
+        assert check["index"] is None
+        assert check["row"] == bad_container
+
+        # Without db rejected rows are only logged
+        db.quarantine.delete_many({})
+        assert transform_data(raw) == False
+        assert db.quarantine.count_documents({}) == 0
+        conn.close()
+
 def test_load_data(app):
     """Test load_data() function."""
     with app.app_context():
@@ -239,6 +289,10 @@ def test_load_data(app):
         result = load_data(data, conn, db)
         assert result == {"etl_message": "New record successfully added"}
         assert db.tracking.count_documents({}) == 1
+        # Place names are stored as references
+        stored = db.tracking.find_one({})
+        assert all(isinstance(i["p"], int) for i in stored["schedule"])
+        assert db.places.count_documents({}) > 0
         # Keep record in database for next test ->
         
         # Base Exception condition check
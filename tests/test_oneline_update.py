@@ -2,6 +2,7 @@
 # Copyright (C) 2022 Evgeny Deriglazov
 # https://github.com/evgeny81d/seacargos/blob/main/LICENSE
 
+import json
 from pymongo.mongo_client import MongoClient
 from datetime import datetime
 from datetime import timedelta
@@ -12,12 +13,17 @@ from seacargos.etl.oneline_update import extract_schedule_details
 from seacargos.etl.oneline_update import str_to_date
 from seacargos.etl.oneline_update import transform
 from seacargos.etl.oneline_update import update
-from seacargos.etl.oneline_update import arrived
-from seacargos.etl.oneline_update import track_end
+from seacargos.etl.oneline_update import close_arrived
 from seacargos.etl.oneline_update import conn_db
 from seacargos.etl.oneline_update import regular_schedule_update
 from seacargos.etl.oneline_update import user_schedule_update
 from seacargos.etl.oneline_update import record_schedule_update
+from seacargos.etl.oneline_update import decode_payload
+from seacargos.etl.oneline_update import transform_parallel
+from seacargos.etl.oneline_update import update_document
+from seacargos.etl.schedule import unpack
+from seacargos.etl.fields import route_fields
+from seacargos.etl.refs import decode_schedule
 
 def test_log():
     """Test log() function."""
@@ -76,33 +82,38 @@ def test_records_to_update(app):
         records = [
             {"trackEnd": None, "user": 1, "bkgNo": 1, "copNo": 1,
             "schedule": [
-                {"status": "E", "eventDate": datetime.now() - one_day}
-                ]
+                {"s": "E", "d": datetime.now() - one_day}
+                ],
+            "nextExpectedEventAt": datetime.now() - one_day
             },
             {"trackEnd": None, "user": 2, "bkgNo": 2, "copNo": 2,
             "schedule": [
-                {"status": "E", "eventDate": datetime.now() - one_day}
-                ]
+                {"s": "E", "d": datetime.now() - one_day}
+                ],
+            "nextExpectedEventAt": datetime.now() - one_day
             },
             {"trackEnd": None, "user": 1, "bkgNo": 3, "copNo": 3,
             "schedule": [
-                {"status": "A", "eventDate": datetime.now() - one_day}
-                ]
+                {"s": "A", "d": datetime.now() - one_day}
+                ],
+            "nextExpectedEventAt": None
             },
             {"trackEnd": None, "user": 2, "bkgNo": 4, "copNo": 4,
             "schedule": [
-                {"status": "E", "eventDate": datetime.now() + one_day}
-                ]
+                {"s": "E", "d": datetime.now() + one_day}
+                ],
+            "nextExpectedEventAt": datetime.now() + one_day
             },
             {"trackEnd": "end", "user": 1, "bkgNo": 5, "copNo": 5,
             "schedule": [
-                {"status": "E", "eventDate": datetime.now() - one_day}
-                ]
+                {"s": "E", "d": datetime.now() - one_day}
+                ],
+            "nextExpectedEventAt": datetime.now() - one_day
             }
         ]
         db.tracking.insert_many(records)
 
-        # No user and bkg_number arguments (filter by schedule element match)
+        # No user and bkg_number arguments (filter by next expected event date)
         result = records_to_update(conn, db)
         assert len(result) == 2
         assert result == [{"bkgNo": 1, "copNo": 1}, {"bkgNo": 2, "copNo": 2}]
@@ -131,10 +142,99 @@ def test_records_to_update(app):
         assert len(result) == 1
         assert result == [{"bkgNo": 4, "copNo": 4, "user": 2}]
 
+        # Documents without nextExpectedEventAt field, compact and long
+        # key schedules
+        db.tracking.delete_many({})
+        db.tracking.insert_many([
+            {"trackEnd": None, "user": 3, "bkgNo": 6, "copNo": 6,
+            "schedule": [{"s": "E", "d": datetime.now() - one_day}]},
+            {"trackEnd": None, "user": 3, "bkgNo": 7, "copNo": 7,
+            "schedule": [
+                {"status": "E", "eventDate": datetime.now() - one_day}
+                ]},
+            {"trackEnd": None, "user": 3, "bkgNo": 8, "copNo": 8,
+            "schedule": [
+                {"status": "A", "eventDate": datetime.now() - one_day},
+                {"status": "E", "eventDate": datetime.now() + one_day}
+                ]}
+        ])
+        result = records_to_update(conn, db)
+        assert result == [{"bkgNo": 6, "copNo": 6}, {"bkgNo": 7, "copNo": 7}]
+
         # Close connection and clean database
         db.tracking.delete_many({})
         conn.close()
 
+# Raw ONE schedule rows of stored test record
+ROWS = [
+    {"no": "1", "statusNm": "Departure from Port of Loading",
+     "placeNm": "NAGOYA", "yardNm": "TCB", "eventDt": "2022-01-06 10:00",
+     "actTpCd": "A", "vslEngNm": "ONE APUS", "lloydNo": "9806079"},
+    {"no": "2", "statusNm": "Arrival at Port of Discharging",
+     "placeNm": "BUSAN", "yardNm": "PNC", "eventDt": "2022-01-12 10:00",
+     "actTpCd": "E", "vslEngNm": "ONE APUS", "lloydNo": "9806079"}
+]
+
+def stored_record(db):
+    """Insert tracking record with datetime fields, return it as read
+    by records_to_update()."""
+    db.tracking.insert_one({
+        "user": "test", "bkgNo": "1", "copNo": "1", "trackEnd": None,
+        "refId": "R1", "cntrNo": "TCKU1", "cntrType": "40'HC",
+        "requestedETA": datetime(2022, 1, 10),
+        "plannedDates": [datetime(2022, 1, 5, 10), datetime(2022, 1, 9, 10)],
+        "nextExpectedEventAt": datetime(2022, 1, 9, 10)
+    })
+    return records_to_update(db.client, db, user="test")[0]
+
+def test_records_to_update_transform(app):
+    """Test records_to_update() -> transform() -> update_document()
+    on record with datetime planned dates."""
+    with app.app_context():
+        conn = MongoClient(app.config["DB_FRONTEND_URI"])
+        db = conn[app.config["DB_NAME"]]
+        db.tracking.delete_many({})
+
+        rec = stored_record(db)
+        assert isinstance(rec["plannedDates"][0], datetime)
+        rec["schedule"] = [dict(i) for i in ROWS]
+        rec = transform([rec])[0]
+        assert [i["delta"] for i in rec["details"]] == [1, 3]
+        query, update = update_document(db, rec, datetime(2022, 1, 7))
+        assert query == {"bkgNo": "1", "trackEnd": None, "user": "test"}
+        assert update["$set"]["details"] == rec["details"]
+        assert update["$set"]["nextExpectedEventAt"] \
+            == datetime(2022, 1, 12, 10)
+        # Whole table row of legacy record without tableRow
+        row = update["$set"]["tableRow"]
+        assert (row["booking"], row["container"], row["refId"]) \
+            == ("1", "TCKU1", "R1")
+        assert row["departure"] == "06-01-2022 10:00"
+        assert row["etaDelay"] == 2
+
+        # Clean database and close connection
+        db.tracking.delete_many({})
+        conn.close()
+
+def test_route_fields_stored_record(app):
+    """Test route_fields() on record read by records_to_update()."""
+    with app.app_context():
+        conn = MongoClient(app.config["DB_FRONTEND_URI"])
+        db = conn[app.config["DB_NAME"]]
+        db.tracking.delete_many({})
+
+        rec = stored_record(db)
+        assert isinstance(rec["requestedETA"], datetime)
+        rec["departureDate"] = datetime(2022, 1, 6, 10)
+        rec["arrivalDate"] = datetime(2022, 1, 12, 10)
+        fields = route_fields(rec)
+        assert fields["totalDays"] == 6
+        assert fields["etaDelay"] == 2
+
+        # Clean database and close connection
+        db.tracking.delete_many({})
+        conn.close()
+
 def test_extract_schedule_details():
     """Test extract_schedule_details() function."""
     # Pass False argument to the function
@@ -247,6 +347,49 @@ def test_transform():
         check = f.read().split("\n")
     assert "[oneline_update.py] [transform()] [Keys do not match"\
                 + f" in schedule data {records[0]['bkgNo']}]" in check[-1]
+    assert result[0]["rejected"]["reasons"] == [(0, "missing:no")]
+
+    # Malformed later row rejects only its record
+    raw = extract_schedule_details(records + records)
+    raw[0]["schedule"][-1]["eventDt"] = "01.01.2022"
+    result = transform(raw)
+    assert result[0]["schedule"] == None
+    assert result[0]["rejected"]["reasons"] ==\
+        [(len(raw[0]["rejected"]["rows"]) - 1, "format:eventDt")]
+    assert result[1]["schedule"] != None
+
+    # Record without schedule is skipped
+    assert transform([{"bkgNo": "1", "schedule": None}])[0]["schedule"] == None
+
+def test_transform_parallel():
+    """Test decode_payload() and transform_parallel() functions."""
+    rows = [{
+        "no": "1", "statusNm": "Departure from Port of Loading",
+        "placeNm": "NAGOYA", "yardNm": "TCB", "eventDt": "2022-01-05 10:00",
+        "actTpCd": "A", "vslEngNm": "ONE APUS", "lloydNo": "9806079",
+        "hashColumns": []
+    }]
+    payload = json.dumps({"list": rows}).encode()
+
+    # Check decode_payload() function
+    rec = decode_payload({"bkgNo": "1", "payload": payload})
+    assert "payload" not in rec
+    assert "hashColumns" not in rec["schedule"][0]
+    assert decode_payload({"bkgNo": "1", "payload": b"{}"})["schedule"] == None
+    assert decode_payload({"bkgNo": "1", "payload": b"<"})["schedule"] == None
+    with open("etl.log", "r") as f:
+        check = f.read().split("\n")
+    assert "[Bad JSON payload for 1]" in check[-1]
+
+    # Check transform_parallel() function
+    records = [{"bkgNo": str(i), "payload": payload} for i in range(5)]
+    records.append({"bkgNo": "bad", "payload": b"{}"})
+    result = transform_parallel(records, workers=2, chunk_size=2)
+    assert [i["bkgNo"] for i in result] == ["0", "1", "2", "3", "4", "bad"]
+    assert result[0]["schedule"][0]["p"] == "NAGOYA"
+    assert result[0]["departureDate"] == datetime(2022, 1, 5, 10, 0)
+    assert result[-1]["schedule"] == None
+    assert transform_parallel(False) == False
 
 def test_update(app):
     """Test update() function."""
@@ -287,7 +430,8 @@ def test_update(app):
         update(conn, db, result)
         check = db.tracking.find_one({})
         assert check["user"] == result[0]["user"]
-        assert check["schedule"] == result[0]["schedule"]
+        assert unpack(decode_schedule(db, check["schedule"])) ==\
+            result[0]["schedule"]
         assert check["departureDate"] == result[0]["departureDate"]
         assert check["outboundTerminal"] == result[0]["outboundTerminal"]
         assert check["arrivalDate"] == result[0]["arrivalDate"]
@@ -309,7 +453,8 @@ def test_update(app):
         update(conn, db, result, regular_update=False)
         check = db.tracking.find_one({})
         assert check["user"] == result[0]["user"]
-        assert check["schedule"] == result[0]["schedule"]
+        assert unpack(decode_schedule(db, check["schedule"])) ==\
+            result[0]["schedule"]
         assert check["departureDate"] == result[0]["departureDate"]
         assert check["outboundTerminal"] == result[0]["outboundTerminal"]
         assert check["arrivalDate"] == result[0]["arrivalDate"]
@@ -335,6 +480,18 @@ def test_update(app):
         assert f"[oneline_update.py] [update()] [{result[0]['bkgNo']} "\
             + "missing schedule data, not updated]" in check[-1]
         db.tracking.delete_many({})
+
+        # Rejected schedule rows are quarantined
+        db.quarantine.delete_many({})
+        rejected = [{"bkgNo": "1", "schedule": None,
+                     "rejected": {"rows": [{"no": "1"}],
+                                  "reasons": [(0, "missing:statusNm")]}}]
+        update(conn, db, rejected)
+        check = db.quarantine.find_one({})
+        assert check["key"] == "1"
+        assert check["reason"] == "missing:statusNm"
+        assert check["row"] == {"no": "1"}
+        db.quarantine.delete_many({})
         
         # Test db query user validation & update condition
         db.tracking.insert_one(db_record)
@@ -352,7 +509,8 @@ def test_update(app):
         result[0]["inboundTerminal"] = "new data"
         update(conn, db, result)
         check = db.tracking.find_one({})
-        assert check["schedule"] == result[0]["schedule"]
+        assert unpack(decode_schedule(db, check["schedule"])) ==\
+            result[0]["schedule"]
         assert check["departureDate"] == result[0]["departureDate"]
         assert check["outboundTerminal"] == result[0]["outboundTerminal"]
         assert check["arrivalDate"] == result[0]["arrivalDate"]
@@ -425,8 +583,8 @@ def test_update(app):
         db.tracking.delete_many({})
         conn.close()
 
-def test_arrived(app):
-    """Test arrived() function.""" 
+def test_close_arrived(app):
+    """Test close_arrived() function."""
     with app.app_context():
         # Prepare variables and clean database
         uri = app.config["DB_FRONTEND_URI"]
@@ -435,21 +593,10 @@ def test_arrived(app):
         db = conn[db_name]
         db.tracking.delete_many({})
 
-        # Test connection failure condition
-        #bad_uri = uri.replace("27017", "27016")
-        #bad_conn = MongoClient(bad_uri)
-        #result = arrived(bad_conn, db)
-        #assert result == False
-        #with open("etl.log", "r") as f:
-        #    check = f.read().split("\n")
-        #assert "[oneline_update.py] [arrived()] "\
-        #    + "[DB connection failure]" in check[-1]
-        #bad_conn.close()
-
         # Test Base exception condition
         bad_uri = uri.replace("<", ">")
         bad_conn = MongoClient(bad_uri)
-        result = arrived(bad_conn, db)
+        result = close_arrived(bad_conn, db)
         assert result == False
         with open("etl.log", "r") as f:
             check = f.read().split("\n")
@@ -459,94 +606,71 @@ def test_arrived(app):
         # Test 0 containers arrived
         test_record = {
             "user": "test", "trackEnd": None, "bkgNo": "1",
-            "schedule": [{"no": 1, "status": "A"}, {"no": 2, "status": "E"}]
+            "schedule": [{"n": 1, "s": "A"}, {"n": 2, "s": "E"}],
+            "lastEventStatus": "E"
         }
         db.tracking.insert_one(test_record)
-        result = arrived(conn, db)
-        assert result == False
-        result = arrived(conn, db, user="test")
-        assert result == False
+        assert close_arrived(conn, db) == {"matched": 0, "closed": 0}
+        assert close_arrived(conn, db, user="test") \
+            == {"matched": 0, "closed": 0}
+        assert db.tracking.find_one({"bkgNo": "1"})["trackEnd"] is None
         db.tracking.delete_many({})
 
-        # Test 2 containers arrived
+        # Test only arrived copies of user are closed, other user copy
+        # of the same booking with pending events stays active
         test_records = [
             {"user": "test", "trackEnd": None, "bkgNo": "1",
-            "schedule": [{"no": 1, "status": "A"}, {"no": 2, "status": "A"}]},
+            "schedule": [{"n": 1, "s": "A"}, {"n": 2, "s": "A"}],
+            "lastEventStatus": "A"},
             {"user": "test", "trackEnd": None, "bkgNo": "2",
             "schedule": [
-                {"no": 1, "status": "A"},
-                {"no": 2, "status": "A"},
-                {"no": 3, "status": "A"}]}
+                {"n": 1, "s": "A"},
+                {"n": 2, "s": "A"},
+                {"n": 3, "s": "A"}],
+            "lastEventStatus": "A"},
+            {"user": "x", "trackEnd": None, "bkgNo": "1",
+            "schedule": [{"n": 1, "s": "A"}, {"n": 2, "s": "E"}],
+            "lastEventStatus": "E"},
+            {"user": "x", "trackEnd": None, "bkgNo": "3",
+            "schedule": [{"n": 1, "s": "A"}],
+            "lastEventStatus": "A"}
         ]
         db.tracking.insert_many(test_records)
-        result = arrived(conn, db)
-        assert len(result) == 2
-        assert result == [{"bkgNo": "1"}, {"bkgNo": "2"}]
-        result = arrived(conn, db, user="test")
-        assert len(result) == 2
-        assert result == [{"bkgNo": "1"}, {"bkgNo": "2"}]
-        # Test query with wrong user name
-        result = arrived(conn, db, user="x")
-        assert result == False
-        db.tracking.delete_many({})
-
-def test_track_end(app):
-    """Test track_end() function."""
-    with app.app_context():
-        # Prepare variables and clean database
-        uri = app.config["DB_FRONTEND_URI"]
-        db_name = app.config["DB_NAME"]
-        conn = MongoClient(uri)
-        db = conn[db_name]
+        result = close_arrived(conn, db, user="test")
+        assert result == {"matched": 2, "closed": 2}
+        for rec in db.tracking.find({"user": "test"}):
+            assert isinstance(rec["trackEnd"], datetime)
+        check = db.tracking.find_one({"user": "x", "bkgNo": "1"})
+        assert check["trackEnd"] is None
+        check = db.tracking.find_one({"user": "x", "bkgNo": "3"})
+        assert check["trackEnd"] is None
+        # Test all users update, closed records are not matched again
+        result = close_arrived(conn, db)
+        assert result == {"matched": 1, "closed": 1}
+        check = db.tracking.find_one({"user": "x", "bkgNo": "3"})
+        assert isinstance(check["trackEnd"], datetime)
+        check = db.tracking.find_one({"user": "x", "bkgNo": "1"})
+        assert check["trackEnd"] is None
         db.tracking.delete_many({})
 
-        # Test records=False argument
-        result = track_end(conn, db, False)
-        assert result == False
-    
-        # Test connection failure condition
-        #bad_uri = uri.replace("27017", "27016")
-        #bad_conn = MongoClient(bad_uri)
-        #result = track_end(bad_conn, db, [{}, {}])
-        #assert result == False
-        #with open("etl.log", "r") as f:
-        #    check = f.read().split("\n")
-        #assert "[oneline_update.py] [track_end()] "\
-        #    + "[DB connection failure]" in check[-1]
-        #bad_conn.close()
-
-        # Test successful track_end for 2 records
-        records = [
-            {"bkgNo": "1", "trackEnd": None}, {"bkgNo": "2", "trackEnd": None}
-        ]
-        db.tracking.insert_many(records)
-        track_end(conn, db, records)
-        check_1 = db.tracking.find_one({"bkgNo": "1"})
-        assert isinstance(check_1["trackEnd"], datetime)
-        check_2 = db.tracking.find_one({"bkgNo": "2"})
-        assert isinstance(check_2["trackEnd"], datetime)
-        db.tracking.delete_many({})
-
-        # Test unseccessful track_end for 1 record
-        db.tracking.insert_one({"bkgNo": "1", "trackEnd": None})
-        track_end(conn, db, [{"bkgNo": "2"}])
-        with open("etl.log", "r") as f:
-            check = f.read().split("\n")
-        assert "[oneline_update.py] [track_end()] "\
-            + "[Failed to set track end for 2 "\
-            + "{'n': 0, 'nModified': 0, 'ok': 1.0, 'updatedExisting': False}]"\
-            in check[-1]
+        # Test documents without lastEventStatus field
+        db.tracking.insert_many([
+            {"user": "test", "trackEnd": None, "bkgNo": "1",
+            "schedule": [{"n": 1, "s": "A"}, {"n": 2, "s": "A"}]},
+            {"user": "test", "trackEnd": None, "bkgNo": "2",
+            "schedule": [{"n": 1, "s": "A"}, {"n": 2, "s": "E"}]},
+            {"user": "test", "trackEnd": None, "bkgNo": "3",
+            "schedule": [{"no": 1, "status": "A"}, {"no": 2, "status": "A"}]},
+            {"user": "test", "trackEnd": None, "bkgNo": "4",
+            "schedule": [{"no": 1, "status": "A"}, {"no": 2, "status": "E"}]}
+        ])
+        assert close_arrived(conn, db, user="test") \
+            == {"matched": 2, "closed": 2}
+        for bkg_number in ["2", "4"]:
+            check = db.tracking.find_one({"bkgNo": bkg_number})
+            assert check["trackEnd"] is None
         db.tracking.delete_many({})
-
-        # Test Base exception condition
-        bad_uri = uri.replace("<", ">")
-        bad_conn = MongoClient(bad_uri)
-        result = track_end(bad_conn, db, [{}, {}])
-        assert result == False
-        with open("etl.log", "r") as f:
-            check = f.read().split("\n")
-        assert "Authentication failed." in check[-1]
-        bad_conn.close()
+        conn.close()
 
 def test_conn_db():
     """Test conn_db() function."""
@@ -0,0 +1,85 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+from pymongo.mongo_client import MongoClient
+from datetime import datetime, timedelta
+
+from seacargos.etl import pipeline
+from seacargos.etl.pipeline import run_pipeline
+from seacargos.etl.oneline_update import regular_schedule_update
+
+ROWS = [
+    {"no": "1", "statusNm": "Departure from Port of Loading",
+     "placeNm": "NAGOYA", "yardNm": "TCB", "eventDt": "2022-01-05 10:00",
+     "actTpCd": "A", "vslEngNm": "ONE APUS", "lloydNo": "9806079"},
+    {"no": "2", "statusNm": "Arrival at Port of Discharging",
+     "placeNm": "BUSAN", "yardNm": "PNC", "eventDt": "2022-01-09 10:00",
+     "actTpCd": "E", "vslEngNm": "ONE APUS", "lloydNo": "9806079"}
+]
+
+def fake_extract(records):
+    """Add test schedule instead of ONE web site request."""
+    for rec in records:
+        if rec["bkgNo"] == "bad":
+            rec["schedule"] = [{"no": "1"}]
+        else:
+            rec["schedule"] = [dict(i) for i in ROWS]
+    return records
+
+def test_run_pipeline(app, monkeypatch):
+    """Test run_pipeline() function."""
+    with app.app_context():
+        # Prepare variables and clean database
+        uri = app.config["DB_FRONTEND_URI"]
+        db_name = app.config["DB_NAME"]
+        conn = MongoClient(uri)
+        db = conn[db_name]
+        db.tracking.delete_many({})
+        db.quarantine.delete_many({})
+        monkeypatch.setattr(pipeline, "extract_schedule_details", fake_extract)
+
+        # Write test data set to database
+        past = datetime.now() - timedelta(days=1)
+        records = [
+            {"user": "test", "bkgNo": str(i), "copNo": str(i),
+             "trackEnd": None, "schedule": [{"s": "E", "d": past}],
+             "nextExpectedEventAt": past}
+            for i in range(25)
+        ]
+        records.append({"user": "test", "bkgNo": "bad", "copNo": "bad",
+                        "trackEnd": None, "schedule": [{"s": "E", "d": past}],
+                        "nextExpectedEventAt": past})
+        db.tracking.insert_many(records)
+
+        # Run pipeline with small queues and batches
+        counters = run_pipeline(conn, db, fetch_threads=3, queue_size=2,
+                                batch_size=4)
+        assert counters == {"extract": 26, "fetch": 26, "transform": 26,
+                            "load": 25, "errors": 1}
+        check = db.tracking.find_one({"bkgNo": "7"})
+        assert check["departureDate"] == datetime(2022, 1, 5, 10, 0)
+        assert check["schedule"][1]["s"] == "E"
+        assert check["lastEventStatus"] == "E"
+        assert check["pendingEvents"] == 1
+        assert check["nextExpectedEventAt"] == datetime(2022, 1, 9, 10, 0)
+        assert isinstance(check["regularUpdate"], datetime)
+        assert db.quarantine.count_documents({"key": "bad"}) == 1
+
+        # Clean database and close connection
+        db.tracking.delete_many({})
+        db.quarantine.delete_many({})
+        conn.close()
+
+def test_regular_schedule_update_pipelined(app, monkeypatch):
+    """Test regular_schedule_update() dispatch to run_pipeline()."""
+    with app.app_context():
+        conn = MongoClient(app.config["DB_FRONTEND_URI"])
+        db = conn[app.config["DB_NAME"]]
+        db.tracking.delete_many({})
+        calls = []
+        monkeypatch.setattr(
+            pipeline, "run_pipeline", lambda *args: calls.append(args)
+            )
+        regular_schedule_update(conn, db, pipelined=True)
+        assert calls == [(conn, db)]
@@ -0,0 +1,80 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+from pymongo.mongo_client import MongoClient
+from datetime import datetime
+
+from seacargos.etl.positions import POSITIONS
+from seacargos.etl.positions import setup_positions
+from seacargos.etl.positions import point
+from seacargos.etl.positions import save_positions
+from seacargos.etl.positions import latest_positions
+from seacargos.etl.positions import active_vessels
+from seacargos.etl import refs
+
+def test_point():
+    """Test point() function."""
+    assert point("135.5", -34.6) == \
+        {"type": "Point", "coordinates": [135.5, -34.6]}
+
+def test_positions(app):
+    """Test vessel positions functions."""
+    with app.app_context():
+        # Prepare variables and clean database
+        uri = app.config["DB_FRONTEND_URI"]
+        db_name = app.config["DB_NAME"]
+        conn = MongoClient(uri)
+        db = conn[db_name]
+        db.drop_collection(POSITIONS)
+
+        # Check time series collection and indexes
+        setup_positions(db)
+        setup_positions(db)
+        options = db[POSITIONS].options()
+        assert options["timeseries"]["timeField"] == "ts"
+        assert options["timeseries"]["metaField"] == "imo"
+        names = [i["name"] for i in db[POSITIONS].list_indexes()]
+        assert "imo_ts_index" in names
+        assert "position_index" in names
+
+        # Check save_positions() and latest_positions() functions
+        assert save_positions(db, {}) == 0
+        first = datetime(2022, 1, 5, 10, 0)
+        second = datetime(2022, 1, 5, 16, 0)
+        assert save_positions(
+            db, {"9806079": (135.5, 34.6), "9806081": (129.0, 35.1)}, first
+            ) == 2
+        assert save_positions(db, {"9806079": (136.0, 34.0)}, second) == 1
+        assert latest_positions(db, []) == {}
+        assert latest_positions(db, ["9806079", "9806081", "1"]) == {
+            "9806079": {"ts": second, "lon": 136.0, "lat": 34.0},
+            "9806081": {"ts": first, "lon": 129.0, "lat": 35.1}
+        }
+
+        # Check geospatial query
+        near = db[POSITIONS].count_documents({"position": {"$geoWithin": {
+            "$centerSphere": [[129.0, 35.0], 100 / 6378.1]
+            }}})
+        assert near == 1
+
+        # Check active_vessels() function
+        db.tracking.delete_many({})
+        db.vessels.delete_many({})
+        refs.clear_cache()
+        refs.vessel_ref(db, "9806079", "ONE APUS")
+        db.tracking.insert_many([
+            {"trackEnd": None, "vesselImo": "9806079"},
+            {"trackEnd": None, "vesselImo": "9806079"},
+            {"trackEnd": None, "vesselImo": None},
+            {"trackEnd": datetime(2022, 1, 9), "vesselImo": "9806081"}
+        ])
+        assert active_vessels(db) == \
+            [{"imo": "9806079", "vesselName": "ONE APUS"}]
+
+        # Clean database and close connection
+        db.drop_collection(POSITIONS)
+        db.tracking.delete_many({})
+        db.vessels.delete_many({})
+        refs.clear_cache()
+        conn.close()
@@ -0,0 +1,72 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+from pymongo.mongo_client import MongoClient
+from datetime import datetime
+
+from seacargos.etl import refs
+
+SCHEDULE = [
+    {"n": 1, "e": "Departure from Port of Loading", "p": "NAGOYA",
+     "y": "TCB", "d": datetime(2022, 1, 5), "s": "A", "v": "ONE APUS",
+     "i": "9806079"},
+    {"n": 2, "e": "Arrival at Port of Discharging", "p": "BUSAN",
+     "y": "PNC", "d": datetime(2022, 1, 9), "s": "E", "v": "", "i": ""}
+]
+
+def test_refs(app):
+    """Test places and vessels references functions."""
+    with app.app_context():
+        # Prepare variables and clean database
+        uri = app.config["DB_FRONTEND_URI"]
+        db_name = app.config["DB_NAME"]
+        conn = MongoClient(uri)
+        db = conn[db_name]
+        for coll in ["places", "vessels", "counters"]:
+            db[coll].delete_many({})
+        refs.clear_cache()
+
+        # Check place_id() and place() functions
+        nagoya = refs.place_id(db, "NAGOYA", "TCB")
+        assert refs.place_id(db, "BUSAN", "PNC") == nagoya + 1
+        refs.clear_cache()
+        assert refs.place_id(db, "NAGOYA", "TCB") == nagoya
+        assert refs.place(db, nagoya) == ("NAGOYA", "TCB")
+        assert db.places.count_documents({}) == 2
+
+        # Check vessel_ref() and vessel_name() functions
+        assert refs.vessel_ref(db, "9806079", "ONE APUS") == "9806079"
+        refs.clear_cache()
+        assert refs.vessel_name(db, "9806079") == "ONE APUS"
+        assert db.vessels.find_one({"_id": "9806079"})["name"] == "ONE APUS"
+
+        # Renamed vessel: name updated in collection and cache,
+        # empty name keeps known one
+        refs.vessel_ref(db, "9806079", "ONE APUS II")
+        assert refs.vessel_name(db, "9806079") == "ONE APUS II"
+        refs.vessel_ref(db, "9806079", "")
+        refs.clear_cache()
+        assert refs.vessel_name(db, "9806079") == "ONE APUS II"
+        refs.vessel_ref(db, "9806079", "ONE APUS")
+        refs.clear_cache()
+        assert refs.vessel_name(db, "9806079") == "ONE APUS"
+
+        # Check encode_schedule() and decode_schedule() functions
+        encoded = refs.encode_schedule(db, SCHEDULE)
+        assert encoded[0] == {
+            "n": 1, "e": "Departure from Port of Loading", "p": nagoya,
+            "d": datetime(2022, 1, 5), "s": "A", "i": "9806079"
+            }
+        assert "v" in encoded[1]
+        assert refs.encode_schedule(db, encoded) == encoded
+        refs.clear_cache()
+        assert refs.decode_schedule(db, encoded) == SCHEDULE
+        assert refs.decode_schedule(db, SCHEDULE) == SCHEDULE
+        assert refs.encode_schedule(db, None) == None
+
+        # Clean database and close connection
+        for coll in ["places", "vessels", "counters"]:
+            db[coll].delete_many({})
+        refs.clear_cache()
+        conn.close()
@@ -0,0 +1,71 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+from datetime import datetime
+
+from seacargos.etl.schedule import field
+from seacargos.etl.schedule import pack
+from seacargos.etl.schedule import unpack
+from seacargos.etl.schedule import planned_dates
+from seacargos.etl.schedule import compact_document
+from seacargos.etl.schedule import status_fields
+
+EVENT = {
+    "no": 1, "event": "Departure from Port of Loading", "placeName": "NAGOYA",
+    "yardName": "TCB", "eventDate": datetime(2022, 1, 5), "status": "A",
+    "vesselName": "ONE APUS", "imo": "9806079"
+}
+COMPACT = {
+    "n": 1, "e": "Departure from Port of Loading", "p": "NAGOYA", "y": "TCB",
+    "d": datetime(2022, 1, 5), "s": "A", "v": "ONE APUS", "i": "9806079"
+}
+
+def test_field():
+    """Test field() function."""
+    assert field("status") == "schedule.s"
+    assert field("eventDate") == "schedule.d"
+
+def test_pack_unpack():
+    """Test pack() and unpack() functions."""
+    assert pack([EVENT]) == [COMPACT]
+    assert pack([COMPACT]) == [COMPACT]
+    assert unpack([COMPACT]) == [EVENT]
+    assert unpack([EVENT]) == [EVENT]
+    assert pack(None) == None
+    assert unpack(None) == None
+
+def test_planned_dates():
+    """Test planned_dates() function."""
+    dates = [datetime(2022, 1, 4)]
+    assert planned_dates({"plannedDates": dates}) == dates
+    assert planned_dates({"initSchedule": [{"eventDate": dates[0]}]}) == dates
+    assert planned_dates({}) == []
+
+def test_compact_document():
+    """Test compact_document() function."""
+    legacy = {"schedule": [EVENT], "initSchedule": [dict(EVENT)]}
+    assert compact_document(legacy) == {
+        "$set": {"schedule": [COMPACT], "plannedDates": [EVENT["eventDate"]]},
+        "$unset": {"initSchedule": ""}
+    }
+    compact = {"schedule": [COMPACT], "plannedDates": [EVENT["eventDate"]]}
+    assert compact_document(compact) == None
+
+def test_status_fields():
+    """Test status_fields() function."""
+    assert status_fields(None) == {
+        "lastEventStatus": None, "pendingEvents": 0,
+        "nextExpectedEventAt": None, "vesselImo": None
+    }
+    later = dict(COMPACT, n=3, d=datetime(2022, 1, 9), s="E", i="9806081")
+    sooner = dict(COMPACT, n=2, d=datetime(2022, 1, 7), s="E")
+    assert status_fields([COMPACT, sooner, later]) == {
+        "lastEventStatus": "E", "pendingEvents": 2,
+        "nextExpectedEventAt": datetime(2022, 1, 7), "vesselImo": "9806079"
+    }
+    # Legacy format schedule
+    assert status_fields([EVENT]) == {
+        "lastEventStatus": "A", "pendingEvents": 0,
+        "nextExpectedEventAt": None, "vesselImo": "9806079"
+    }
@@ -0,0 +1,43 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+from seacargos.etl.schema import compile_schema
+from seacargos.etl.schema import validate_rows
+from seacargos.etl.schema import validate_schedule_row
+from seacargos.etl.schema import validate_update_row
+from seacargos.etl.schema import validate_container
+
+ROW = {
+    "no": "1", "statusNm": "Departure from Port of Loading",
+    "placeNm": "NAGOYA", "yardNm": "TCB", "eventDt": "2022-01-05 10:00",
+    "actTpCd": "A", "vslEngNm": "ONE APUS", "lloydNo": "9806079"
+}
+
+def test_compile_schema():
+    """Test compile_schema() function."""
+    validate = compile_schema({"a": str, "b": (int, str)})
+    assert validate({"a": "x", "b": 1}) == None
+    assert validate({"a": "x", "b": "1"}) == None
+    assert validate({"b": 1}) == "missing:a"
+    assert validate({"a": 1, "b": 1}) == "type:a"
+    assert validate([]) == "not_dict"
+
+def test_schedule_row_validators():
+    """Test ONE schedule row validators."""
+    assert validate_schedule_row(ROW) == None
+    assert validate_schedule_row(dict(ROW, no="x")) == "format:no"
+    assert validate_schedule_row(dict(ROW, eventDt="")) == "format:eventDt"
+    assert validate_update_row(dict(ROW, eventDt="")) == None
+    assert validate_update_row(dict(ROW, eventDt="2022")) == "format:eventDt"
+    assert validate_update_row(dict(ROW, lloydNo=None)) == "type:lloydNo"
+    assert validate_container({"cntrNo": "1"}) == "missing:cntrTpszNm"
+
+def test_validate_rows():
+    """Test validate_rows() function."""
+    rows = [ROW, dict(ROW, eventDt="bad"), "row"]
+    assert validate_rows(validate_schedule_row, rows) ==\
+        [(1, "format:eventDt"), (2, "not_dict")]
+    assert validate_rows(validate_schedule_row, [ROW]) == []
+    assert validate_rows(validate_schedule_row, []) == [(None, "empty")]
+    assert validate_rows(validate_schedule_row, None) == [(None, "empty")]
@@ -0,0 +1,57 @@
+# Seacargos - sea cargos aggregator web application.
+# Copyright (C) 2022 Evgeny Deriglazov
+# https://github.com/evgeny81d/seacargos/blob/main/LICENSE
+
+import os
+
+import pytest
+
+from seacargos.etl.scrape import page_title
+from seacargos.etl.scrape import vessel_link
+from seacargos.etl.scrape import coordinate
+
+PAGES = os.path.join(os.path.dirname(__file__), "pages")
+
+def page(name):
+    """Return saved page html."""
+    with open(os.path.join(PAGES, name), "r") as f:
+        return f.read()
+
+def test_page_title():
+    """Test page_title() function."""
+    title = page_title(page("marinetraffic_ship.html"))
+    assert title.startswith("Ship ONE APUS (Container Ship) Registered in")
+    assert "Call Sign 9V5384 & more" in title
+    assert page_title("<html><body>No title</body></html>") is None
+
+def test_vessel_link():
+    """Test vessel_link() function."""
+    assert vessel_link(page("shiplocation_search.html")) \
+        == "/vessels/ONE-APUS-IMO-9806079-MMSI-563050800"
+    assert vessel_link(page("shiplocation_empty.html")) is None
+    assert vessel_link("<a class='vessel-link'>No href</a>") is None
+
+def test_coordinate():
+    """Test coordinate() function."""
+    html = page("vesselfinder_vessel.html")
+    assert coordinate(html, "coordinate lon") == "135.43627"
+    assert coordinate(html, "coordinate lat") == "-34.61005"
+    html = page("vesselfinder_no_position.html")
+    assert coordinate(html, "coordinate lon") == "-"
+    assert coordinate(html, "coordinate lat") == "12.5"
+    assert coordinate(html, "coordinate speed") is None
+
+def test_parity():
+    """Test extraction results match BeautifulSoup on saved pages."""
+    bs4 = pytest.importorskip("bs4")
+    for name in sorted(os.listdir(PAGES)):
+        html = page(name)
+        soup = bs4.BeautifulSoup(html, "html.parser")
+        title = soup.title.text if soup.title else None
+        assert page_title(html) == title, name
+        link = soup.find("a", class_="vessel-link")
+        assert vessel_link(html) == (link.get("href") if link else None), name
+        for css_class in ["coordinate lon", "coordinate lat"]:
+            div = soup.find("div", class_=css_class)
+            assert coordinate(html, css_class) \
+                == (div.text if div else None), name